@@ -1,10 +1,17 @@
 """
-This module defines a Habit class for managing information about habits in a database.
-It imports os, and sqlite3.
+This module defines a Habit class for managing information about habits in a database,
+and the adapters which convert the dates and times of a habit from and to their stored form.
+A Habit is a compact value with fixed slots instead of a per-instance dictionary, and habit_row_factory()
+builds Habit objects straight from the rows of a cursor.
+It imports calendar, storage, sys, lru_cache from functools and datetime, timedelta from datetime.
 """
 
-import os
-import sqlite3
+import calendar
+import storage
+import sys
+
+from datetime import datetime, timedelta
+from functools import lru_cache
 
 
 # HABIT CLASS
@@ -12,6 +19,9 @@ class Habit:
     """
     Creating a Habit class.
 
+    The attributes are kept in slots, so a Habit needs no per-instance dictionary and millions of them
+    can be held in memory at once. A Habit holds no database connection.
+
     Attributes:
     -----------
         - habit_name (str): The name of the habit.
@@ -19,11 +29,22 @@ class Habit:
         - habit_type (str): The type of habit (e.g., Physical Health, Emotional Relaxation, etc.).
         - habit_frequency (str): The frequency at which the habit is performed (e.g., daily and weekly.).
         - created_datetime (datetime): The date and time at which the habit was created.
+        - last_completion_date (datetime): The date and time at which the habit was last completed.
+        - streak_start_date (datetime): The date and time at which the streak started.
+        - streak_end_date (datetime): The date and time at which the streak ended.
+        - streak_length (int): The length of the streak.
+        - habit_streak (int): The current streak of the habit.
+        - habit_id (int): The id of the habit in the HabitsData table, or None if it is not stored.
     """
 
+    __slots__ = ('habit_name', 'habit_creator', 'habit_type', 'habit_frequency', 'created_datetime',
+                 'last_completion_date', 'streak_start_date', 'streak_end_date', 'streak_length', 'habit_streak',
+                 'habit_id')
+
     # INIT METHOD
     def __init__(self, habit_name, habit_creator, habit_type, habit_frequency, created_datetime,
-                 last_completion_date, streak_start_date, streak_end_date, streak_length, habit_streak=0):
+                 last_completion_date=None, streak_start_date=None, streak_end_date=None, streak_length=0,
+                 habit_streak=0, habit_id=None):
         """
         Initializes a new instance of the Habit class.
 
@@ -34,11 +55,12 @@ class Habit:
             - habit_type (str): Type of the habit (Physical Health, Emotional Relaxation, Personal Growth, Relationships)
             - habit_frequency (str): Frequency of the habit (Daily and Weekly)
             - created_datetime (datetime): Datetime when the habit was created
-            - last_completion_date (str): Datetime when the habit was last completed
+            - last_completion_date (datetime): Datetime when the habit was last completed
             - streak_start_date (datetime): Datetime when the first streak starts
             - streak_end_date (datetime): Datetime when the habit streak ends
             - streak_length (int): The length of a habit streak
             - habit_streak(int): The number of a habit streak
+            - habit_id (int): The id of the habit in the HabitsData table
 
         """
 
@@ -47,65 +69,80 @@ class Habit:
         self.habit_type = habit_type
         self.habit_frequency = habit_frequency
         self.created_datetime = created_datetime
-        if last_completion_date is None:
-            self.last_completion_date = None
-        else:
-            self.last_completion_date = last_completion_date
+        self.last_completion_date = last_completion_date
         self.habit_streak = habit_streak
         self.streak_start_date = streak_start_date
         self.streak_end_date = streak_end_date
         self.streak_length = streak_length
+        self.habit_id = habit_id
 
-        # Build the file path for the database file
-        connect_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'habit_tracker_db.db')
-
-        # Connect to the database
-        self.conn = sqlite3.connect(connect_db)
+    def __eq__(self, other):
+        """
+            Two habits are equal if all their attributes are equal.
+        """
+        if not isinstance(other, Habit):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
 
-        # Create a cursor for executing SQL commands
-        self.cur = self.conn.cursor()
+    def __repr__(self):
+        """
+            Shows the attributes of the habit.
+        """
+        return "Habit(" + ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__) + ")"
 
     def habits_table(self):
         """
             Create the Habits Data table in the database.
         """
-        conn = sqlite3.connect('habit_tracker_db.db')
-        self.cur = conn.cursor()
-        self.cur.execute(
-            "CREATE TABLE IF NOT EXISTS HabitsData "
-            "(habit_name TEXT, habit_creator TEXT, habit_type TEXT, habit_frequency TEXT, created_datetime DATETIME, "
-            "last_completion_date DATETIME, habit_streak INTEGER)"
-        )
-        self.cur.close()
-        self.conn.close()
+        with storage.connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS HabitsData "
+                "(habit_name TEXT, habit_creator TEXT, habit_type TEXT, habit_frequency TEXT, created_datetime DATETIME, "
+                "last_completion_date DATETIME, habit_streak INTEGER)"
+            )
 
     def streaks_table(self):
         """
             Create the Streak History table in the database.
         """
-        conn = sqlite3.connect('habit_tracker_db.db')
-        self.cur = conn.cursor()
-        self.cur.execute(
-            "CREATE TABLE IF NOT EXISTS StreaksData "
-            "(habit_name TEXT, habit_creator TEXT, habit_type TEXT, habit_frequency TEXT, streak_start_date DATETIME, "
-            "streak_end_date DATETIME, streak_length INTEGER)"
-        )
-        self.cur.close()
-        self.conn.close()
+        with storage.connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS StreaksData "
+                "(habit_name TEXT, habit_creator TEXT, habit_type TEXT, habit_frequency TEXT, streak_start_date DATETIME, "
+                "streak_end_date DATETIME, streak_length INTEGER)"
+            )
 
     def users_table(self):
         """
             Create the user information table in the database.
         """
-        conn = sqlite3.connect('habit_tracker_db.db')
-        self.cur = conn.cursor()
-        self.cur.execute(
-            "CREATE TABLE IF NOT EXISTS User "
-            "(forename TEXT, surname TEXT, username VARCHAR, password VARCHAR)"
-        )
-        self.cur.close()
-        self.conn.close()
+        with storage.connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS User "
+                "(forename TEXT, surname TEXT, username VARCHAR, password VARCHAR)"
+            )
+
 
+# The format in which all dates and times are stored in the database as text
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# The ways the dates and times can be stored in the database: as text in the DATETIME_FORMAT,
+# or as integer epoch seconds which can be compared without parsing them
+TEXT_TIMESTAMPS = "text"
+EPOCH_TIMESTAMPS = "epoch"
+TIMESTAMP_FORMATS = (TEXT_TIMESTAMPS, EPOCH_TIMESTAMPS)
+
+# The first moment of the epoch seconds
+EPOCH = datetime(1970, 1, 1)
+
+# The number of days between two check-offs of a habit for each habit frequency
+FREQUENCY_DAYS = {
+    'Daily': 1,
+    'Weekly': 7
+}
+
+# The types which a habit can have
+HABIT_TYPES = ["Physical Health", "Emotional Relaxation", "Personal Growth", "Relationships"]
 
 # Predefined Habits List which be a list of choices in the program for the user to select
 predefined_habits_list = [
@@ -117,3 +154,160 @@ predefined_habits_list = [
     ('Writing Diary', 'Personal Growth', 'Daily'),
     ('Cleaning House', 'Emotional Relaxation', 'Weekly')
 ]
+
+
+def to_epoch_seconds(value):
+    """
+        Converts a datetime into the number of seconds since 1970-01-01 00:00:00 of the same wall-clock time.
+
+        This is the same number SQLite's strftime('%s', ...) gives for the stored text of that datetime,
+        so Python and SQL compute the same number of days between two datetimes.
+
+        Args:
+        -----
+            - value (datetime): The datetime to convert.
+
+        Returns:
+        --------
+            - The number of seconds as an int.
+    """
+    return calendar.timegm(value.timetuple())
+
+
+def to_db_timestamp(value, timestamp_format=TEXT_TIMESTAMPS):
+    """
+        Converts a datetime into the form in which it is stored in the database.
+
+        Args:
+        -----
+            - value (datetime): The datetime to convert. None stays None.
+            - timestamp_format (str): TEXT_TIMESTAMPS or EPOCH_TIMESTAMPS.
+
+        Returns:
+        --------
+            - The datetime as text in the DATETIME_FORMAT or as epoch seconds.
+    """
+    if value is None:
+        return None
+    if timestamp_format == EPOCH_TIMESTAMPS:
+        return to_epoch_seconds(value)
+    return value.strftime(DATETIME_FORMAT)
+
+
+def from_db_timestamp(value):
+    """
+        Converts a stored date and time of the database back into a datetime.
+
+        Args:
+        -----
+            - value (str or int): The stored text in the DATETIME_FORMAT or the stored epoch seconds.
+
+        Returns:
+        --------
+            - The datetime, or None if nothing (or the text 'None') is stored.
+    """
+    if value is None or value == 'None':
+        return None
+    if isinstance(value, int):
+        return EPOCH + timedelta(seconds=value)
+    # fromisoformat() reads the DATETIME_FORMAT many times faster than strptime()
+    return datetime.fromisoformat(value)
+
+
+def seconds_sql(column):
+    """
+        Builds a SQL expression which gives the epoch seconds of a stored date and time column,
+        no matter whether the row stores it as text or as epoch seconds.
+
+        Args:
+        -----
+            - column (str): The name of the column.
+
+        Returns:
+        --------
+            - The SQL expression as a string.
+    """
+    return f"(CASE typeof({column}) WHEN 'integer' THEN {column} ELSE CAST(strftime('%s', {column}) AS INTEGER) END)"
+
+
+def text_sql(column):
+    """
+        Builds a SQL expression which gives a stored date and time column as text in the DATETIME_FORMAT,
+        no matter whether the row stores it as text or as epoch seconds.
+
+        Args:
+        -----
+            - column (str): The name of the column.
+
+        Returns:
+        --------
+            - The SQL expression as a string.
+    """
+    return f"(CASE typeof({column}) WHEN 'integer' THEN datetime({column}, 'unixepoch') ELSE {column} END)"
+
+
+# The date and time attributes of a Habit, which habit_row_factory() converts into datetime objects
+HABIT_TIMESTAMP_ATTRIBUTES = ('created_datetime', 'last_completion_date', 'streak_start_date', 'streak_end_date')
+
+# The attributes of a Habit which repeat the same few values, so habit_row_factory() shares one string for each value
+HABIT_INTERNED_ATTRIBUTES = ('habit_creator', 'habit_type', 'habit_frequency')
+
+# The values of the Habit attributes which a query does not read
+HABIT_DEFAULTS = {'streak_length': 0, 'habit_streak': 0}
+
+# The ways habit_row_factory() reads a column: as it is, as a shared string, or as a datetime
+_PLAIN, _INTERNED, _TIMESTAMP = range(3)
+
+
+@lru_cache(maxsize=64)
+def _habit_columns(description):
+    """
+        Plans how the rows of a query are turned into Habit objects, once for every query.
+
+        Args:
+        -----
+            - description (tuple): The description of the cursor.
+
+        Returns:
+        --------
+            - A tuple of (column position or -1, way of reading, default value) in the order of the Habit attributes.
+    """
+    positions = {column[0]: position for position, column in enumerate(description)}
+    return tuple((positions.get(name, -1),
+                  _TIMESTAMP if name in HABIT_TIMESTAMP_ATTRIBUTES else
+                  _INTERNED if name in HABIT_INTERNED_ATTRIBUTES else _PLAIN,
+                  HABIT_DEFAULTS.get(name)) for name in Habit.__slots__)
+
+
+def habit_row_factory(cursor, row):
+    """
+        Builds a Habit from a row of a query, so it can be set as the row_factory of a connection or cursor:
+
+            cursor.row_factory = habit_row_factory
+            habits = cursor.execute("SELECT * FROM HabitsData").fetchall()
+
+        The columns are matched with the attributes by name, and columns which are no Habit attribute are skipped.
+        The stored dates and times are converted into datetime objects, however they are stored, and the creators,
+        types and frequencies of all habits share one string for each value.
+
+        Args:
+        -----
+            - cursor (sqlite3.Cursor): The cursor which read the row.
+            - row (tuple): The row.
+
+        Returns:
+        --------
+            - A Habit object.
+    """
+    values = []
+    for position, way, default in _habit_columns(cursor.description):
+        if position < 0:
+            values.append(default)
+        elif way == _PLAIN:
+            values.append(row[position])
+        elif way == _TIMESTAMP:
+            values.append(from_db_timestamp(row[position]))
+        else:
+            value = row[position]
+            values.append(sys.intern(value) if isinstance(value, str) else value)
+    return Habit(*values)
@@ -1,100 +1,321 @@
 """
-This 'analytics.py' module was created based on Python Functional Programming and consists of 7 analytics functions for all habits existed in user account.
-It imports os, sqlite3, questionary and texttable.
+This 'analytics.py' module was created based on Python Functional Programming and consists of 11 analytics functions for all habits existed in user account.
+All habit listings are answered by one parameterized query engine, query_habits(), and all tables are printed
+page by page, so the first rows appear at once however many habits an account has.
+The completion rates, trends and heat maps are read from the CompletionDays rollup, which triggers keep up to date
+with every completion, so they read a few rows per habit and day however long the completion history grows.
+It imports questionary, storage, namedtuple, datetime, texttable, the habit frequencies and timestamp adapters from
+Habit module and HabitService and habit_choices from service module.
 """
 
-import os
-import sqlite3
 import questionary
+import storage
+from collections import namedtuple
+from datetime import date, datetime, timedelta
 from texttable import Texttable
+from Habit import FREQUENCY_DAYS, seconds_sql, text_sql, to_epoch_seconds
+from service import HabitService, habit_choices
 
+# The date and time columns as text, no matter whether they are stored as text or as epoch seconds
+CREATED_DATETIME = text_sql("created_datetime")
+LAST_COMPLETION_DATE = text_sql("last_completion_date")
+LONGEST_STREAK_START_DATE = text_sql("longest_streak_start_date")
+LONGEST_STREAK_END_DATE = text_sql("longest_streak_end_date")
 
-def show_all_habits(username):
+
+# The columns of a habit listing, with the dates and times as text
+HABIT_LIST_COLUMNS = (f"habit_id, habit_name, habit_creator, habit_type, habit_frequency, {CREATED_DATETIME}, "
+                      f"{LAST_COMPLETION_DATE}, habit_streak")
+
+# A row of a habit listing
+HabitRow = namedtuple('HabitRow', ['habit_id', 'habit_name', 'habit_creator', 'habit_type', 'habit_frequency',
+                                   'created_datetime', 'last_completion_date', 'habit_streak'])
+
+# A page of a habit listing and the key after which the next page starts (None on the last page)
+HabitPage = namedtuple('HabitPage', ['rows', 'next_key'])
+
+# The trailing windows of days of the completion rates
+RATE_WINDOWS = (7, 30, 90)
+
+# The completion rates of a habit, with the completions, expected check-offs and rates in the order of the windows
+CompletionRate = namedtuple('CompletionRate', ['habit_id', 'habit_name', 'habit_type', 'habit_frequency',
+                                               'habit_streak', 'longest_streak', 'completions', 'expected', 'rates'])
+
+# The completions of a habit on one day and its rolling completion rate over the window ending on that day
+TrendPoint = namedtuple('TrendPoint', ['date', 'completions', 'rate'])
+
+# The completions of a habit per weekday, from Monday to Sunday
+WeekdayCounts = namedtuple('WeekdayCounts', ['habit_id', 'habit_name', 'counts'])
+
+# The aggregates of all habits of a habit type
+HabitTypeSummary = namedtuple('HabitTypeSummary', ['habit_type', 'habits', 'average_streak', 'longest_streak',
+                                                   'completions', 'expected', 'rates'])
+
+# The date of the epoch day 0 of the CompletionDays rollup
+EPOCH_DATE = date(1970, 1, 1)
+
+# The column titles and the cell shades of the weekday heat map, from no completions to the busiest weekday
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+HEAT_SHADES = " .:*#"
+
+# The number of habits which are fetched and printed at a time by the habit tables
+PAGE_SIZE = 100
+
+# The sort keys of a habit listing. Every expression is never NULL, so it can be compared in a keyset condition.
+SORT_KEYS = {
+    'habit_id': "habit_id",
+    'habit_name': "COALESCE(habit_name, '')",
+    'habit_type': "COALESCE(habit_type, '')",
+    'habit_frequency': "COALESCE(habit_frequency, '')",
+    'created_datetime': f"COALESCE({seconds_sql('created_datetime')}, -1)",
+    'last_completion_date': f"COALESCE({seconds_sql('last_completion_date')}, -1)",
+    'habit_streak': "COALESCE(habit_streak, 0)",
+}
+
+
+def query_habits(username, habit_frequency=None, habit_type=None, created_from=None, created_to=None,
+                 min_streak=None, max_streak=None, order_by='habit_id', descending=False, limit=None, offset=None,
+                 after=None, conn=None):
     """
-        Displays a table of all habits created by a given user.
+        Lists the habits of a user with optional filters, sorting and pagination in one parameterized query.
+
+        A large account can be paged through either with limit and offset, or with keyset pagination: the next_key
+        of a page is passed as 'after' to get the following page, which reads only the rows of that page.
 
         Args:
         -----
-            - username (str): The username whose habits are to be displayed.
+            - username (str): The username whose habits are listed.
+            - habit_frequency (str): Only list the habits with this frequency (Daily or Weekly).
+            - habit_type (str): Only list the habits with this type.
+            - created_from (datetime): Only list the habits created at or after this datetime.
+            - created_to (datetime): Only list the habits created at or before this datetime.
+            - min_streak (int): Only list the habits with at least this habit streak.
+            - max_streak (int): Only list the habits with at most this habit streak.
+            - order_by (str): One of the SORT_KEYS. Habits with the same sort key are ordered by habit_id.
+            - descending (bool): Whether the habits are sorted in descending order.
+            - limit (int): The maximum number of habits of the page. Defaults to all habits.
+            - offset (int): The number of habits to skip. Cannot be combined with after.
+            - after (tuple): The next_key of the previous page. Cannot be combined with offset.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
 
         Returns:
         -------
-            - None
+            - A HabitPage tuple with the list of HabitRow tuples and the key of the next page.
+    """
+    if order_by not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {order_by}")
+    if offset is not None and after is not None:
+        raise ValueError("Use either offset or after to page through the habits, not both.")
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return query_habits(username, habit_frequency, habit_type, created_from, created_to, min_streak,
+                                max_streak, order_by, descending, limit, offset, after, pooled_conn)
+
+    # Collect the filters which were given
+    conditions = ["habit_creator = ?"]
+    params = [username]
+    filters = [
+        ("habit_frequency = ?", habit_frequency),
+        ("habit_type = ?", habit_type),
+        (f"{seconds_sql('created_datetime')} >= ?", created_from and to_epoch_seconds(created_from)),
+        (f"{seconds_sql('created_datetime')} <= ?", created_to and to_epoch_seconds(created_to)),
+        ("habit_streak >= ?", min_streak),
+        ("habit_streak <= ?", max_streak),
+    ]
+    for condition, value in filters:
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+
+    # Continue after the last habit of the previous page. Sorted by habit_id, the page is a range of the index
+    # on (habit_creator, habit_id), otherwise habit_id breaks the ties of the sort key.
+    sort_key = SORT_KEYS[order_by]
+    direction = "DESC" if descending else "ASC"
+    comparison = "<" if descending else ">"
+    if order_by == 'habit_id':
+        if after is not None:
+            conditions.append(f"habit_id {comparison} ?")
+            params.append(after[1])
+        order = f"habit_id {direction}"
+    else:
+        if after is not None:
+            conditions.append(f"({sort_key}, habit_id) {comparison} (?, ?)")
+            params.extend(after)
+        order = f"{sort_key} {direction}, habit_id {direction}"
+
+    sql = f"SELECT {HABIT_LIST_COLUMNS}, {sort_key} FROM HabitsData WHERE {' AND '.join(conditions)} ORDER BY {order}"
+    if limit is not None or offset is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([-1 if limit is None else limit, offset or 0])
+    rows = conn.execute(sql, params).fetchall()
+
+    next_key = None
+    if limit is not None and len(rows) == limit and rows:
+        next_key = (rows[-1][-1], rows[-1][0])
+    return HabitPage([HabitRow(*row[:-1]) for row in rows], next_key)
+
+
+def iter_habit_pages(username, page_size=PAGE_SIZE, conn=None, **filters):
     """
+        Pages through the habits of a user with keyset pagination, sorted by habit id.
 
-    # Connect to the database
-    connect_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'habit_tracker_db.db')
-    conn = sqlite3.connect(connect_db)
-    cursor = conn.cursor()
+        Every page is read with its own query on the index of the habits of a user, so each page costs the same,
+        however far into the listing it is.
 
-    # Retrieve all habits created by the user
-    cursor.execute("SELECT habit_name, habit_creator, habit_type, habit_frequency, created_datetime, "
-                   "last_completion_date FROM HabitsData WHERE habit_creator=?", (username,))
-    habits_list = cursor.fetchall()
+        Args:
+        -----
+            - username (str): The username whose habits are listed.
+            - page_size (int): The number of habits of a page.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - filters: The filters of query_habits(), e.g. habit_frequency.
 
-    # If there are no habits in the user account, print a message and return
-    if len(habits_list) == 0:
-        print("There are no habits to display.")
-        return
+        Yields:
+        -------
+            - The lists of HabitRow tuples of the pages, none of which is empty.
+    """
+    after = None
+    while True:
+        page = query_habits(username, limit=page_size, after=after, conn=conn, **filters)
+        if page.rows:
+            yield page.rows
+        if page.next_key is None:
+            return
+        after = page.next_key
 
-    # Create a table of habit data
-    table_data = [['Habit Name', 'Habit Creator', 'Habit Type', 'Habit Frequency', 'Created Datetime',
-                   'Last Completion Date']]
-    table_data += list(map(lambda h: [h[0], h[1], h[2], h[3], h[4], h[5]], habits_list))
 
-    # Display the table
-    table = Texttable()
-    table.set_cols_width([20, 20, 15, 20, 30, 30])
-    table.add_rows(table_data)
-    print("Your all created habits list is as follows :)")
-    print(table.draw())
+def iter_longest_streak_pages(username, page_size=PAGE_SIZE, conn=None):
+    """
+        Pages through the longest run streaks of the habits of a user with keyset pagination, sorted by habit name.
 
+        Args:
+        -----
+            - username (str): The username whose habits are listed.
+            - page_size (int): The number of habits of a page.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a pooled connection for every page.
 
-def show_daily_habits(username):
+        Yields:
+        -------
+            - The lists of table rows of the pages, none of which is empty. A row holds the habit name, creator, type
+              and frequency, the start and end dates of the longest streak and the longest streak.
     """
-        Displays a table of all daily habits created by a given user.
+    after = None
+    while True:
+        rows = _longest_streak_page(username, page_size, after, conn)
+        if rows:
+            yield [list(row[:-2]) for row in rows]
+        if len(rows) < page_size:
+            return
+        after = rows[-1][-2:]
+
+
+def _longest_streak_page(username, page_size, after, conn=None):
+    """
+        Reads the page of longest run streaks which follows the habit name and id given by after, each row ending
+        with the sort key of the habit name and the habit id.
+    """
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return _longest_streak_page(username, page_size, after, pooled_conn)
+
+    # Habit names are unique per user, so the habit id only orders the habits without a name
+    condition, params = "", [username]
+    if after is not None:
+        condition = "AND (COALESCE(habit_name, ''), habit_id) > (?, ?) "
+        params.extend(after)
+    return conn.execute(f"SELECT habit_name, habit_creator, habit_type, habit_frequency, "
+                        f"{LONGEST_STREAK_START_DATE}, {LONGEST_STREAK_END_DATE}, longest_streak, "
+                        "COALESCE(habit_name, ''), habit_id FROM HabitsData "
+                        f"WHERE habit_creator = ? AND longest_streak_id IS NOT NULL {condition}"
+                        "ORDER BY COALESCE(habit_name, ''), habit_id LIMIT ?", params + [page_size]).fetchall()
+
+
+def _pages(rows, page_size=PAGE_SIZE):
+    """
+        Splits the rows of a table which is already computed into pages for print_table_pages().
+    """
+    return (rows[start:start + page_size] for start in range(0, len(rows), page_size))
+
+
+def print_table_pages(pages, header, cols_width, title, empty_message):
+    """
+        Prints a table page by page. Every page is drawn with the same fixed column widths and the top border of
+        every page after the first one is left out, so the printed table is the same as one Texttable of all rows,
+        but no more than one page is held in memory.
+
+        Args:
+        -----
+            - pages (iterable): The lists of table rows of the pages.
+            - header (list): The column names.
+            - cols_width (list): The width of every column.
+            - title (str): The title above the table.
+            - empty_message (str): The message if there are no rows to display.
+
+        Returns:
+        --------
+            - The number of printed rows.
+    """
+    count = 0
+    for rows in pages:
+        table = Texttable()
+        table.set_cols_width(cols_width)
+        if count == 0:
+            print(title)
+            table.header(header)
+        table.add_rows(rows, header=False)
+        text = table.draw()
+        # The bottom border of the previous page separates its last row from the first row of this page
+        print(text if count == 0 else text.split("\n", 1)[1])
+        count += len(rows)
+
+    if count == 0:
+        print(empty_message)
+    return count
+
+
+def show_habit_list(username, habit_frequency=None, empty_message="There are no habits to display.",
+                    title="Your all created habits list is as follows :)"):
+    """
+        Displays a table of the habits created by a given user.
 
         Args:
         -----
             - username (str): The username whose habits are to be displayed.
+            - habit_frequency (str): Only display the habits with this frequency. Defaults to all habits.
+            - empty_message (str): The message if there are no habits to display.
+            - title (str): The title above the table.
 
         Returns:
         -------
             - None
     """
 
-    # Connect to the database
-    connect_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'habit_tracker_db.db')
-    conn = sqlite3.connect(connect_db)
-    cursor = conn.cursor()
+    # Print the habits created by the user page by page
+    pages = iter_habit_pages(username, habit_frequency=habit_frequency)
+    header = ['Habit Name', 'Habit Creator', 'Habit Type', 'Habit Frequency', 'Created Datetime',
+              'Last Completion Date']
+    print_table_pages((list(map(lambda h: [h.habit_name, h.habit_creator, h.habit_type, h.habit_frequency,
+                                           h.created_datetime, h.last_completion_date], rows)) for rows in pages),
+                      header, [20, 20, 15, 20, 30, 30], title, empty_message)
 
-    # Retrieve all habits created by the user
-    cursor.execute("SELECT habit_name, habit_creator, habit_type, habit_frequency, created_datetime, "
-                   "last_completion_date FROM HabitsData WHERE habit_creator=? AND habit_frequency='Daily'",
-                   (username,))
-    habits_list = cursor.fetchall()
 
-    # If there are no habits in the user account, print a message and return
-    if len(habits_list) == 0:
-        print("There are no daily habits to display.")
-        return
+def show_all_habits(username):
+    """
+        Displays a table of all habits created by a given user.
 
-    # Create a table of habit data
-    table_data = [['Habit Name', 'Habit Creator', 'Habit Type', 'Habit Frequency', 'Created Datetime',
-                   'Last Completion Date']]
-    table_data += list(map(lambda h: [h[0], h[1], h[2], h[3], h[4], h[5]], habits_list))
+        Args:
+        -----
+            - username (str): The username whose habits are to be displayed.
 
-    # Display the table
-    table = Texttable()
-    table.set_cols_width([20, 20, 15, 20, 30, 30])
-    table.add_rows(table_data)
-    print("Your all created daily habits list is as follows :)")
-    print(table.draw())
+        Returns:
+        -------
+            - None
+    """
+    show_habit_list(username)
 
 
-def show_weekly_habits(username):
+def show_daily_habits(username):
     """
-        Displays a table of all weekly habits created by a given user.
+        Displays a table of all daily habits created by a given user.
 
         Args:
         -----
@@ -104,34 +325,24 @@ def show_weekly_habits(username):
         -------
             - None
     """
+    show_habit_list(username, 'Daily', "There are no daily habits to display.",
+                    "Your all created daily habits list is as follows :)")
 
-    # Connect to the database
-    connect_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'habit_tracker_db.db')
-    conn = sqlite3.connect(connect_db)
-    cursor = conn.cursor()
-
-    # Retrieve all habits created by the user
-    cursor.execute("SELECT habit_name, habit_creator, habit_type, habit_frequency, created_datetime, "
-                   "last_completion_date FROM HabitsData WHERE habit_creator=? AND habit_frequency='Weekly'",
-                   (username,))
-    habits_list = cursor.fetchall()
 
-    # If there are no habits in the user account, print a message and return
-    if len(habits_list) == 0:
-        print("There are no weekly habits to display.")
-        return
+def show_weekly_habits(username):
+    """
+        Displays a table of all weekly habits created by a given user.
 
-    # Create a table of habit data
-    table_data = [['Habit Name', 'Habit Creator', 'Habit Type', 'Habit Frequency', 'Created Datetime',
-                   'Last Completion Date']]
-    table_data += list(map(lambda h: [h[0], h[1], h[2], h[3], h[4], h[5]], habits_list))
+        Args:
+        -----
+            - username (str): The username whose habits are to be displayed.
 
-    # Display the table
-    table = Texttable()
-    table.set_cols_width([20, 20, 15, 20, 30, 30])
-    table.add_rows(table_data)
-    print("Your all created weekly habits list is as follows :)")
-    print(table.draw())
+        Returns:
+        -------
+            - None
+    """
+    show_habit_list(username, 'Weekly', "There are no weekly habits to display.",
+                    "Your all created weekly habits list is as follows :)")
 
 
 def current_streak_summary(username):
@@ -148,32 +359,15 @@ def current_streak_summary(username):
             - None
 
     """
-    # Connect to the database
-    connect_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'habit_tracker_db.db')
-    conn = sqlite3.connect(connect_db)
-    cursor = conn.cursor()
-
-    # Retrieve all habits created by the user
-    cursor.execute("SELECT habit_name, habit_creator, habit_type, habit_frequency, created_datetime, "
-                   "last_completion_date, habit_streak FROM HabitsData WHERE habit_creator=?", (username,))
-    habits_list = cursor.fetchall()
-
-    # If there are no habits in the user account, print a message and return
-    if len(habits_list) == 0:
-        print("There are no habits to display current streaks.")
-        return
-
-    # Create a table of habit data
-    table_data = [['Habit Name', 'Habit Creator', 'Habit Type', 'Habit Frequency', 'Created Datetime',
-                   'Last Completion Date', 'Habit Streak']]
-    table_data += list(map(lambda h: [h[0], h[1], h[2], h[3], h[4], h[5], h[6]], habits_list))
-
-    # Display the table
-    table = Texttable()
-    table.set_cols_width([20, 15, 15, 10, 30, 30, 10])
-    table.add_rows(table_data)
-    print("Your Current Streak Summary of all created habits list is as follows :)")
-    print(table.draw())
+    # Print the habits created by the user with their current streaks page by page
+    header = ['Habit Name', 'Habit Creator', 'Habit Type', 'Habit Frequency', 'Created Datetime',
+              'Last Completion Date', 'Habit Streak']
+    print_table_pages((list(map(lambda h: [h.habit_name, h.habit_creator, h.habit_type, h.habit_frequency,
+                                           h.created_datetime, h.last_completion_date, h.habit_streak], rows))
+                       for rows in iter_habit_pages(username)),
+                      header, [20, 15, 15, 10, 30, 30, 10],
+                      "Your Current Streak Summary of all created habits list is as follows :)",
+                      "There are no habits to display current streaks.")
 
 
 def current_streak_of_selected_habit(username):
@@ -186,36 +380,29 @@ def current_streak_of_selected_habit(username):
 
         Returns:
         -------
-            - The current streak of the selected habit.
+            - The current streak of the selected habit, or None if the habit no longer exists.
     """
 
-    # Connect to the database
-    connect_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'habit_tracker_db.db')
-    conn = sqlite3.connect(connect_db)
-    cursor = conn.cursor()
-
-    # Get a list of the user's habits
-    cursor.execute("SELECT habit_name, habit_frequency, habit_type FROM HabitsData WHERE habit_creator=?", (username,))
-    habits = cursor.fetchall()
+    # Get the user's habits as choices, which carry the id of every habit and are cached until the habits change
+    habits = habit_choices(HabitService(username).habit_summaries())
 
     # If the user has not created any habits yet, inform them and exit
     if not habits:
         print("You have not created any habits yet.")
         return
 
-    # Create a list of habit names, frequencies, and types to display to the user
-    habit_list = list(map(lambda h: f"{h[0]} ~~~ {h[1]} ~~~ {h[2]}", habits))
-
-    # Prompt the user to select a habit from the list
-    selected_habit = questionary.select("Select a habit from the list:", choices=habit_list).ask()
-    selected_habit_name = selected_habit.split("~~~")[0].strip()
-    selected_habit_frequency = selected_habit.split("~~~")[1].strip()
-    selected_habit_type = selected_habit.split("~~~")[2].strip()
+    # Prompt the user to select a habit from the list, whose titles show the names, frequencies, and types
+    selected_habit = questionary.select("Select a habit from the list:", choices=list(habits)).ask()
+    habit_id = habits[selected_habit].habit_id
 
     # Retrieve the current streak for the selected habit
-    result = cursor.execute("SELECT habit_streak FROM HabitsData WHERE habit_name= ? and habit_creator= ? "
-                            "and habit_type= ? and habit_frequency= ?",
-                            (selected_habit_name, username, selected_habit_type, selected_habit_frequency)).fetchone()
+    with storage.connection() as conn:
+        result = conn.execute("SELECT habit_streak FROM HabitsData WHERE habit_id = ?", (habit_id,)).fetchone()
+
+    # The habit may have been deleted since the choices were read, for example by another session of the user
+    if result is None:
+        print(f"{selected_habit} no longer exists.")
+        return
     current_streak = result[0]
 
     # Display the current streak to the user and return the result
@@ -238,35 +425,12 @@ def longest_streak_summary(username):
             - None
 
     """
-
-    # Connect to the database
-    connect_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'habit_tracker_db.db')
-    conn = sqlite3.connect(connect_db)
-    cursor = conn.cursor()
-
-    # Retrieve all habits created by the user
-    cursor.execute("SELECT habit_name, habit_creator, habit_type, habit_frequency, streak_start_date, "
-                   "streak_end_date, MAX(streak_length) as longest_streak "
-                   "FROM StreaksData WHERE habit_creator=? "
-                   "GROUP BY habit_name, habit_creator, habit_type, habit_frequency", (username,))
-    habits_list = cursor.fetchall()
-
-    # If there are no habits in the user account, print a message and return
-    if len(habits_list) == 0:
-        print("There are no habits to display longest run streaks.")
-        return
-
-    # Create a table of habit data
-    table_data = [['Habit Name', 'Habit Creator', 'Habit Type', 'Habit Frequency', 'Streak Start Date',
-                   'Streak End Date', 'Habit Streak']]
-    table_data += list(map(lambda h: [h[0], h[1], h[2], h[3], h[4], h[5], h[6]], habits_list))
-
-    # Display the table
-    table = Texttable()
-    table.set_cols_width([20, 15, 15, 10, 30, 30, 10])
-    table.add_rows(table_data)
-    print("Your Longest run Streak Summary of all created habits list is as follows :)")
-    print(table.draw())
+    # Print the longest streak of every habit created by the user, which is kept in HabitsData, page by page
+    header = ['Habit Name', 'Habit Creator', 'Habit Type', 'Habit Frequency', 'Streak Start Date',
+              'Streak End Date', 'Habit Streak']
+    print_table_pages(iter_longest_streak_pages(username), header, [20, 15, 15, 10, 30, 30, 10],
+                      "Your Longest run Streak Summary of all created habits list is as follows :)",
+                      "There are no habits to display longest run streaks.")
 
 
 def longest_streak_of_selected_habit(username):
@@ -279,39 +443,316 @@ def longest_streak_of_selected_habit(username):
 
         Returns:
         -------
-            - The longest run streak of the selected habit.
+            - The longest run streak of the selected habit, or None if the habit no longer exists.
     """
 
-    # Connect to the database
-    connect_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'habit_tracker_db.db')
-    conn = sqlite3.connect(connect_db)
-    cursor = conn.cursor()
-
-    # Get a list of the user's habits
-    cursor.execute("SELECT habit_name, habit_frequency, habit_type FROM HabitsData WHERE habit_creator=?", (username,))
-    habits = cursor.fetchall()
+    # Get the user's habits as choices, which carry the id of every habit and are cached until the habits change
+    habits = habit_choices(HabitService(username).habit_summaries())
 
     # If the user has not created any habits yet, inform them and exit
     if not habits:
         print("You have not created any habits yet.")
         return
 
-    # Create a list of habit names, frequencies, and types to display to the user
-    habit_list = list(map(lambda h: f"{h[0]} ~~~ {h[1]} ~~~ {h[2]}", habits))
-
-    # Prompt the user to select a habit from the list
-    selected_habit = questionary.select("Select a habit from the list:", choices=habit_list).ask()
-    selected_habit_name = selected_habit.split("~~~")[0].strip()
-    selected_habit_frequency = selected_habit.split("~~~")[1].strip()
-    selected_habit_type = selected_habit.split("~~~")[2].strip()
+    # Prompt the user to select a habit from the list, whose titles show the names, frequencies, and types
+    selected_habit = questionary.select("Select a habit from the list:", choices=list(habits)).ask()
+    habit_id = habits[selected_habit].habit_id
 
     # Retrieve the longest run streak for the selected habit
-    result = cursor.execute("SELECT MAX(streak_length) as longest_streak FROM StreaksData "
-                            "WHERE habit_name= ? and habit_creator= ? and habit_type= ? and habit_frequency= ?",
-                            (selected_habit_name, username, selected_habit_type, selected_habit_frequency)).fetchone()
+    with storage.connection() as conn:
+        result = conn.execute("SELECT longest_streak FROM HabitsData WHERE habit_id = ?", (habit_id,)).fetchone()
+
+    # The habit may have been deleted since the choices were read, for example by another session of the user
+    if result is None:
+        print(f"{selected_habit} no longer exists.")
+        return
     longest_streak = result[0]
 
     # Display the longest run streak to the user and return the result
     print("The longest run streak of your selected habit is as follows.")
     print(f"Longest streak of {selected_habit}: {longest_streak}")
     return result
+
+
+def _day_of(now):
+    """
+        Returns the epoch day of the wall-clock date of a datetime, like the days of the CompletionDays rollup.
+    """
+    return to_epoch_seconds((now or datetime.now()).replace(microsecond=0)) // 86400
+
+
+def _expected_completions(habit_frequency, days):
+    """
+        Returns the number of check-offs which keep a habit of the given frequency on track during a number of days.
+    """
+    return -(-days // FREQUENCY_DAYS[habit_frequency]) if days > 0 else 0
+
+
+def completion_rates(username, windows=RATE_WINDOWS, now=None, conn=None):
+    """
+        Computes the completion rates of all habits of a user over the trailing windows of days up to today.
+
+        The completions are summed per window from the CompletionDays rollup, and the expected check-offs of a window
+        are one per frequency range of the days on which the habit existed, so a habit created last week is not rated
+        over 90 days.
+
+        Args:
+        -----
+            - username (str): The username whose habits are rated.
+            - windows (tuple): The numbers of days of the windows, each ending today.
+            - now (datetime): The datetime whose date is the last day of the windows. Defaults to the current datetime.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Returns:
+        -------
+            - A list of CompletionRate tuples ordered by habit name, whose completions, expected check-offs and rates
+              are tuples in the order of the windows. The rate of a window is None if the habit did not exist yet.
+    """
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return completion_rates(username, windows, now, pooled_conn)
+
+    today = _day_of(now)
+    sums = ", ".join("COALESCE(SUM(CASE WHEN d.day > ? THEN d.completions END), 0)" for _ in windows)
+    rows = conn.execute(
+        "SELECT h.habit_id, h.habit_name, h.habit_type, h.habit_frequency, COALESCE(h.habit_streak, 0), "
+        f"COALESCE(h.longest_streak, 0), COALESCE({seconds_sql('h.created_datetime')} / 86400, ?), {sums} "
+        "FROM HabitsData h LEFT JOIN CompletionDays d ON d.habit_id = h.habit_id AND d.day > ? AND d.day <= ? "
+        "WHERE h.habit_creator = ? GROUP BY h.habit_id ORDER BY h.habit_name, h.habit_id",
+        [today, *(today - window for window in windows), today - max(windows), today, username]).fetchall()
+
+    rates = []
+    for habit_id, habit_name, habit_type, habit_frequency, habit_streak, longest_streak, created_day, *done in rows:
+        expected = tuple(_expected_completions(habit_frequency, min(window, today - created_day + 1))
+                         for window in windows)
+        rates.append(CompletionRate(habit_id, habit_name, habit_type, habit_frequency, habit_streak, longest_streak,
+                                    tuple(done), expected,
+                                    tuple(count / total if total else None for count, total in zip(done, expected))))
+    return rates
+
+
+def completion_trend(habit_id, days=30, window=7, now=None, conn=None):
+    """
+        Computes the rolling completion rate of a habit for every one of the last days, over the window of days
+        ending on that day, with a window function over the CompletionDays rollup.
+
+        Args:
+        -----
+            - habit_id (int): The id of the habit.
+            - days (int): The number of days of the trend, ending today.
+            - window (int): The number of days over which every rate is computed.
+            - now (datetime): The datetime whose date is the last day of the trend. Defaults to the current datetime.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Returns:
+        -------
+            - A list of TrendPoint tuples from the oldest day to today, whose rate is None before the habit existed,
+              or an empty list if the habit does not exist.
+    """
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return completion_trend(habit_id, days, window, now, pooled_conn)
+
+    habit = conn.execute(f"SELECT habit_frequency, COALESCE({seconds_sql('created_datetime')} / 86400, 0) FROM HabitsData "
+                         "WHERE habit_id = ?", (habit_id,)).fetchone()
+    if habit is None:
+        return []
+    habit_frequency, created_day = habit
+    today = _day_of(now)
+    first_day = today - days + 1
+
+    # The calendar starts window - 1 days earlier, so the first day of the trend has a full window behind it
+    rows = conn.execute(
+        "WITH RECURSIVE calendar (day) AS (SELECT ? UNION ALL SELECT day + 1 FROM calendar WHERE day < ?) "
+        "SELECT c.day, COALESCE(d.completions, 0), SUM(COALESCE(d.completions, 0)) OVER "
+        f"(ORDER BY c.day ROWS BETWEEN {int(window) - 1} PRECEDING AND CURRENT ROW) "
+        "FROM calendar c LEFT JOIN CompletionDays d ON d.habit_id = ? AND d.day = c.day ORDER BY c.day",
+        (first_day - window + 1, today, habit_id)).fetchall()
+
+    trend = []
+    for day, completions, window_completions in rows[window - 1:]:
+        expected = _expected_completions(habit_frequency, min(window, day - created_day + 1))
+        trend.append(TrendPoint(EPOCH_DATE + timedelta(days=day), completions,
+                                window_completions / expected if expected else None))
+    return trend
+
+
+def weekday_completions(username, days=None, now=None, conn=None):
+    """
+        Counts the completions of all habits of a user per weekday from the CompletionDays rollup.
+
+        Args:
+        -----
+            - username (str): The username whose habits are counted.
+            - days (int): Only count the completions of this number of days up to today. Defaults to all completions.
+            - now (datetime): The datetime whose date is the last counted day. Defaults to the current datetime.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Returns:
+        -------
+            - A list of WeekdayCounts tuples ordered by habit name, whose counts start on Monday.
+    """
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return weekday_completions(username, days, now, pooled_conn)
+
+    condition, params = "", [username]
+    if days is not None:
+        today = _day_of(now)
+        condition = "AND d.day > ? AND d.day <= ? "
+        params = [today - days, today, username]
+
+    # The epoch day 0 was a Thursday, so (day + 3) % 7 is 0 on Mondays
+    counts = {}
+    for habit_id, habit_name, weekday, completions in conn.execute(
+            "SELECT h.habit_id, h.habit_name, (d.day + 3) % 7, SUM(d.completions) FROM HabitsData h "
+            f"LEFT JOIN CompletionDays d ON d.habit_id = h.habit_id {condition}"
+            "WHERE h.habit_creator = ? GROUP BY h.habit_id, 3 ORDER BY h.habit_name, h.habit_id", params):
+        habit_counts = counts.setdefault(habit_id, (habit_name, [0] * 7))[1]
+        if weekday is not None:
+            habit_counts[weekday] = completions
+    return [WeekdayCounts(habit_id, habit_name, tuple(habit_counts))
+            for habit_id, (habit_name, habit_counts) in counts.items()]
+
+
+def habit_type_rates(username, windows=RATE_WINDOWS, now=None, conn=None):
+    """
+        Aggregates the completion rates and streaks of the habits of a user by habit type.
+
+        Args:
+        -----
+            - username (str): The username whose habits are aggregated.
+            - windows (tuple): The numbers of days of the windows, each ending today.
+            - now (datetime): The datetime whose date is the last day of the windows. Defaults to the current datetime.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Returns:
+        -------
+            - A list of HabitTypeSummary tuples ordered by habit type, whose rates are the completions of all habits
+              of the type divided by their expected check-offs, in the order of the windows.
+    """
+    types = {}
+    for rate in completion_rates(username, windows, now, conn):
+        types.setdefault(rate.habit_type, []).append(rate)
+
+    summaries = []
+    for habit_type in sorted(types, key=lambda name: name or ''):
+        habits = types[habit_type]
+        completions = tuple(map(sum, zip(*(habit.completions for habit in habits))))
+        expected = tuple(map(sum, zip(*(habit.expected for habit in habits))))
+        summaries.append(HabitTypeSummary(
+            habit_type, len(habits), sum(habit.habit_streak for habit in habits) / len(habits),
+            max(habit.longest_streak for habit in habits), completions, expected,
+            tuple(count / total if total else None for count, total in zip(completions, expected))))
+    return summaries
+
+
+def _rate_cell(completions, expected, rate):
+    """
+        Formats the completions of a window and their rate for a table, e.g. '6/7 (86%)'.
+    """
+    return "-" if rate is None else f"{completions}/{expected} ({rate:.0%})"
+
+
+def completion_rate_summary(username):
+    """
+        Displays a table of the completion rates of all habits existed in the user account over the last 7, 30 and
+        90 days.
+
+        Args:
+        -----
+            - username (str): The username for whom the completion rates have to be shown.
+
+        Returns:
+        -------
+            - The list of CompletionRate tuples.
+    """
+    rates = completion_rates(username)
+    header = ['Habit Name', 'Habit Type', 'Habit Frequency'] + [f'Last {window} Days' for window in RATE_WINDOWS]
+    print_table_pages((list(map(lambda r: [r.habit_name, r.habit_type, r.habit_frequency] +
+                                list(map(_rate_cell, r.completions, r.expected, r.rates)), page))
+                       for page in _pages(rates)),
+                      header, [20, 15, 10] + [15] * len(RATE_WINDOWS),
+                      "Your Completion Rates of all created habits are as follows :)",
+                      "There are no habits to display completion rates.")
+    return rates
+
+
+def completion_trend_of_selected_habit(username):
+    """
+        Displays the rolling 7-day completion rate of a habit selected by the user for each of the last 30 days.
+
+        Args:
+        -----
+            - username (str): The username of the user.
+
+        Returns:
+        -------
+            - The list of TrendPoint tuples of the selected habit.
+    """
+    habits = habit_choices(HabitService(username).habit_summaries())
+    if not habits:
+        print("You have not created any habits yet.")
+        return
+
+    selected_habit = questionary.select("Select a habit from the list:", choices=list(habits)).ask()
+    trend = completion_trend(habits[selected_habit].habit_id)
+
+    # An empty trend means the habit was deleted since the choices were read
+    print_table_pages((list(map(lambda p: [p.date.isoformat(), p.completions,
+                                           "-" if p.rate is None else f"{p.rate:.0%}"], page))
+                       for page in _pages(trend)),
+                      ['Date', 'Completions', '7-Day Rate'], [12, 12, 12],
+                      f"The completion trend of {selected_habit} is as follows.",
+                      f"{selected_habit} no longer exists.")
+    return trend
+
+
+def weekday_heat_map(username):
+    """
+        Displays a heat map of the completions of all habits existed in the user account per weekday.
+        The shade of every cell grows with its share of the busiest weekday of the habit.
+
+        Args:
+        -----
+            - username (str): The username for whom the heat map has to be shown.
+
+        Returns:
+        -------
+            - The list of WeekdayCounts tuples.
+    """
+    weekdays = weekday_completions(username)
+
+    def cells(counts):
+        busiest = max(counts) or 1
+        return [f"{count} {HEAT_SHADES[-(-count * (len(HEAT_SHADES) - 1) // busiest)]}" for count in counts]
+
+    print_table_pages((list(map(lambda w: [w.habit_name] + cells(w.counts), page)) for page in _pages(weekdays)),
+                      ['Habit Name'] + list(WEEKDAY_NAMES), [20] + [6] * len(WEEKDAY_NAMES),
+                      "Your Weekday Heat Map of all created habits is as follows :)",
+                      "There are no habits to display a weekday heat map.")
+    return weekdays
+
+
+def habit_type_summary(username):
+    """
+        Displays a table of the habit count, streaks and completion rates of every habit type in the user account.
+
+        Args:
+        -----
+            - username (str): The username for whom the habit types have to be shown.
+
+        Returns:
+        -------
+            - The list of HabitTypeSummary tuples.
+    """
+    summaries = habit_type_rates(username)
+    header = (['Habit Type', 'Habits', 'Average Streak', 'Longest Streak'] +
+              [f'Last {window} Days' for window in RATE_WINDOWS])
+    print_table_pages((list(map(lambda s: [s.habit_type, s.habits, f"{s.average_streak:.1f}", s.longest_streak] +
+                                list(map(_rate_cell, s.completions, s.expected, s.rates)), page))
+                       for page in _pages(summaries)),
+                      header, [15, 8, 10, 10] + [15] * len(RATE_WINDOWS),
+                      "Your Habit Type Statistics are as follows :)",
+                      "There are no habits to display habit type statistics.")
+    return summaries
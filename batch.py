@@ -0,0 +1,326 @@
+"""
+This module contains the scripted command mode of the habit tracker app.
+It reads a stream of commands (register, create, complete and report) as JSON lines or CSV rows
+and runs them against the HabitService of the service module in batched transactions, so recorded traffic can be
+replayed and data can be imported without the interactive menu.
+It imports csv, json, sqlite3, sys, time, leaderboard, storage, namedtuple, datetime, islice, DATETIME_FORMAT
+from Habit module, the password hashing of the passwords module and the service module.
+"""
+
+import csv
+import json
+import sqlite3
+import sys
+import time
+import leaderboard
+import storage
+
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+from Habit import DATETIME_FORMAT
+from passwords import current_hashing, hash_password, password_executor
+from service import HabitService, password_is_valid, register_user
+
+# The formats in which the commands can be read
+SCRIPT_FORMATS = ("jsonl", "csv")
+
+# The default number of commands which are committed together in one transaction
+DEFAULT_BATCH_SIZE = 500
+
+# The result of run_commands()
+ScriptResult = namedtuple('ScriptResult', ['commands', 'errors', 'batches', 'duration'])
+
+# The fields of a command which must be strings, and the ones of them which may also be left empty with null
+TEXT_FIELDS = ("command", "forename", "surname", "username", "password", "habit_name", "habit_type",
+               "habit_frequency", "at", "report", "kind")
+OPTIONAL_TEXT_FIELDS = ("forename", "surname", "at")
+
+# The fields of a command which must be whole numbers, given as numbers in JSON or as digits in CSV
+NUMBER_FIELDS = ("habit_id", "limit")
+
+
+def read_jsonl(stream):
+    """
+        Reads commands from a stream of JSON lines, one JSON object per line. Empty lines are skipped,
+        and a line which is no JSON object gives a command with an 'invalid' field, which fails when it is run.
+
+        Args:
+        -----
+            - stream (file): The text stream to read from.
+
+        Yields:
+        -------
+            - A tuple of the line number and the command as a dictionary.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            command = json.loads(line)
+        except json.JSONDecodeError as e:
+            command = {"invalid": f"Invalid JSON: {e}"}
+        if not isinstance(command, dict):
+            command = {"invalid": "A command must be a JSON object."}
+        yield line_number, command
+
+
+def read_csv(stream):
+    """
+        Reads commands from a CSV stream whose header row names the fields, e.g. 'command,username,habit_name,...'.
+        Empty cells are left out of the command.
+
+        Args:
+        -----
+            - stream (file): The text stream to read from.
+
+        Yields:
+        -------
+            - A tuple of the line number and the command as a dictionary.
+    """
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, {field: value for field, value in row.items() if field and value not in (None, "")}
+
+
+def check_fields(command):
+    """
+        Checks the types of the fields of a command, since a JSON line can give any field any type.
+
+        Args:
+        -----
+            - command (dict): The command.
+
+        Raises:
+        -------
+            - ValueError: If a field has the wrong type, e.g. a habit_name which is a number.
+    """
+    for field in TEXT_FIELDS:
+        if field not in command or (command[field] is None and field in OPTIONAL_TEXT_FIELDS):
+            continue
+        if not isinstance(command[field], str):
+            raise ValueError(f"The field {field} must be a string.")
+    for field in NUMBER_FIELDS:
+        if field in command and (isinstance(command[field], bool) or not isinstance(command[field], (int, str))):
+            raise ValueError(f"The field {field} must be a whole number.")
+
+
+def _parse_datetime(value):
+    """
+        Converts the 'at' field of a command into a datetime. A missing field gives None (the current datetime).
+    """
+    return datetime.fromisoformat(value) if value else None
+
+
+def _to_json(record):
+    """
+        Converts a namedtuple of the service module into a JSON compatible dictionary.
+    """
+    return {field: value.strftime(DATETIME_FORMAT) if isinstance(value, datetime) else value
+            for field, value in record._asdict().items()}
+
+
+class CommandRunner:
+    """
+    Creating a runner which executes scripted commands on one database connection.
+
+    Attributes:
+    -----------
+        - conn (sqlite3.Connection): The database connection of the runner.
+        - services (dict): The HabitService object of every username which occurred in the commands.
+        - habit_ids (dict): The habit id of every (username, habit name) which was already looked up.
+        - password_hashes (dict): The hashed password of every (username, password) of the register commands
+          of the current batch, see hash_passwords().
+    """
+
+    def __init__(self, conn):
+        """
+        Initializes a CommandRunner object.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection of the runner, or None for a connection of the
+              shared pool which every operation borrows only while it runs.
+        """
+        self.conn = conn
+        self.services = {}
+        self.habit_ids = {}
+        self.password_hashes = {}
+
+    def service(self, username):
+        """
+            Returns the HabitService of a user, which is created on first use.
+        """
+        if username not in self.services:
+            self.services[username] = HabitService(username, self.conn)
+        return self.services[username]
+
+    def habit_id(self, username, command):
+        """
+            Finds the habit id of a command, which names the habit either by 'habit_id' or by 'habit_name'.
+
+            Raises:
+            -------
+                - ValueError: If the user has no habit with the given name.
+        """
+        if "habit_id" in command:
+            return int(command["habit_id"])
+        key = (username, command["habit_name"])
+        if key not in self.habit_ids:
+            habit = self.service(username).find_habit(command["habit_name"])
+            if habit is None:
+                raise ValueError(f"There is no habit {command['habit_name']}.")
+            self.habit_ids[key] = habit.habit_id
+        return self.habit_ids[key]
+
+    def hash_passwords(self, commands):
+        """
+            Hashes the passwords of the register commands of a batch in the password thread pool, before the
+            transaction of the batch is opened, so the slow hashing does not hold the write lock of the database.
+            Commands with an invalid password or a missing field are left to fail when they are run.
+
+            Args:
+            -----
+                - commands (list): Tuples of the line number and the command.
+        """
+        self.password_hashes = {}
+        keys = {(command["username"], command["password"]) for _, command in commands
+                if command.get("command") == "register" and isinstance(command.get("username"), str)
+                and isinstance(command.get("password"), str) and password_is_valid(command["password"]) is True}
+        if not keys:
+            return
+        hashing = current_hashing(self.conn)
+        keys = list(keys)
+        hashes = password_executor().map(hash_password, [password for _, password in keys], [hashing] * len(keys))
+        self.password_hashes = dict(zip(keys, hashes))
+
+    def run(self, command):
+        """
+            Executes one command.
+
+            - register: forename, surname, username, password
+            - create: username, habit_name, habit_type, habit_frequency and optionally at (the creation datetime)
+            - complete: username, habit_name or habit_id and optionally at (the datetime of the check-off)
+            - report: username and optionally report ('habits', the default, 'longest_streaks' or 'leaderboard');
+              the leaderboard of all users needs habit_type and habit_frequency, and optionally takes kind
+              ('current' or 'longest') and limit
+
+            Args:
+            -----
+                - command (dict): The command with its name in the 'command' field.
+
+            Returns:
+            --------
+                - The result as a JSON compatible dictionary, or a list of them for reports.
+
+            Raises:
+            -------
+                - ValueError: If the command is unknown, a field has the wrong type or the command cannot be executed.
+                - KeyError: If a required field is missing.
+        """
+        if "invalid" in command:
+            raise ValueError(command["invalid"])
+        check_fields(command)
+        name = command.get("command")
+        if name == "register":
+            return _to_json(register_user(command.get("forename"), command.get("surname"), command["username"],
+                                          command["password"], self.conn,
+                                          self.password_hashes.get((command["username"], command["password"]))))
+
+        username = command["username"]
+        if name == "create":
+            habit = self.service(username).create_habit(command["habit_name"], command["habit_type"],
+                                                        command["habit_frequency"], _parse_datetime(command.get("at")))
+            self.habit_ids[(username, habit.habit_name)] = habit.habit_id
+            return _to_json(habit)
+        if name == "complete":
+            return _to_json(self.service(username).complete_habit(self.habit_id(username, command),
+                                                                  _parse_datetime(command.get("at"))))
+        if name == "report":
+            report = command.get("report", "habits")
+            if report == "habits":
+                return [_to_json(habit) for habit in self.service(username).list_habits(command.get("habit_frequency"))]
+            if report == "longest_streaks":
+                return [_to_json(streak) for streak in self.service(username).longest_streaks()]
+            if report == "leaderboard":
+                return [_to_json(entry) for entry in leaderboard.top_streaks(
+                    command["habit_type"], command["habit_frequency"], command.get("kind", "current"),
+                    int(command.get("limit", leaderboard.DEFAULT_LIMIT)), self.conn)]
+            raise ValueError(f"Unknown report: {report}")
+        raise ValueError(f"Unknown command: {name}")
+
+
+def run_commands(commands, conn=None, batch_size=DEFAULT_BATCH_SIZE, output=None):
+    """
+        Executes a stream of commands, committing them together in transactions of batch_size commands.
+
+        Every command runs inside its own SAVEPOINT, so a failing command, including one which fails in the
+        database, is rolled back and reported without undoing the other commands of its batch.
+        The passwords of the register commands of a batch are hashed before its transaction is opened.
+        The result of every report and the error of every failing command are written to the output as JSON lines.
+
+        Args:
+        -----
+            - commands (iterable): Tuples of the line number and the command, see read_jsonl() and read_csv().
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - batch_size (int): The number of commands which are committed together.
+            - output (file): The text stream for the reports and errors. Defaults to sys.stdout.
+
+        Returns:
+        --------
+            - A ScriptResult tuple with the number of commands, failed commands, transactions and the duration in seconds.
+    """
+    if batch_size < 1:
+        raise ValueError("The batch size must be at least 1.")
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return run_commands(commands, pooled_conn, batch_size, output)
+    output = output or sys.stdout
+
+    runner = CommandRunner(conn)
+    count = errors = batches = 0
+    started = time.perf_counter()
+    commands = iter(commands)
+    while True:
+        batch = list(islice(commands, batch_size))
+        runner.hash_passwords(batch)
+        with storage.transaction(conn):
+            for line_number, command in batch:
+                try:
+                    with storage.transaction(conn):
+                        result = runner.run(command)
+                except (ValueError, KeyError, TypeError, sqlite3.Error) as e:
+                    errors += 1
+                    output.write(json.dumps({"line": line_number, "command": command.get("command"),
+                                             "error": str(e)}) + "\n")
+                else:
+                    if command.get("command") == "report":
+                        output.write(json.dumps({"line": line_number, "username": command["username"],
+                                                 "report": result}) + "\n")
+        count += len(batch)
+        if batch:
+            batches += 1
+        if len(batch) < batch_size:
+            break
+    return ScriptResult(count, errors, batches, time.perf_counter() - started)
+
+
+def run_script(stream, script_format="jsonl", batch_size=DEFAULT_BATCH_SIZE, output=None):
+    """
+        Reads the commands of a stream in the given format and executes them with run_commands().
+
+        Args:
+        -----
+            - stream (file): The text stream to read from.
+            - script_format (str): 'jsonl' or 'csv'.
+            - batch_size (int): The number of commands which are committed together.
+            - output (file): The text stream for the reports and errors. Defaults to sys.stdout.
+
+        Returns:
+        --------
+            - A ScriptResult tuple, see run_commands().
+    """
+    if script_format not in SCRIPT_FORMATS:
+        raise ValueError(f"Unknown script format: {script_format}")
+    commands = read_jsonl(stream) if script_format == "jsonl" else read_csv(stream)
+    return run_commands(commands, batch_size=batch_size, output=output)
@@ -0,0 +1,159 @@
+"""
+This module benchmarks the queries for the longest streak of every habit on a large synthetic streak history.
+It compares the former GROUP BY query, whose start and end dates rely on SQLite's bare column behaviour,
+with the window function query of the streaks module and with the longest streak columns of HabitsData,
+for all users at once and for single users, and checks that they find the same streak lengths.
+It is run from the root directory of the app:
+
+    python -m benchmarks.longest_streaks --rows 1000000
+
+It imports argparse, os, random, sqlite3, tempfile, time, migrations, streaks and the timestamp adapters
+from Habit module.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import migrations
+import streaks
+
+from datetime import datetime, timedelta
+from Habit import DATETIME_FORMAT, HABIT_TYPES
+
+# The query of analytics.longest_streak_summary() before the longest streak columns and the window function query
+GROUP_BY_QUERY = ("SELECT habit_name, habit_creator, habit_type, habit_frequency, streak_start_date, "
+                  "streak_end_date, MAX(streak_length) as longest_streak FROM StreaksData {where}"
+                  "GROUP BY habit_name, habit_creator, habit_type, habit_frequency")
+
+# The read of the longest streak columns of HabitsData
+COLUMNS_QUERY = ("SELECT habit_name, habit_creator, habit_type, habit_frequency, longest_streak_start_date, "
+                 "longest_streak_end_date, longest_streak FROM HabitsData WHERE habit_creator = ? "
+                 "AND longest_streak_id IS NOT NULL ORDER BY habit_name, habit_type, habit_frequency")
+
+
+def create_fixture(conn, rows, users, habits_per_user, seed=0):
+    """
+        Fills a migrated database with habits and a synthetic streak history of the given number of rows,
+        spread evenly over the habits of all users.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - rows (int): The number of StreaksData rows.
+            - users (int): The number of users.
+            - habits_per_user (int): The number of habits of every user.
+            - seed (int): The seed of the random streak lengths.
+    """
+    randomizer = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    habits = [(f"Habit {habit}", f"user{user}", HABIT_TYPES[habit % len(HABIT_TYPES)],
+               "Daily" if habit % 2 == 0 else "Weekly") for user in range(users) for habit in range(habits_per_user)]
+
+    def streak_rows():
+        for row in range(rows):
+            habit_name, habit_creator, habit_type, habit_frequency = habits[row % len(habits)]
+            streak_start = start + timedelta(days=row // len(habits) * 40)
+            streak_length = randomizer.randint(1, 30)
+            yield (habit_name, habit_creator, habit_type, habit_frequency, streak_start.strftime(DATETIME_FORMAT),
+                   (streak_start + timedelta(days=streak_length)).strftime(DATETIME_FORMAT), streak_length)
+
+    with conn:
+        conn.executemany("INSERT INTO HabitsData (habit_name, habit_creator, habit_type, habit_frequency, "
+                         "created_datetime, last_completion_date, habit_streak) VALUES (?, ?, ?, ?, ?, NULL, 0)",
+                         [habit + (start.strftime(DATETIME_FORMAT),) for habit in habits])
+        conn.executemany("INSERT INTO StreaksData (habit_name, habit_creator, habit_type, habit_frequency, "
+                         "streak_start_date, streak_end_date, streak_length) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         streak_rows())
+    conn.execute("ANALYZE")
+
+
+def best_time(function, repeat):
+    """
+        Runs a function repeat times and returns its result and its fastest duration in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - started)
+    return result, min(durations)
+
+
+def run_benchmark(conn, users, repeat=3):
+    """
+        Times the longest streak queries and checks that they agree.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The connection to a database filled by create_fixture().
+            - users (int): The number of users of the fixture.
+            - repeat (int): The number of runs of every query, of which the fastest one counts.
+
+        Returns:
+        --------
+            - A list of tuples of the query name and its duration in seconds.
+    """
+    usernames = [f"user{user}" for user in range(min(users, 100))]
+    group_by_all, group_by_all_time = best_time(lambda: conn.execute(GROUP_BY_QUERY.format(where="")).fetchall(),
+                                                repeat)
+    window_all, window_all_time = best_time(lambda: streaks.longest_streaks(conn), repeat)
+    group_by_users, group_by_users_time = best_time(
+        lambda: [conn.execute(GROUP_BY_QUERY.format(where="WHERE habit_creator = ? "), (username,)).fetchall()
+                 for username in usernames], repeat)
+    window_users, window_users_time = best_time(
+        lambda: [streaks.longest_streaks(conn, username) for username in usernames], repeat)
+    columns_users, columns_users_time = best_time(
+        lambda: [conn.execute(COLUMNS_QUERY, (username,)).fetchall() for username in usernames], repeat)
+
+    # All queries find the same longest streak length for every habit
+    lengths = sorted((row[1], row[0], row[6]) for row in group_by_all)
+    if lengths != sorted((row.habit_creator, row.habit_name, row.streak_length) for row in window_all):
+        raise AssertionError("The window function query disagrees with the GROUP BY query.")
+    user_lengths = [sorted((row[0], row[6]) for row in rows) for rows in group_by_users]
+    if user_lengths != [sorted((row.habit_name, row.streak_length) for row in rows) for rows in window_users] or \
+            user_lengths != [sorted((row[0], row[6]) for row in rows) for rows in columns_users]:
+        raise AssertionError("The single user queries disagree.")
+
+    return [
+        ("GROUP BY, all users", group_by_all_time),
+        ("ROW_NUMBER, all users", window_all_time),
+        (f"GROUP BY, {len(usernames)} single users", group_by_users_time),
+        (f"ROW_NUMBER, {len(usernames)} single users", window_users_time),
+        (f"HabitsData columns, {len(usernames)} single users", columns_users_time),
+    ]
+
+
+def main(argv=None):
+    """
+        The entry point of the benchmark.
+
+        Args:
+        -----
+            - argv (list): The command line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the longest streak queries on a synthetic history.")
+    parser.add_argument("--rows", type=int, default=1000000, help="the number of streak rows (default: 1000000)")
+    parser.add_argument("--users", type=int, default=1000, help="the number of users (default: 1000)")
+    parser.add_argument("--habits", type=int, default=5, help="the number of habits of every user (default: 5)")
+    parser.add_argument("--repeat", type=int, default=3, help="the runs of every query (default: 3)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = sqlite3.connect(os.path.join(tmp_dir, "benchmark.db"))
+        try:
+            migrations.migrate(conn)
+            started = time.perf_counter()
+            create_fixture(conn, args.rows, args.users, args.habits)
+            print(f"Created {args.rows} streak rows of {args.users * args.habits} habits "
+                  f"in {time.perf_counter() - started:.1f} s")
+            for name, duration in run_benchmark(conn, args.users, args.repeat):
+                print(f"{name:<45} {duration * 1000:10.1f} ms")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
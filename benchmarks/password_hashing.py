@@ -0,0 +1,145 @@
+"""
+This module benchmarks the password hashing costs of the passwords module to pick the highest cost whose login latency
+stays within a budget. For every cost, it runs concurrent logins through the password thread pool, like several
+sessions logging in at the same time, and reports the 50th, 95th and 99th percentile of their latency.
+It is run from the root directory of the app:
+
+    python -m benchmarks.password_hashing --budget-ms 250 --concurrency 4
+
+With --apply, the recommended cost is stored in the Settings table of a database, and the passwords of its users are
+hashed with it at their next login.
+It imports argparse, sqlite3, threading, time, passwords and storage.
+"""
+
+import argparse
+import sqlite3
+import threading
+import time
+import passwords
+import storage
+
+# The costs which are compared by default, from the cheapest to the most expensive one
+DEFAULT_COSTS = ("pbkdf2_sha256$100000", "pbkdf2_sha256$200000", "pbkdf2_sha256$400000", "pbkdf2_sha256$600000",
+                 "pbkdf2_sha256$1000000", "scrypt$16384$8$1", "scrypt$32768$8$1")
+
+
+def percentile(durations, percent):
+    """
+        Returns the nearest-rank percentile of a list of durations.
+
+        Args:
+        -----
+            - durations (list): The durations in seconds.
+            - percent (float): The percentile between 0 and 100.
+    """
+    ordered = sorted(durations)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+def measure_logins(hashing, logins, concurrency):
+    """
+        Verifies a password logins times, from concurrency threads at the same time, without the verification cache.
+
+        Args:
+        -----
+            - hashing (str): The scheme and cost parameters, see passwords.parse_hashing().
+            - logins (int): The number of logins.
+            - concurrency (int): The number of sessions which log in at the same time.
+
+        Returns:
+        --------
+            - A list of the latencies of the logins in seconds, including the wait for a thread of the pool.
+    """
+    stored_password = passwords.hash_password("Benchmark#1", hashing)
+    durations = []
+    lock = threading.Lock()
+    remaining = iter(range(logins))
+
+    def session():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            started = time.perf_counter()
+            if not passwords.run_in_pool(passwords.verify_password, "Benchmark#1", stored_password, False):
+                raise AssertionError(f"The password was not verified with {hashing}.")
+            with lock:
+                durations.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=session) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return durations
+
+
+def run_benchmark(costs, logins, concurrency, budget):
+    """
+        Measures the login latency of every cost and recommends the most expensive one within the budget.
+
+        Args:
+        -----
+            - costs (iterable): The hashings to compare.
+            - logins (int): The number of logins of every cost.
+            - concurrency (int): The number of sessions which log in at the same time.
+            - budget (float): The highest acceptable 99th percentile of the login latency in seconds.
+
+        Returns:
+        --------
+            - A tuple of the results, a list of tuples of the hashing and its p50, p95 and p99 latency,
+              and the recommended hashing, which is None if no cost stays within the budget.
+    """
+    results = []
+    recommended = None
+    for hashing in costs:
+        passwords.parse_hashing(hashing)
+        durations = measure_logins(hashing, logins, concurrency)
+        p50, p95, p99 = (percentile(durations, percent) for percent in (50, 95, 99))
+        results.append((hashing, p50, p95, p99))
+        if p99 <= budget and (recommended is None or p99 >= recommended[1]):
+            recommended = (hashing, p99)
+    return results, recommended and recommended[0]
+
+
+def main(argv=None):
+    """
+        The entry point of the benchmark.
+
+        Args:
+        -----
+            - argv (list): The command line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Pick a password hashing cost within a login latency budget.")
+    parser.add_argument("--costs", nargs="+", default=DEFAULT_COSTS, help="the hashings to compare")
+    parser.add_argument("--logins", type=int, default=40, help="the logins of every cost (default: 40)")
+    parser.add_argument("--concurrency", type=int, default=passwords.DEFAULT_HASH_WORKERS,
+                        help=f"the sessions logging in at the same time (default: {passwords.DEFAULT_HASH_WORKERS})")
+    parser.add_argument("--budget-ms", type=float, default=250.0,
+                        help="the highest acceptable p99 login latency in milliseconds (default: 250)")
+    parser.add_argument("--apply", metavar="DATABASE", help="store the recommended cost in this SQLite database")
+    args = parser.parse_args(argv)
+
+    results, recommended = run_benchmark(args.costs, args.logins, args.concurrency, args.budget_ms / 1000)
+    print(f"{'hashing':<25} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for hashing, p50, p95, p99 in results:
+        print(f"{hashing:<25} {p50 * 1000:10.1f} {p95 * 1000:10.1f} {p99 * 1000:10.1f}")
+    if recommended is None:
+        print(f"No cost keeps the p99 login latency within {args.budget_ms:.0f} ms.")
+        return None
+
+    print(f"Recommended: {recommended}")
+    if args.apply:
+        conn = sqlite3.connect(args.apply)
+        try:
+            with storage.transaction(conn):
+                storage.set_setting(conn, 'password_hashing', recommended)
+        finally:
+            conn.close()
+        print(f"Stored as the password hashing of {args.apply}")
+    return recommended
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+This module is the benchmark suite of the habit tracker app. It generates a synthetic database of a configurable size
+with the synthetic module, times the registration, the login, the check-off of habits, every analytics function, the
+leaderboards and the streak resets on it, and reports the throughput and the 50th, 95th and 99th percentile latency
+of every operation as JSON, so the results of two releases can be compared.
+It is run from the root directory of the app:
+
+    python -m benchmarks.suite --users 1000 --habits 5 --days 90 --output results.json
+    python -m benchmarks.suite --baseline results.json --tolerance 0.25
+
+With --baseline, every operation whose p95 latency grew by more than the tolerance is reported as a regression,
+and the suite exits with status 1.
+It imports argparse, json, os, platform, random, sqlite3, sys, tempfile, time, SimpleNamespace from types,
+analytics, completions, leaderboard, migrations, storage, streaks, the percentile function of the password hashing
+benchmark, the synthetic module, namedtuple, datetime and the service module.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import analytics
+import completions
+import leaderboard
+import migrations
+import storage
+import streaks
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from benchmarks import synthetic
+from benchmarks.password_hashing import percentile
+from service import HabitService, authenticate, register_user
+
+# The analytics functions of a user which are timed. They print their tables, which is part of their latency.
+ANALYTICS_FUNCTIONS = ("show_all_habits", "show_daily_habits", "show_weekly_habits", "current_streak_summary",
+                       "current_streak_of_selected_habit", "longest_streak_summary",
+                       "longest_streak_of_selected_habit", "completion_rate_summary",
+                       "completion_trend_of_selected_habit", "weekday_heat_map", "habit_type_summary")
+
+# The number of habits which one run of the streak expiry sweep resets at most, like the scheduler
+SWEEP_BATCH_SIZE = 1000
+
+# The timings of one operation: the latency of every run and the duration of all runs
+Timing = namedtuple('Timing', ['durations', 'duration'])
+
+
+def time_runs(function, arguments):
+    """
+        Runs a function once for every tuple of arguments, one run after the other.
+
+        Args:
+        -----
+            - function (callable): The operation.
+            - arguments (iterable): The argument tuple of every run.
+
+        Returns:
+        --------
+            - A Timing tuple.
+    """
+    durations = []
+    started = time.perf_counter()
+    for args in arguments:
+        run_started = time.perf_counter()
+        function(*args)
+        durations.append(time.perf_counter() - run_started)
+    return Timing(durations, time.perf_counter() - started)
+
+
+def summarize(timing):
+    """
+        Summarizes the timings of an operation as a JSON compatible dictionary with the number of runs,
+        the runs per second and the p50, p95, p99 and longest latency in milliseconds.
+    """
+    if not timing.durations:
+        return {"operations": 0}
+    return {
+        "operations": len(timing.durations),
+        "throughput_per_s": round(len(timing.durations) / timing.duration, 2) if timing.duration else None,
+        "p50_ms": round(percentile(timing.durations, 50) * 1000, 3),
+        "p95_ms": round(percentile(timing.durations, 95) * 1000, 3),
+        "p99_ms": round(percentile(timing.durations, 99) * 1000, 3),
+        "max_ms": round(max(timing.durations) * 1000, 3),
+    }
+
+
+class _FirstChoice:
+    """
+    Creating a stand-in for questionary.select() which answers the prompt with its first choice.
+
+    Attributes:
+    -----------
+        - choices (list): The choices of the prompt.
+    """
+
+    def __init__(self, message, choices):
+        """
+        Initializes the prompt with its message and choices.
+        """
+        self.choices = choices
+
+    def ask(self):
+        """
+            Returns the first choice.
+        """
+        return self.choices[0]
+
+
+def run_suite(conn, database, operations=200, logins=20, seed=0):
+    """
+        Times the operations of the app on a synthetic database, in an order in which every operation leaves the
+        database as the next one expects it: the check-offs of today before the analytics, and the streak resets
+        9 days later at the end.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The connection to the database, whose file the shared pool also uses.
+            - database (SyntheticDatabase): The result of synthetic.create_database().
+            - operations (int): The number of runs of every operation.
+            - logins (int): The number of registrations and logins, which hash a password each.
+            - seed (int): The seed of the random choice of the users and habits.
+
+        Returns:
+        --------
+            - A dictionary of the name of every operation and its summary, see summarize().
+    """
+    randomizer = random.Random(seed)
+    usernames = [synthetic.username(user)
+                 for user in randomizer.sample(range(database.users), min(operations, database.users))]
+    habits = conn.execute("SELECT habit_id, habit_creator FROM HabitsData ORDER BY habit_id").fetchall()
+    sampled_habits = randomizer.sample(habits, min(operations, len(habits)))
+    results = {}
+
+    # The new accounts hash their passwords, so their logins are not cached yet
+    new_usernames = [f"benchmark{number}" for number in range(logins)]
+    results["register_user"] = summarize(time_runs(
+        register_user, [("Bench", "Mark", name, synthetic.PASSWORD, conn) for name in new_usernames]))
+    results["authenticate"] = summarize(time_runs(
+        authenticate, [(name, synthetic.PASSWORD, conn) for name in new_usernames]))
+    results["authenticate_cached"] = summarize(time_runs(
+        authenticate, [(name, synthetic.PASSWORD, conn) for name in new_usernames]))
+
+    # Every sampled habit is checked off once today, which continues or restarts its streak
+    now = datetime.now().replace(microsecond=0)
+    results["complete_habit"] = summarize(time_runs(
+        lambda habit_id, habit_creator: HabitService(habit_creator, conn).complete_habit(habit_id, now),
+        sampled_habits))
+
+    # The analytics read the database through the shared pool and print their tables, which are thrown away
+    questionary = analytics.questionary
+    analytics.questionary = SimpleNamespace(select=_FirstChoice)
+    stdout = sys.stdout
+    try:
+        with open(os.devnull, "w") as devnull:
+            sys.stdout = devnull
+            for name in ANALYTICS_FUNCTIONS:
+                results[f"analytics.{name}"] = summarize(time_runs(getattr(analytics, name),
+                                                                   [(user,) for user in usernames]))
+    finally:
+        sys.stdout = stdout
+        analytics.questionary = questionary
+
+    groups = [(habit_type, habit_frequency) for habit_type, habit_frequency, _ in leaderboard.leaderboard_groups(conn)]
+    for kind in leaderboard.STREAK_KINDS:
+        results[f"leaderboard.top_streaks.{kind}"] = summarize(time_runs(
+            leaderboard.top_streaks, [groups[run % len(groups)] + (kind, leaderboard.DEFAULT_LIMIT, conn)
+                                      for run in range(operations)]))
+    results["leaderboard.streak_rank"] = summarize(time_runs(
+        leaderboard.streak_rank, [(habit_id, "current", conn) for habit_id, _ in sampled_habits]))
+    results["leaderboard.streak_distribution"] = summarize(time_runs(
+        leaderboard.streak_distribution, [("current", None, None, conn)] * operations))
+    results["completions.replay_audit"] = summarize(time_runs(
+        completions.replay_completions, [(conn, user, now, False) for user in usernames]))
+
+    # 9 days later, the streaks of all habits have expired: first for the users who log in, then by the sweep
+    later = now + timedelta(days=9)
+    results["expire_streaks.user"] = summarize(time_runs(
+        streaks.expire_streaks, [(conn, user, None, later) for user in usernames]))
+    sweep = []
+    while True:
+        started = time.perf_counter()
+        expiry = streaks.expire_streaks(conn, now=later, limit=SWEEP_BATCH_SIZE)
+        sweep.append(time.perf_counter() - started)
+        if expiry.habits_reset < SWEEP_BATCH_SIZE:
+            break
+    results["expire_streaks.sweep_batch"] = summarize(Timing(sweep, sum(sweep)))
+    return results
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+        Compares the results of the suite with the results of an earlier run.
+
+        Args:
+        -----
+            - results (dict): The 'results' of this run.
+            - baseline (dict): The 'results' of the earlier run.
+            - tolerance (float): The accepted growth of the p95 latency, e.g. 0.25 for 25%.
+
+        Returns:
+        --------
+            - A list of tuples of the operation, its baseline and its current p95 latency in milliseconds,
+              for every operation of both runs which became slower than the tolerance.
+    """
+    regressions = []
+    for name, summary in results.items():
+        before = baseline.get(name, {}).get("p95_ms")
+        if before is not None and summary.get("p95_ms") is not None and summary["p95_ms"] > before * (1 + tolerance):
+            regressions.append((name, before, summary["p95_ms"]))
+    return regressions
+
+
+def main(argv=None):
+    """
+        The entry point of the benchmark suite.
+
+        Args:
+        -----
+            - argv (list): The command line arguments. Defaults to sys.argv.
+
+        Returns:
+        --------
+            - The report as a dictionary.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the habit tracker on a synthetic database.")
+    parser.add_argument("--users", type=int, default=1000, help="the number of users (default: 1000)")
+    parser.add_argument("--habits", type=int, default=5, help="the number of habits of every user (default: 5)")
+    parser.add_argument("--days", type=int, default=90, help="the days of completion history (default: 90)")
+    parser.add_argument("--completion-rate", type=float, default=0.8,
+                        help="the probability of a check-off in every frequency range (default: 0.8)")
+    parser.add_argument("--operations", type=int, default=200, help="the runs of every operation (default: 200)")
+    parser.add_argument("--logins", type=int, default=20,
+                        help="the registrations and logins, which hash a password each (default: 20)")
+    parser.add_argument("--hashing", default=synthetic.FAST_HASHING,
+                        help=f"the password hashing (default: {synthetic.FAST_HASHING})")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the synthetic data (default: 0)")
+    parser.add_argument("--output", help="write the JSON report to this file (default: stdout)")
+    parser.add_argument("--baseline", help="compare the p95 latencies with this JSON report of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="the accepted growth of the p95 latency against the baseline (default: 0.25)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "benchmark.db")
+        storage.configure(database=path)
+        try:
+            with storage.connection() as conn:
+                migrations.migrate(conn)
+                database = synthetic.create_database(conn, args.users, args.habits, args.days, args.completion_rate,
+                                                     args.seed, args.hashing)
+                results = run_suite(conn, database, args.operations, args.logins, args.seed)
+        finally:
+            storage.configure()
+
+    report = {
+        "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "tolerance")},
+        "database": {"users": database.users, "habits": database.habits, "completions": database.completions,
+                     "streaks": database.streaks, "seconds": round(database.duration, 3)},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            baseline = json.load(baseline)
+        if baseline.get("config") != report["config"]:
+            print("Warning: the baseline was run with another configuration.", file=sys.stderr)
+        regressions = find_regressions(results, baseline["results"], args.tolerance)
+        for name, before, after in regressions:
+            print(f"Regression: {name} p95 {before:.3f} ms -> {after:.3f} ms", file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+    return report
+
+
+if __name__ == "__main__":
+    main()
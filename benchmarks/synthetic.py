@@ -0,0 +1,169 @@
+"""
+This module generates synthetic habit tracker databases of a configurable size for the benchmarks: users with
+habits of every type and frequency and a completion history of a number of days up to today, in which every habit is
+checked off in time with a given probability, so its streaks break now and then.
+Only the completion log is generated. The habit streaks, the streak history, the longest streaks and the rollups are
+then built from it by the replay of the completions module and the triggers of the schema, so they are consistent
+with each other like in a database which the app filled itself.
+It can also be run on its own to write a synthetic database file, e.g. to try the app with a large history:
+
+    python -m benchmarks.synthetic synthetic.db --users 1000 --habits 5 --days 180
+
+It imports argparse, random, sqlite3, time, completions, migrations, passwords, storage, namedtuple, datetime
+and the habit constants and timestamp adapters from Habit module.
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+import completions
+import migrations
+import passwords
+import storage
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+from Habit import DATETIME_FORMAT, FREQUENCY_DAYS, HABIT_TYPES, to_epoch_seconds
+
+# The password of every synthetic user
+PASSWORD = "Benchmark#1"
+
+# The cheap password hashing of the synthetic users, so the benchmarks are not dominated by the hashing cost
+FAST_HASHING = "pbkdf2_sha256$1000"
+
+# The number of completions which are inserted in one executemany call
+INSERT_CHUNK_SIZE = 10000
+
+# The result of create_database()
+SyntheticDatabase = namedtuple('SyntheticDatabase', ['users', 'habits', 'completions', 'streaks', 'end', 'duration'])
+
+
+def username(user):
+    """
+        Returns the username of the synthetic user with the given number.
+    """
+    return f"user{user}"
+
+
+def habit_completions(randomizer, habit_frequency, first_day, days, completion_rate):
+    """
+        Generates the check-offs of one habit: one per frequency range from a random first range, each one
+        made in time with the probability completion_rate, always at the same time of day of the habit.
+
+        Args:
+        -----
+            - randomizer (random.Random): The random number generator.
+            - habit_frequency (str): Daily or Weekly.
+            - first_day (int): The epoch day on which the history starts.
+            - days (int): The number of days of the history.
+            - completion_rate (float): The probability that a frequency range is checked off.
+
+        Yields:
+        -------
+            - The epoch seconds of every check-off in their order.
+    """
+    period = FREQUENCY_DAYS[habit_frequency]
+    seconds_of_day = randomizer.randrange(6 * 3600, 22 * 3600, 60)
+    for day in range(randomizer.randrange(period), days, period):
+        if randomizer.random() < completion_rate:
+            yield (first_day + day) * 86400 + seconds_of_day
+
+
+def create_database(conn, users, habits_per_user, days, completion_rate=0.8, seed=0, hashing=FAST_HASHING,
+                    end=None):
+    """
+        Fills a migrated, empty database with synthetic users, habits and their completion history, and builds the
+        streaks of the habits from it.
+
+        All users share the password PASSWORD, which is hashed once with the given hashing, and the hashing is stored
+        as the one of new passwords, so logins are not hashed again.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - users (int): The number of users.
+            - habits_per_user (int): The number of habits of every user.
+            - days (int): The number of days of the completion history, which ends the day before end.
+            - completion_rate (float): The probability that a habit is checked off in a frequency range.
+            - seed (int): The seed of the random history.
+            - hashing (str): The password hashing of the users, see passwords.parse_hashing().
+            - end (datetime): The day after the history. Defaults to today.
+
+        Returns:
+        --------
+            - A SyntheticDatabase tuple with the number of users, habits, completions and streak rows,
+              the end of the history and the duration in seconds.
+    """
+    started = time.perf_counter()
+    randomizer = random.Random(seed)
+    end = (end or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    first_day = to_epoch_seconds(start) // 86400
+    stored_password = passwords.hash_password(PASSWORD, hashing)
+
+    with storage.transaction(conn):
+        storage.set_setting(conn, 'password_hashing', hashing)
+        conn.executemany("INSERT INTO User (forename, surname, username, password) VALUES (?, ?, ?, ?)",
+                         (("Synthetic", f"User {user}", username(user), stored_password) for user in range(users)))
+        conn.executemany("INSERT INTO HabitsData (habit_name, habit_creator, habit_type, habit_frequency, "
+                         "created_datetime, last_completion_date, habit_streak) VALUES (?, ?, ?, ?, ?, NULL, 0)",
+                         ((f"Habit {habit}", username(user), HABIT_TYPES[habit % len(HABIT_TYPES)],
+                           "Daily" if habit % 2 == 0 else "Weekly", start.strftime(DATETIME_FORMAT))
+                          for user in range(users) for habit in range(habits_per_user)))
+        habits = conn.execute("SELECT habit_id, habit_frequency FROM HabitsData ORDER BY habit_id").fetchall()
+
+    # The completions are inserted in chunks, in the order of the index on (habit_id, completed_at)
+    completion_count = 0
+    chunk = []
+    for habit_id, habit_frequency in habits:
+        chunk.extend((habit_id, completed_at) for completed_at in
+                     habit_completions(randomizer, habit_frequency, first_day, days, completion_rate))
+        if len(chunk) >= INSERT_CHUNK_SIZE or habit_id == habits[-1][0]:
+            with storage.transaction(conn):
+                conn.executemany("INSERT INTO Completions (habit_id, completed_at) VALUES (?, ?)", chunk)
+            completion_count += len(chunk)
+            chunk = []
+
+    completions.replay_completions(conn, now=end)
+    streak_count = conn.execute("SELECT COUNT(*) FROM StreaksData").fetchone()[0]
+    conn.execute("ANALYZE")
+    return SyntheticDatabase(users, len(habits), completion_count, streak_count, end, time.perf_counter() - started)
+
+
+def main(argv=None):
+    """
+        The entry point of the generator.
+
+        Args:
+        -----
+            - argv (list): The command line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Write a synthetic habit tracker database.")
+    parser.add_argument("database", help="the new SQLite database file")
+    parser.add_argument("--users", type=int, default=1000, help="the number of users (default: 1000)")
+    parser.add_argument("--habits", type=int, default=5, help="the number of habits of every user (default: 5)")
+    parser.add_argument("--days", type=int, default=90, help="the days of completion history (default: 90)")
+    parser.add_argument("--completion-rate", type=float, default=0.8,
+                        help="the probability of a check-off in every frequency range (default: 0.8)")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the random history (default: 0)")
+    parser.add_argument("--hashing", default=FAST_HASHING,
+                        help=f"the password hashing of the users (default: {FAST_HASHING})")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.database)
+    try:
+        if conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+            raise SystemExit(f"{args.database} is not empty.")
+        migrations.migrate(conn)
+        result = create_database(conn, args.users, args.habits, args.days, args.completion_rate, args.seed,
+                                 args.hashing)
+    finally:
+        conn.close()
+    print(f"Created {result.users} users with {result.habits} habits, {result.completions} completions and "
+          f"{result.streaks} streaks in {result.duration:.1f} s")
+    return result
+
+
+if __name__ == "__main__":
+    main()
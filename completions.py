@@ -0,0 +1,249 @@
+"""
+This module contains the completion log of the habit tracker app and its replay engine.
+Every accepted check-off of a habit is appended to the Completions table in the same transaction as the update of
+its streak counters, and the log is never changed afterwards, so the habit streaks of HabitsData and the streak rows
+of StreaksData can always be recomputed from it: to audit the counters, or to repair them after they were corrupted.
+The replay reads the log in one pass in the order of its index, in chunks of whole habits which the batch streak
+engine computes at once, so its memory use only depends on the chunk size.
+It can also be run on its own to audit or to replay the log of a database file.
+It imports argparse, time, migrations, storage, namedtuple, datetime, the habit constants and timestamp adapters
+from Habit module and the streak engine of streak_engine module.
+"""
+
+import argparse
+import time
+import migrations
+import storage
+
+from collections import namedtuple
+from datetime import datetime
+from Habit import FREQUENCY_DAYS, TEXT_TIMESTAMPS, from_db_timestamp, seconds_sql, to_db_timestamp, to_epoch_seconds
+from streak_engine import NO_DATE, compute_streaks
+
+# The default number of completions which are fetched from the cursor at a time
+DEFAULT_FETCH_SIZE = 1000
+
+# The default number of completions which the streak engine computes at once
+DEFAULT_CHUNK_SIZE = 100000
+
+# The result of replay_completions()
+ReplayResult = namedtuple('ReplayResult', ['habits', 'completions', 'streaks', 'mismatched', 'duration'])
+
+
+def frequency_seconds_sql(column):
+    """
+        Builds the SQL expression for the number of seconds of one frequency range of a habit, e.g. 86400 for Daily.
+
+        Args:
+        -----
+            - column (str): The habit frequency column.
+
+        Returns:
+        --------
+            - The SQL expression as a string.
+    """
+    cases = " ".join(f"WHEN '{frequency}' THEN {days * 86400}" for frequency, days in FREQUENCY_DAYS.items())
+    return f"(CASE {column} {cases} END)"
+
+
+def seed_completions(conn, username=None, habit_ids=None):
+    """
+        Writes completions for the streak rows of the habits which have no completion in the log yet, e.g. the habits
+        which were tracked before the log existed or which were imported: one completion at the start of the streak
+        and one for every further frequency range of its length. The times of day of the seeded completions are
+        therefore the one of the streak start, while their number and their days match the streak rows.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - username (str): Only seed the habits of this user. Defaults to the habits of all users.
+            - habit_ids (iterable): Only seed the habits with these ids, e.g. the habits of an import.
+              Defaults to all habits.
+
+        Returns:
+        --------
+            - The number of seeded completions.
+    """
+    condition, params = ("AND h.habit_creator = ? ", (username,)) if username is not None else ("", ())
+    if habit_ids is not None:
+        # The ids are joined from a temporary table, so their number is not limited by the SQL variables
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS seeded_habits (habit_id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.seeded_habits")
+        conn.executemany("INSERT OR IGNORE INTO temp.seeded_habits (habit_id) VALUES (?)",
+                         ((habit_id,) for habit_id in habit_ids))
+        condition += "AND h.habit_id IN (SELECT habit_id FROM temp.seeded_habits) "
+    seeded = conn.execute(
+        "INSERT INTO Completions (habit_id, completed_at) "
+        "WITH RECURSIVE checkoffs (habit_id, completed_at, remaining, step) AS ("
+        f"SELECT h.habit_id, {seconds_sql('s.streak_start_date')}, s.streak_length - 1, "
+        f"{frequency_seconds_sql('h.habit_frequency')} FROM StreaksData s JOIN HabitsData h "
+        "ON h.habit_creator = s.habit_creator AND h.habit_name = s.habit_name "
+        "WHERE s.streak_length > 0 AND s.streak_start_date IS NOT NULL AND s.streak_start_date != 'None' "
+        f"{condition}AND NOT EXISTS (SELECT 1 FROM Completions c WHERE c.habit_id = h.habit_id) "
+        "UNION ALL SELECT habit_id, completed_at + step, remaining - 1, step FROM checkoffs WHERE remaining > 0) "
+        "SELECT habit_id, completed_at FROM checkoffs ORDER BY habit_id, completed_at", params).rowcount
+    if habit_ids is not None:
+        conn.execute("DELETE FROM temp.seeded_habits")
+    return seeded
+
+
+def _iter_completion_chunks(conn, username, fetch_size, chunk_size):
+    """
+        Streams the completions of the log in the order of the index on (habit_id, completed_at), in chunks of about
+        chunk_size completions which always hold all completions of their habits.
+
+        Yields:
+        -------
+            - A tuple of the list of the habit ids and the list of the epoch seconds of the completions.
+    """
+    if username is None:
+        cursor = conn.execute("SELECT habit_id, completed_at FROM Completions "
+                              "ORDER BY habit_id, completed_at, completion_id")
+    else:
+        cursor = conn.execute("SELECT habit_id, completed_at FROM Completions WHERE habit_id IN "
+                              "(SELECT habit_id FROM HabitsData WHERE habit_creator = ?) "
+                              "ORDER BY habit_id, completed_at, completion_id", (username,))
+    habit_ids, completed_at = [], []
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            row_habit_ids, row_completed_at = zip(*rows)
+            habit_ids.extend(row_habit_ids)
+            completed_at.extend(row_completed_at)
+            if len(habit_ids) >= chunk_size:
+                # The completions of the last habit may go on in the next rows, so they start the next chunk
+                cut = habit_ids.index(habit_ids[-1])
+                if cut:
+                    yield habit_ids[:cut], completed_at[:cut]
+                    habit_ids, completed_at = habit_ids[cut:], completed_at[cut:]
+        if habit_ids:
+            yield habit_ids, completed_at
+    finally:
+        cursor.close()
+
+
+def replay_completions(conn=None, username=None, now=None, apply=True, fetch_size=DEFAULT_FETCH_SIZE,
+                       chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Recomputes the habit streaks of HabitsData and the streak rows of StreaksData from the completion log.
+
+        The habits with completions in the log are replayed chunk by chunk with streak_engine.compute_streaks(),
+        and every habit is compared with its stored habit streak and the lengths of its stored streak rows.
+        With apply, the differing habits get their replayed habit streak and last completion date, and their streak
+        rows are replaced by the replayed ones, all in one transaction. Habits without completions in the log are
+        left as they are.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - username (str): Only replay the habits of this user. Defaults to the habits of all users.
+            - now (datetime): The datetime against which the last streaks are checked. Defaults to the current datetime.
+            - apply (bool): Whether the differing habits are repaired, or only counted for an audit.
+            - fetch_size (int): The number of completions which are fetched from the cursor at a time.
+            - chunk_size (int): The number of completions which the streak engine computes at once.
+
+        Returns:
+        --------
+            - A ReplayResult tuple with the number of replayed habits, completions and replayed streaks,
+              the list of the ids of the habits whose stored streaks differed from the log and the duration in seconds.
+    """
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return replay_completions(pooled_conn, username, now, apply, fetch_size, chunk_size)
+
+    started = time.perf_counter()
+    now_seconds = to_epoch_seconds((now or datetime.now()).replace(microsecond=0))
+    habits = completions = streak_count = 0
+    mismatched = []
+    creator_condition, creator_params = ("AND h.habit_creator = ? ", (username,)) if username is not None else ("", ())
+    with storage.transaction(conn):
+        timestamp_format = storage.get_setting(conn, 'timestamp_format', TEXT_TIMESTAMPS)
+
+        def stored(seconds):
+            return None if seconds == NO_DATE else to_db_timestamp(from_db_timestamp(seconds), timestamp_format)
+
+        for habit_ids, completed_at in _iter_completion_chunks(conn, username, fetch_size, chunk_size):
+            # The habits of the chunk and the lengths of their stored streaks are read with one range query each,
+            # which only reads the habits of the user, since the range also spans the habit ids of other users
+            chunk_range = (habit_ids[0], habit_ids[-1]) + creator_params
+            habit_rows = {row[0]: row[1:] for row in conn.execute(
+                "SELECT h.habit_id, h.habit_name, h.habit_creator, h.habit_type, h.habit_frequency, h.habit_streak "
+                f"FROM HabitsData h WHERE h.habit_id BETWEEN ? AND ? {creator_condition}", chunk_range)}
+            stored_lengths = {}
+            for habit_id, streak_length in conn.execute(
+                    "SELECT h.habit_id, s.streak_length FROM HabitsData h JOIN StreaksData s "
+                    "ON s.habit_creator = h.habit_creator AND s.habit_name = h.habit_name "
+                    f"WHERE h.habit_id BETWEEN ? AND ? {creator_condition}"
+                    f"ORDER BY h.habit_id, {seconds_sql('s.streak_start_date')}, s.streak_id", chunk_range):
+                stored_lengths.setdefault(habit_id, []).append(streak_length)
+
+            # The completions of deleted habits are left out
+            if not habit_rows.keys() >= set(habit_ids):
+                known = [position for position, habit_id in enumerate(habit_ids) if habit_id in habit_rows]
+                habit_ids = [habit_ids[position] for position in known]
+                completed_at = [completed_at[position] for position in known]
+                if not habit_ids:
+                    continue
+            segments, replayed = compute_streaks(habit_ids, completed_at, {
+                habit_id: habit_row[3] for habit_id, habit_row in habit_rows.items()}, now_seconds)
+            habits += len(replayed.habit_id)
+            completions += len(completed_at)
+            streak_count += len(segments.start)
+
+            for position, habit_id in enumerate(replayed.habit_id):
+                habit_name, habit_creator, habit_type, habit_frequency, habit_streak = habit_rows[habit_id]
+                first = replayed.first_segment[position]
+                streaks = range(first, first + replayed.segments[position])
+                if habit_streak == replayed.current_streak[position] and \
+                        stored_lengths.get(habit_id, []) == segments.length[streaks.start:streaks.stop]:
+                    continue
+                mismatched.append(habit_id)
+                if not apply:
+                    continue
+
+                conn.execute("DELETE FROM StreaksData WHERE habit_creator = ? AND habit_name = ?",
+                             (habit_creator, habit_name))
+                conn.executemany(
+                    "INSERT INTO StreaksData (habit_name, habit_creator, habit_type, habit_frequency, "
+                    "streak_start_date, streak_end_date, streak_length) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(habit_name, habit_creator, habit_type, habit_frequency, stored(segments.start[segment]),
+                      stored(segments.end[segment]), segments.length[segment]) for segment in streaks])
+                conn.execute("UPDATE HabitsData SET habit_streak = ?, last_completion_date = ? WHERE habit_id = ?",
+                             (replayed.current_streak[position], stored(replayed.last_completion[position]),
+                              habit_id))
+    return ReplayResult(habits, completions, streak_count, mismatched, time.perf_counter() - started)
+
+
+def main(argv=None):
+    """
+        The entry point of the standalone audit and replay.
+
+        Args:
+        -----
+            - argv (list): The command line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Audit or rebuild the habit streaks from the completion log.")
+    parser.add_argument("database", nargs="?", help="the SQLite database file (default: habit_tracker_db.db of the app)")
+    parser.add_argument("--username", help="only replay the habits of this user")
+    parser.add_argument("--apply", action="store_true",
+                        help="repair the habits whose streaks differ from the log (default: only report them)")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        storage.configure(database=args.database)
+    try:
+        migrations.migrate()
+        result = replay_completions(username=args.username, apply=args.apply)
+    finally:
+        storage.close_pool()
+
+    print(f"Replayed {result.completions} completions of {result.habits} habits into {result.streaks} streaks "
+          f"in {result.duration:.3f} s")
+    print(f"{len(result.mismatched)} habits differed from the log{' and were repaired' if args.apply else ''}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
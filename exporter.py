@@ -0,0 +1,218 @@
+"""
+This module contains the streaming exporter of the habit tracker app.
+It writes the habits and the streak history of one user or of the whole database as CSV, JSON lines or
+columnar row groups, reading the rows through a cursor in small batches, so the memory use stays constant
+however many rows are exported.
+The CSV files have the layouts of 'Test Data (Habits).csv' and 'Test Data (Streaks).csv', so they can be loaded
+again with the importer module.
+It can also be run on its own to write a nightly extract.
+It imports argparse, csv, json, sys, time, storage, namedtuple, text_sql from Habit module and the column layouts
+from importer module.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+import storage
+
+from collections import namedtuple
+from Habit import text_sql
+from importer import HABITS_COLUMNS, STREAKS_COLUMNS
+
+# The formats in which the rows can be written
+EXPORT_FORMATS = ("csv", "jsonl", "columns")
+
+# The default number of rows which are fetched from the cursor at a time
+DEFAULT_FETCH_SIZE = 1000
+
+# The default number of rows of one row group in the columnar format
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+# The result of an export
+ExportResult = namedtuple('ExportResult', ['rows', 'duration'])
+
+# The table, key column, columns and date and time columns of every kind of export
+TableExport = namedtuple('TableExport', ['table', 'key_column', 'columns', 'timestamp_columns'])
+TABLE_EXPORTS = {
+    "habits": TableExport("HabitsData", "habit_id", HABITS_COLUMNS, ("created_datetime", "last_completion_date")),
+    "streaks": TableExport("StreaksData", "streak_id", STREAKS_COLUMNS, ("streak_start_date", "streak_end_date")),
+}
+
+
+def iter_rows(kind, conn, username=None, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+        Streams the rows of HabitsData or StreaksData in the order they were inserted.
+
+        The dates and times are given as text in the DATETIME_FORMAT, however they are stored.
+
+        Args:
+        -----
+            - kind (str): 'habits' or 'streaks'.
+            - conn (sqlite3.Connection): The database connection.
+            - username (str): Only export the rows of this user. Defaults to the rows of all users.
+            - fetch_size (int): The number of rows which are fetched from the cursor at a time.
+
+        Yields:
+        -------
+            - The rows as tuples in the order of the columns of the kind.
+    """
+    table_export = TABLE_EXPORTS[kind]
+    columns = ", ".join(text_sql(column) if column in table_export.timestamp_columns else column
+                        for column in table_export.columns)
+    if username is None:
+        cursor = conn.execute(f"SELECT {columns} FROM {table_export.table} ORDER BY {table_export.key_column}")
+    else:
+        cursor = conn.execute(f"SELECT {columns} FROM {table_export.table} WHERE habit_creator = ? "
+                              f"ORDER BY {table_export.key_column}", (username,))
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def write_csv(rows, columns, output):
+    """
+        Writes rows as CSV with a header row. Missing dates are written as 'None', like in the test data files.
+
+        Returns:
+        --------
+            - The number of written rows.
+    """
+    writer = csv.writer(output, lineterminator="\n")
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(["None" if value is None else value for value in row])
+        count += 1
+    return count
+
+
+def write_jsonl(rows, columns, output):
+    """
+        Writes rows as JSON lines, one JSON object per row.
+
+        Returns:
+        --------
+            - The number of written rows.
+    """
+    count = 0
+    for row in rows:
+        output.write(json.dumps(dict(zip(columns, row))) + "\n")
+        count += 1
+    return count
+
+
+def write_columns(rows, columns, output, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+        Writes rows in a columnar layout: a first JSON line with the column names, followed by one JSON line
+        per row group of at most row_group_size rows, which holds one array of values per column.
+
+        Returns:
+        --------
+            - The number of written rows.
+    """
+    output.write(json.dumps({"columns": list(columns)}) + "\n")
+    count = 0
+    row_group = []
+
+    def write_row_group():
+        output.write(json.dumps({"rows": len(row_group),
+                                 "values": dict(zip(columns, (list(values) for values in zip(*row_group))))}) + "\n")
+
+    for row in rows:
+        row_group.append(row)
+        count += 1
+        if len(row_group) == row_group_size:
+            write_row_group()
+            row_group = []
+    if row_group:
+        write_row_group()
+    return count
+
+
+def export_rows(kind, output, export_format="csv", username=None, conn=None, fetch_size=DEFAULT_FETCH_SIZE,
+                row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+        Streams the habits or the streak history of one user or of the whole database into a text stream.
+
+        Args:
+        -----
+            - kind (str): 'habits' or 'streaks'.
+            - output (file): The text stream to write to.
+            - export_format (str): 'csv', 'jsonl' or 'columns'.
+            - username (str): Only export the rows of this user. Defaults to the rows of all users.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - fetch_size (int): The number of rows which are fetched from the cursor at a time.
+            - row_group_size (int): The number of rows of one row group in the columnar format.
+
+        Returns:
+        --------
+            - An ExportResult tuple with the number of exported rows and the duration in seconds.
+
+        Raises:
+        -------
+            - ValueError: If the kind or the format is unknown.
+    """
+    if kind not in TABLE_EXPORTS:
+        raise ValueError(f"Unknown export: {kind}")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return export_rows(kind, output, export_format, username, pooled_conn, fetch_size, row_group_size)
+
+    started = time.perf_counter()
+    columns = TABLE_EXPORTS[kind].columns
+    rows = iter_rows(kind, conn, username, fetch_size)
+    if export_format == "csv":
+        count = write_csv(rows, columns, output)
+    elif export_format == "jsonl":
+        count = write_jsonl(rows, columns, output)
+    else:
+        count = write_columns(rows, columns, output, row_group_size)
+    return ExportResult(count, time.perf_counter() - started)
+
+
+def main(argv=None):
+    """
+        The entry point of the standalone exporter.
+
+        Args:
+        -----
+            - argv (list): The command line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Export habits or streak history as CSV, JSON lines or columns.")
+    parser.add_argument("kind", choices=sorted(TABLE_EXPORTS), help="what to export")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="the output format (default: csv)")
+    parser.add_argument("--username", help="only export the rows of this user")
+    parser.add_argument("--output", help="the output file (default: stdout)")
+    parser.add_argument("--database", help="the SQLite database file (default: habit_tracker_db.db of the app)")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f"rows per row group of the columns format (default: {DEFAULT_ROW_GROUP_SIZE})")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        storage.configure(database=args.database)
+    try:
+        if args.output:
+            with open(args.output, "w", newline="", encoding="utf-8") as output:
+                result = export_rows(args.kind, output, args.format, args.username,
+                                     row_group_size=args.row_group_size)
+        else:
+            result = export_rows(args.kind, sys.stdout, args.format, args.username, row_group_size=args.row_group_size)
+    finally:
+        storage.close_pool()
+
+    rate = result.rows / result.duration if result.duration > 0 else 0.0
+    print(f"{result.rows} rows exported in {result.duration:.3f} s ({rate:.0f} rows/s)", file=sys.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    main()
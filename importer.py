@@ -0,0 +1,350 @@
+"""
+This module contains the streaming bulk importer of the habit tracker app.
+It loads habits and streak history from CSV files in the layouts of 'Test Data (Habits).csv' and
+'Test Data (Streaks).csv': the rows are read and validated one by one and inserted with executemany in chunked
+transactions, so the memory use stays bounded however large the file is.
+For very large loads the secondary indexes can be dropped before and rebuilt once after the load.
+It can also be run on its own to import a CSV file into an existing database.
+It imports argparse, completions, csv, sys, time, migrations, storage, namedtuple, datetime and the habit constants and
+timestamp adapters from Habit module.
+"""
+
+import argparse
+import completions
+import csv
+import sys
+import time
+import migrations
+import storage
+
+from collections import namedtuple
+from datetime import datetime
+from Habit import DATETIME_FORMAT, FREQUENCY_DAYS, HABIT_TYPES, TEXT_TIMESTAMPS, to_db_timestamp
+
+# The columns of the CSV files, which are the same as the columns of the tables
+HABITS_COLUMNS = ("habit_name", "habit_creator", "habit_type", "habit_frequency", "created_datetime",
+                  "last_completion_date", "habit_streak")
+STREAKS_COLUMNS = ("habit_name", "habit_creator", "habit_type", "habit_frequency", "streak_start_date",
+                   "streak_end_date", "streak_length")
+
+# The default number of rows which are inserted in one transaction
+DEFAULT_CHUNK_SIZE = 10000
+
+# The maximum number of invalid rows whose error messages are kept in the result
+MAX_REPORTED_ERRORS = 100
+
+# The result of an import
+ImportResult = namedtuple('ImportResult', ['rows', 'inserted', 'skipped', 'invalid', 'errors', 'chunks',
+                                           'duration'])
+
+
+def _parse_timestamp(value, column, timestamp_format, required):
+    """
+        Validates a date and time cell and converts it into its stored form.
+
+        Args:
+        -----
+            - value (str): The cell in the DATETIME_FORMAT. An empty cell or 'None' means no date.
+            - column (str): The name of the column, for the error message.
+            - timestamp_format (str): The format of the database, TEXT_TIMESTAMPS or EPOCH_TIMESTAMPS.
+            - required (bool): Whether the cell must contain a date.
+
+        Returns:
+        --------
+            - The stored form of the date and time, or None.
+
+        Raises:
+        -------
+            - ValueError: If the cell is no valid date and time.
+    """
+    if value in ("", "None"):
+        if required:
+            raise ValueError(f"{column} is missing.")
+        return None
+    try:
+        return to_db_timestamp(datetime.strptime(value, DATETIME_FORMAT), timestamp_format)
+    except ValueError:
+        raise ValueError(f"{column} '{value}' is not in the format {DATETIME_FORMAT}.")
+
+
+def _parse_count(value, column):
+    """
+        Validates a habit streak or streak length cell.
+
+        Raises:
+        -------
+            - ValueError: If the cell is not a whole number of at least 0.
+    """
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError(f"{column} '{value}' is not a whole number.")
+    if count < 0:
+        raise ValueError(f"{column} must not be negative.")
+    return count
+
+
+def _parse_habit(row):
+    """
+        Validates the common cells of a habit or streak row: name, creator, type and frequency.
+
+        Raises:
+        -------
+            - ValueError: If one of the cells is not valid.
+    """
+    habit_name, habit_creator, habit_type, habit_frequency = (cell.strip() for cell in row[:4])
+    if not habit_name or not habit_creator:
+        raise ValueError("habit_name and habit_creator must not be empty.")
+    if habit_type not in HABIT_TYPES:
+        raise ValueError(f"habit_type '{habit_type}' is unknown.")
+    if habit_frequency not in FREQUENCY_DAYS:
+        raise ValueError(f"habit_frequency '{habit_frequency}' is unknown.")
+    return habit_name, habit_creator, habit_type, habit_frequency
+
+
+def habit_row(row, timestamp_format=TEXT_TIMESTAMPS):
+    """
+        Validates a row of a habits CSV file and converts it into a row of the HabitsData table.
+
+        Args:
+        -----
+            - row (list): The cells in the order of HABITS_COLUMNS.
+            - timestamp_format (str): The format of the database, TEXT_TIMESTAMPS or EPOCH_TIMESTAMPS.
+
+        Returns:
+        --------
+            - The row as a tuple in the order of HABITS_COLUMNS.
+
+        Raises:
+        -------
+            - ValueError: If a cell is not valid.
+    """
+    return _parse_habit(row) + (
+        _parse_timestamp(row[4], "created_datetime", timestamp_format, True),
+        _parse_timestamp(row[5], "last_completion_date", timestamp_format, False),
+        _parse_count(row[6], "habit_streak"))
+
+
+def streak_row(row, timestamp_format=TEXT_TIMESTAMPS):
+    """
+        Validates a row of a streaks CSV file and converts it into a row of the StreaksData table.
+
+        Args:
+        -----
+            - row (list): The cells in the order of STREAKS_COLUMNS.
+            - timestamp_format (str): The format of the database, TEXT_TIMESTAMPS or EPOCH_TIMESTAMPS.
+
+        Returns:
+        --------
+            - The row as a tuple in the order of STREAKS_COLUMNS.
+
+        Raises:
+        -------
+            - ValueError: If a cell is not valid.
+    """
+    return _parse_habit(row) + (
+        _parse_timestamp(row[4], "streak_start_date", timestamp_format, True),
+        _parse_timestamp(row[5], "streak_end_date", timestamp_format, False),
+        _parse_count(row[6], "streak_length"))
+
+
+# How the rows of every table are imported: the CSV columns, the row converter, the INSERT statement and the query
+# for the ids of the habits of the rows after a given rowid, i.e. of the rows which the import inserted.
+# Habits which already exist for their creator are skipped, while streak rows are history and always added.
+TableImport = namedtuple('TableImport', ['table', 'columns', 'convert', 'insert_sql', 'habit_ids_sql'])
+TABLE_IMPORTS = {
+    "habits": TableImport("HabitsData", HABITS_COLUMNS, habit_row,
+                          f"INSERT OR IGNORE INTO HabitsData ({', '.join(HABITS_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          "SELECT habit_id FROM HabitsData WHERE habit_id > ?"),
+    "streaks": TableImport("StreaksData", STREAKS_COLUMNS, streak_row,
+                           f"INSERT INTO StreaksData ({', '.join(STREAKS_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           "SELECT DISTINCT h.habit_id FROM StreaksData s JOIN HabitsData h "
+                           "ON h.habit_creator = s.habit_creator AND h.habit_name = s.habit_name WHERE s.rowid > ?"),
+}
+
+
+def drop_secondary_indexes(conn, table):
+    """
+        Drops the non-unique indexes of a table, which only speed up queries, before a large load.
+        The unique indexes stay, since they keep the data consistent.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - table (str): The name of the table.
+
+        Returns:
+        --------
+            - A list of the CREATE INDEX statements of the dropped indexes, for rebuild_indexes().
+    """
+    indexes = conn.execute("SELECT m.name, m.sql FROM sqlite_master m JOIN pragma_index_list(m.tbl_name) i "
+                           "ON i.name = m.name WHERE m.type = 'index' AND m.tbl_name = ? AND m.sql IS NOT NULL "
+                           "AND i.\"unique\" = 0", (table,)).fetchall()
+    with storage.transaction(conn):
+        for name, _ in indexes:
+            conn.execute(f"DROP INDEX {name}")
+    return [sql for _, sql in indexes]
+
+
+def rebuild_indexes(conn, index_statements):
+    """
+        Creates the indexes which were dropped by drop_secondary_indexes() again, in one pass over the loaded rows.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - index_statements (list): The CREATE INDEX statements.
+    """
+    with storage.transaction(conn):
+        for sql in index_statements:
+            conn.execute(sql)
+
+
+def import_rows(kind, stream, conn=None, chunk_size=DEFAULT_CHUNK_SIZE, drop_indexes=False):
+    """
+        Streams the rows of a habits or streaks CSV file into the database.
+
+        The header row must name all columns of the table, in any order. Every row is validated on its own:
+        invalid rows are counted and reported, and the valid rows are inserted with executemany in transactions of
+        chunk_size rows, so only one chunk is held in memory at a time.
+
+        Args:
+        -----
+            - kind (str): 'habits' or 'streaks'.
+            - stream (file): The CSV text stream to read from.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - chunk_size (int): The number of rows which are inserted in one transaction.
+            - drop_indexes (bool): Whether the secondary indexes of the table are dropped during the load
+              and rebuilt afterwards, which is faster for very large files.
+
+        Returns:
+        --------
+            - An ImportResult tuple with the number of read, inserted, skipped (already existing) and invalid rows,
+              the first MAX_REPORTED_ERRORS errors as (line number, message) tuples, the number of chunks
+              and the duration in seconds.
+
+        Raises:
+        -------
+            - ValueError: If the kind is unknown or the header row misses a column.
+    """
+    if kind not in TABLE_IMPORTS:
+        raise ValueError(f"Unknown import: {kind}")
+    if chunk_size < 1:
+        raise ValueError("The chunk size must be at least 1.")
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return import_rows(kind, stream, pooled_conn, chunk_size, drop_indexes)
+
+    table_import = TABLE_IMPORTS[kind]
+    reader = csv.reader(stream)
+    header = [column.strip() for column in next(reader, [])]
+    missing = [column for column in table_import.columns if column not in header]
+    if missing:
+        raise ValueError(f"The CSV header misses the columns: {', '.join(missing)}")
+    positions = [header.index(column) for column in table_import.columns]
+
+    migrations.migrate(conn)
+    timestamp_format = storage.get_setting(conn, 'timestamp_format', TEXT_TIMESTAMPS)
+    started = time.perf_counter()
+    rows = inserted = invalid = chunks = 0
+    errors = []
+    chunk = []
+
+    def insert_chunk():
+        with storage.transaction(conn):
+            return conn.executemany(table_import.insert_sql, chunk).rowcount
+
+    # The rows of this import are the ones after the last rowid of the table before it
+    last_rowid = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table_import.table}").fetchone()[0]
+    index_statements = drop_secondary_indexes(conn, table_import.table) if drop_indexes else []
+    try:
+        for row in reader:
+            if not row:
+                continue
+            rows += 1
+            try:
+                if len(row) < len(header):
+                    raise ValueError(f"The row has {len(row)} cells instead of {len(header)}.")
+                chunk.append(table_import.convert([row[position] for position in positions], timestamp_format))
+            except ValueError as e:
+                invalid += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append((reader.line_num, str(e)))
+                continue
+            if len(chunk) == chunk_size:
+                inserted += insert_chunk()
+                chunks += 1
+                chunk = []
+        if chunk:
+            inserted += insert_chunk()
+            chunks += 1
+        # The imported streak history is written to the completion log of the imported habits without completions
+        with storage.transaction(conn):
+            completions.seed_completions(conn, habit_ids=[
+                habit_id for habit_id, in conn.execute(table_import.habit_ids_sql, (last_rowid,))])
+    finally:
+        if index_statements:
+            rebuild_indexes(conn, index_statements)
+        # The cached habit lists of the users do not know the imported habits
+        if kind == "habits":
+            storage.invalidate()
+
+    return ImportResult(rows, inserted, rows - invalid - inserted, invalid, errors, chunks,
+                        time.perf_counter() - started)
+
+
+def import_file(kind, path, conn=None, chunk_size=DEFAULT_CHUNK_SIZE, drop_indexes=False):
+    """
+        Opens a habits or streaks CSV file and imports it with import_rows().
+
+        Args:
+        -----
+            - kind (str): 'habits' or 'streaks'.
+            - path (str): The path of the CSV file.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - chunk_size (int): The number of rows which are inserted in one transaction.
+            - drop_indexes (bool): Whether the secondary indexes are dropped during the load and rebuilt afterwards.
+
+        Returns:
+        --------
+            - An ImportResult tuple, see import_rows().
+    """
+    with open(path, newline="", encoding="utf-8") as stream:
+        return import_rows(kind, stream, conn, chunk_size, drop_indexes)
+
+
+def main(argv=None):
+    """
+        The entry point of the standalone importer.
+
+        Args:
+        -----
+            - argv (list): The command line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Import habits or streak history from a CSV file.")
+    parser.add_argument("kind", choices=sorted(TABLE_IMPORTS), help="what the CSV file contains")
+    parser.add_argument("file", help="the CSV file in the layout of 'Test Data (Habits).csv' or 'Test Data (Streaks).csv'")
+    parser.add_argument("--database", help="the SQLite database file (default: habit_tracker_db.db of the app)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"rows per transaction (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--drop-indexes", action="store_true",
+                        help="drop the secondary indexes during the load and rebuild them afterwards")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        storage.configure(database=args.database)
+    try:
+        result = import_file(args.kind, args.file, chunk_size=args.chunk_size, drop_indexes=args.drop_indexes)
+    finally:
+        storage.close_pool()
+
+    for line_number, message in result.errors:
+        print(f"Line {line_number}: {message}", file=sys.stderr)
+    rate = result.rows / result.duration if result.duration > 0 else 0.0
+    print(f"{result.rows} rows read: {result.inserted} inserted, {result.skipped} already existed, "
+          f"{result.invalid} invalid, in {result.chunks} transactions, {result.duration:.3f} s ({rate:.0f} rows/s)")
+    return result
+
+
+if __name__ == "__main__":
+    main()
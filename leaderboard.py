@@ -0,0 +1,279 @@
+"""
+This module contains the leaderboards and streak distributions over the habits of all users of the habit tracker app.
+The leaderboard of a habit type and frequency is read from the index on (habit_type, habit_frequency, streak), so the
+top habits are the first entries of one index range however many habits there are. The distributions and ranks are
+read from the StreakDistribution rollup, the number of habits per habit type, frequency and streak length, which
+triggers on HabitsData keep up to date whenever a completion, an auto-reset or an edit changes a streak.
+It can also be run on its own to print the leaderboards of a database file.
+It imports argparse, migrations, storage and namedtuple.
+"""
+
+import argparse
+import migrations
+import storage
+
+from collections import namedtuple
+
+# The columns of HabitsData which are ranked, by the name of their streak kind
+STREAK_KINDS = {
+    'current': "habit_streak",
+    'longest': "longest_streak",
+}
+
+# The default number of habits of a leaderboard
+DEFAULT_LIMIT = 100
+
+# A habit of a leaderboard. Habits with the same streak share their rank.
+LeaderboardEntry = namedtuple('LeaderboardEntry', ['rank', 'habit_id', 'habit_creator', 'habit_name', 'streak'])
+
+# The number of habits with one streak length
+StreakBucket = namedtuple('StreakBucket', ['streak_length', 'habits'])
+
+# The statistics of a streak distribution
+StreakStats = namedtuple('StreakStats', ['habits', 'mean', 'median', 'p90', 'p99', 'longest'])
+
+# The rank of a habit among the habits of its type and frequency
+StreakRank = namedtuple('StreakRank', ['rank', 'habits', 'streak'])
+
+
+def _streak_column(kind):
+    """
+        Returns the HabitsData column of a streak kind, or raises a ValueError for an unknown kind.
+    """
+    if kind not in STREAK_KINDS:
+        raise ValueError(f"Unknown streak kind: {kind}")
+    return STREAK_KINDS[kind]
+
+
+def distribution_delta_sql(row, delta, kinds=tuple(STREAK_KINDS)):
+    """
+        Builds the SQL statements of a trigger which add a habit to the StreakDistribution rollup, or remove it.
+
+        The counts are only ever changed by adding the delta, so the triggers of one statement can run in any order,
+        and a count which drops to 0 is deleted.
+
+        Args:
+        -----
+            - row (str): The row of the trigger, 'NEW.' or 'OLD.'.
+            - delta (int): 1 to add the habit, -1 to remove it.
+            - kinds (tuple): The streak kinds whose counts are changed.
+
+        Returns:
+        --------
+            - The statements as a string, each ending with a semicolon.
+    """
+    statements = []
+    for kind in kinds:
+        key = (f"COALESCE({row}habit_type, ''), COALESCE({row}habit_frequency, ''), '{kind}', "
+               f"COALESCE({row}{STREAK_KINDS[kind]}, 0)")
+        statements.append(
+            "INSERT INTO StreakDistribution (habit_type, habit_frequency, streak_kind, streak_length, habits) "
+            f"VALUES ({key}, {delta}) ON CONFLICT (habit_type, habit_frequency, streak_kind, streak_length) "
+            f"DO UPDATE SET habits = habits + {delta};")
+        statements.append(
+            "DELETE FROM StreakDistribution WHERE (habit_type, habit_frequency, streak_kind, streak_length) = "
+            f"({key}) AND habits = 0;")
+    return " ".join(statements)
+
+
+def rebuild_distribution(conn):
+    """
+        Counts the habits of all users into the StreakDistribution rollup again.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+    """
+    conn.execute("DELETE FROM StreakDistribution")
+    for kind, column in STREAK_KINDS.items():
+        conn.execute("INSERT INTO StreakDistribution (habit_type, habit_frequency, streak_kind, streak_length, habits) "
+                     f"SELECT COALESCE(habit_type, ''), COALESCE(habit_frequency, ''), ?, COALESCE({column}, 0), "
+                     "COUNT(*) FROM HabitsData GROUP BY 1, 2, 4", (kind,))
+
+
+def top_streaks(habit_type, habit_frequency, kind='current', limit=DEFAULT_LIMIT, conn=None):
+    """
+        Lists the habits of all users of one habit type and frequency with the longest streaks.
+
+        Args:
+        -----
+            - habit_type (str): The habit type.
+            - habit_frequency (str): Daily or Weekly.
+            - kind (str): 'current' for the current streaks or 'longest' for the longest streaks.
+            - limit (int): The number of habits of the leaderboard.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Returns:
+        --------
+            - A list of LeaderboardEntry tuples from the longest streak, with ties ordered by habit_id.
+              Habits without a streak are left out.
+    """
+    column = _streak_column(kind)
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return top_streaks(habit_type, habit_frequency, kind, limit, pooled_conn)
+
+    rows = conn.execute(f"SELECT habit_id, habit_creator, habit_name, {column} FROM HabitsData "
+                        f"WHERE habit_type = ? AND habit_frequency = ? AND {column} > 0 "
+                        f"ORDER BY {column} DESC, habit_id LIMIT ?", (habit_type, habit_frequency, limit)).fetchall()
+    entries = []
+    for position, (habit_id, habit_creator, habit_name, streak) in enumerate(rows):
+        rank = entries[-1].rank if entries and entries[-1].streak == streak else position + 1
+        entries.append(LeaderboardEntry(rank, habit_id, habit_creator, habit_name, streak))
+    return entries
+
+
+def streak_distribution(kind='current', habit_type=None, habit_frequency=None, conn=None):
+    """
+        Counts the habits of all users per streak length from the StreakDistribution rollup.
+
+        Args:
+        -----
+            - kind (str): 'current' for the current streaks or 'longest' for the longest streaks.
+            - habit_type (str): Only count the habits of this type. Defaults to all types.
+            - habit_frequency (str): Only count the habits of this frequency. Defaults to both frequencies.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Returns:
+        --------
+            - A list of StreakBucket tuples from the shortest streak length, including the habits without a streak.
+    """
+    _streak_column(kind)
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return streak_distribution(kind, habit_type, habit_frequency, pooled_conn)
+
+    conditions, params = ["streak_kind = ?"], [kind]
+    for condition, value in (("habit_type = ?", habit_type), ("habit_frequency = ?", habit_frequency)):
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+    return [StreakBucket(*row) for row in conn.execute(
+        f"SELECT streak_length, SUM(habits) FROM StreakDistribution WHERE {' AND '.join(conditions)} "
+        "GROUP BY streak_length ORDER BY streak_length", params)]
+
+
+def streak_statistics(buckets):
+    """
+        Summarizes a streak distribution.
+
+        Args:
+        -----
+            - buckets (list): The StreakBucket tuples of streak_distribution(), from the shortest streak length.
+
+        Returns:
+        --------
+            - A StreakStats tuple with the number of habits, the mean streak and the nearest-rank median,
+              90th and 99th percentile and the longest streak, or None if there are no habits.
+    """
+    habits = sum(bucket.habits for bucket in buckets)
+    if not habits:
+        return None
+
+    def percentile(percent):
+        rank = max(1, -(-habits * percent // 100))
+        counted = 0
+        for bucket in buckets:
+            counted += bucket.habits
+            if counted >= rank:
+                return bucket.streak_length
+
+    return StreakStats(habits, sum(bucket.streak_length * bucket.habits for bucket in buckets) / habits,
+                       percentile(50), percentile(90), percentile(99), buckets[-1].streak_length)
+
+
+def streak_rank(habit_id, kind='current', conn=None):
+    """
+        Ranks a habit among the habits of all users with the same type and frequency, from the StreakDistribution
+        rollup: its rank is 1 plus the number of habits with a longer streak.
+
+        Args:
+        -----
+            - habit_id (int): The id of the habit.
+            - kind (str): 'current' for the current streaks or 'longest' for the longest streaks.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Returns:
+        --------
+            - A StreakRank tuple with the rank, the number of ranked habits and the streak of the habit,
+              or None if the habit does not exist.
+    """
+    column = _streak_column(kind)
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return streak_rank(habit_id, kind, pooled_conn)
+
+    habit = conn.execute(f"SELECT COALESCE(habit_type, ''), COALESCE(habit_frequency, ''), COALESCE({column}, 0) "
+                         "FROM HabitsData WHERE habit_id = ?", (habit_id,)).fetchone()
+    if habit is None:
+        return None
+    habit_type, habit_frequency, streak = habit
+    longer, habits = conn.execute(
+        "SELECT COALESCE(SUM(CASE WHEN streak_length > ? THEN habits END), 0), SUM(habits) FROM StreakDistribution "
+        "WHERE habit_type = ? AND habit_frequency = ? AND streak_kind = ?",
+        (streak, habit_type, habit_frequency, kind)).fetchone()
+    return StreakRank(longer + 1, habits, streak)
+
+
+def leaderboard_groups(conn=None):
+    """
+        Lists the habit types and frequencies of all habits with their number of habits, from the rollup.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Returns:
+        --------
+            - A list of tuples of the habit type, the habit frequency and the number of habits.
+    """
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return leaderboard_groups(pooled_conn)
+    return conn.execute("SELECT habit_type, habit_frequency, SUM(habits) FROM StreakDistribution "
+                        "WHERE streak_kind = 'current' GROUP BY habit_type, habit_frequency "
+                        "ORDER BY habit_type, habit_frequency").fetchall()
+
+
+def main(argv=None):
+    """
+        The entry point of the standalone leaderboards.
+
+        Args:
+        -----
+            - argv (list): The command line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Print the streak leaderboards and distributions of all users.")
+    parser.add_argument("database", nargs="?", help="the SQLite database file (default: habit_tracker_db.db of the app)")
+    parser.add_argument("--type", dest="habit_type", help="print the leaderboard of this habit type")
+    parser.add_argument("--frequency", dest="habit_frequency", default="Daily",
+                        help="the habit frequency of the leaderboard (default: Daily)")
+    parser.add_argument("--kind", choices=tuple(STREAK_KINDS), default="current",
+                        help="rank the current or the longest streaks (default: current)")
+    parser.add_argument("--limit", type=int, default=10, help="the number of habits of the leaderboard (default: 10)")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        storage.configure(database=args.database)
+    try:
+        migrations.migrate()
+        if args.habit_type is None:
+            print(f"{'habit type':<25} {'frequency':<10} {'habits':>10} {'mean':>8} {'median':>8} {'p90':>6} "
+                  f"{'p99':>6} {'longest':>8}")
+            for habit_type, habit_frequency, _ in leaderboard_groups():
+                stats = streak_statistics(streak_distribution(args.kind, habit_type, habit_frequency))
+                print(f"{habit_type:<25} {habit_frequency:<10} {stats.habits:>10} {stats.mean:>8.2f} "
+                      f"{stats.median:>8} {stats.p90:>6} {stats.p99:>6} {stats.longest:>8}")
+            return None
+
+        entries = top_streaks(args.habit_type, args.habit_frequency, args.kind, args.limit)
+        print(f"The {args.kind} streak leaderboard of {args.habit_frequency} {args.habit_type} habits:")
+        for entry in entries:
+            print(f"{entry.rank:>5}. {entry.habit_creator:<20} {entry.habit_name:<25} {entry.streak:>6}")
+        return entries
+    finally:
+        storage.close_pool()
+
+
+if __name__ == "__main__":
+    main()
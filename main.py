@@ -1,18 +1,26 @@
 """
 This module is the main module of the whole habit tracker app.
 While running this module, the user can do various functions.
-It imports Habit class from Habit module, UserProfile class from functions module, analytics module, os and sqlite3.
+It can also run a script of commands without the interactive menu, see run_script().
+It imports argparse, sys, time, Habit class from Habit module, UserProfile class from functions module,
+StreakExpiryScheduler class from scheduler module, analytics, batch, migrations and storage.
 """
 
-import sqlite3
+import argparse
+import sys
+import time
 import analytics
+import batch
+import migrations
+import storage
 from Habit import Habit
 from functions import UserProfile
+from scheduler import StreakExpiryScheduler
 
 
 def main(forename=None, surname=None, username=None, password=None, habit_name=None, habit_creator=None,
          habit_type=None, habit_frequency=None, created_datetime=None, last_completion_date=None, habit_streak=0,
-         streak_start_date=None, streak_end_date=None, streak_length=0):
+         streak_start_date=None, streak_end_date=None, streak_length=0, show_timings=False):
 
     """
         The main function is the entry point of the Habit Tracker App.
@@ -34,16 +42,19 @@ def main(forename=None, surname=None, username=None, password=None, habit_name=N
             - streak_end_date (datetime): Datetime when the habit streak ends
             - streak_length (int): The length of a habit streak
             - habit_streak(int): The number of a habit streak
+            - show_timings (bool): Whether the run time of every command is printed after logout
     """
 
-    # Connect to the database and Create the necessary tables
-    conn = sqlite3.connect('habit_tracker_db.db')
+    # Create the necessary tables in the database
     habit_obj = Habit(habit_name, habit_creator, habit_type, habit_frequency, created_datetime,
                       last_completion_date, streak_start_date, streak_end_date, streak_length, habit_streak)
     habit_obj.habits_table()
     habit_obj.streaks_table()
     habit_obj.users_table()
 
+    # Upgrade the tables of an existing database to the latest schema version
+    migrations.migrate()
+
     # Print out welcome messages to the user in a visual way
     print("\n" * 2)
     print(" /$$      /$$ /$$$$$$$$ /$$        /$$$$$$   /$$$$$$  /$$      /$$ /$$$$$$$$ /$$")
@@ -59,6 +70,9 @@ def main(forename=None, surname=None, username=None, password=None, habit_name=N
           "\nThis app helps you track your habits and maintain streaks to achieve your goals. Let's get started! ~~~")
     print("\n" * 3)
 
+    # The expired streaks of all users are auto-reset in the background while the user is logged in
+    scheduler = StreakExpiryScheduler()
+
     # check if user is logging in or registering for the first time
     while True:
         is_first_time = input("Are you a first-time user? (yes/no)")
@@ -66,19 +80,146 @@ def main(forename=None, surname=None, username=None, password=None, habit_name=N
             user_obj = UserProfile(forename, surname, username, password)
             user_obj.register()
             username = user_obj.username
-            menu(username, habit_obj, user_obj)
-            conn.commit()
+            scheduler.start()
+            timings = menu(username, habit_obj, user_obj)
             break
         elif is_first_time == "no":
             user_obj = UserProfile(forename, surname, username, password)
             user_obj.login()
             username = user_obj.username
-            menu(username, habit_obj, user_obj)
-            conn.commit()
+            scheduler.start()
+            timings = menu(username, habit_obj, user_obj)
             break
         else:
             print("Please type only 'yes' or 'no'")
 
+    # Stop the background scheduler and close all the connections with the database
+    scheduler.stop()
+    storage.close_pool()
+    if show_timings:
+        print_timings(timings)
+
+
+# The menus of the app as command tables: every option number maps to its label and either a function which
+# gets the UserProfile object of the logged-in user, another command table for a sub-menu, or None to go back
+ADJUST_MENU = {
+    # In sub-option 1, the user can change the habits' types.
+    "1": ("Change habit type", lambda user_obj: user_obj.change_habit_type()),
+    # In sub-option 2, the user can change the habits' frequencies.
+    "2": ("Change habit frequency", lambda user_obj: user_obj.change_habit_frequency()),
+    # In sub-option 3, the user can delete the habits.
+    "3": ("Delete habit", lambda user_obj: user_obj.delete_habit()),
+    # In sub-option 4, the user will be taken back to menu page.
+    "4": ("Go back to main menu", None),
+}
+
+HABIT_LIST_MENU = {
+    # In sub-option 1, the user can see all habits existed in his account.
+    "1": ("All habits list", lambda user_obj: analytics.show_all_habits(user_obj.username)),
+    # In sub-option 2, the user can see all daily habits existed in his account.
+    "2": ("All daily habits list", lambda user_obj: analytics.show_daily_habits(user_obj.username)),
+    # In sub-option 3, the user can see all weekly habits existed in his account.
+    "3": ("All weekly habits list", lambda user_obj: analytics.show_weekly_habits(user_obj.username)),
+    # In sub-option 4, the user will be taken back to menu page.
+    "4": ("Go back to main menu", None),
+}
+
+PERFORMANCE_MENU = {
+    # In sub-option 1, the user can see current streak summary of all habits existed in his account.
+    "1": ("Current streak summary", lambda user_obj: analytics.current_streak_summary(user_obj.username)),
+    # In sub-option 2, the user can see current streak of his selected habit.
+    "2": ("Current streak of selected habit",
+          lambda user_obj: analytics.current_streak_of_selected_habit(user_obj.username)),
+    # In sub-option 3, the user can see the longest run streak summary of all habits existed in his account.
+    "3": ("Longest streak summary", lambda user_obj: analytics.longest_streak_summary(user_obj.username)),
+    # In sub-option 4, the user can see the longest run streak of his selected habit.
+    "4": ("Longest streak of selected habit",
+          lambda user_obj: analytics.longest_streak_of_selected_habit(user_obj.username)),
+    # In sub-option 5, the user can see the completion rates of all his habits over the last 7, 30 and 90 days.
+    "5": ("Completion rate summary", lambda user_obj: analytics.completion_rate_summary(user_obj.username)),
+    # In sub-option 6, the user can see the rolling 7-day completion rate of his selected habit over the last 30 days.
+    "6": ("Completion trend of selected habit",
+          lambda user_obj: analytics.completion_trend_of_selected_habit(user_obj.username)),
+    # In sub-option 7, the user can see a heat map of the completions of his habits per weekday.
+    "7": ("Weekday heat map", lambda user_obj: analytics.weekday_heat_map(user_obj.username)),
+    # In sub-option 8, the user can see the streaks and completion rates of every habit type.
+    "8": ("Habit type statistics", lambda user_obj: analytics.habit_type_summary(user_obj.username)),
+    # In sub-option 9, the user will be taken back to menu page.
+    "9": ("Go back to main menu", None),
+}
+
+MAIN_MENU = {
+    # In Option 1, from the list of 7 predefined habits, the user can choose a habit or many as he likes.
+    "1": ("Choose predefined habits", lambda user_obj: user_obj.choose_predefined_habits()),
+    # In Option 2, the user can create a new habit on his own.
+    "2": ("Create a new habit", lambda user_obj: user_obj.create_habit()),
+    # In Option 3, the user can mark the habits completed.
+    "3": ("Mark a habit as completed", lambda user_obj: user_obj.complete_habit()),
+    # In Option 4, there are 4 sub-options.
+    "4": ("Adjust habits", ADJUST_MENU),
+    # In Option 5, there are 4 sub-options.
+    "5": ("Habit list overview", HABIT_LIST_MENU),
+    # In Option 6, there are 5 sub-options.
+    "6": ("Habit performance statistics", PERFORMANCE_MENU),
+    # In Option 7, the user can edit their user account profile.
+    "7": ("User profile", lambda user_obj: user_obj.edit_profile()),
+    # In Option 8, this will make the user logout from the program and closes all the connections.
+    "8": ("Quit and log out", None),
+}
+
+
+def menu_prompt(commands):
+    """
+        Builds the prompt of a menu from its command table.
+
+        Args:
+        -----
+            - commands (dict): The command table of the menu.
+
+        Returns:
+        --------
+            - The prompt as a string, e.g. "Select an option (1-4):\n1. Change habit type\n...".
+    """
+    options = "\n".join(f"{choice}. {label}" for choice, (label, _) in commands.items())
+    return f"Select an option (1-{len(commands)}):\n{options}"
+
+
+def select_command(commands):
+    """
+        Prompts the user for an option of a menu, and for an option of its sub-menu if the option is a sub-menu.
+
+        Args:
+        -----
+            - commands (dict): The command table of the menu.
+
+        Returns:
+        --------
+            - A tuple of the label and the function of the selected command. The function is None if the user chose
+              to go back or to quit. The label is None if the input was not a valid option.
+    """
+    print("\n" * 2)
+    choice = input(menu_prompt(commands))
+    if choice not in commands:
+        return None, None
+    label, action = commands[choice]
+    if isinstance(action, dict):
+        return select_command(action)
+    print("\n" * 1)
+    return label, action
+
+
+def print_timings(timings):
+    """
+        Prints how often every command of the session was run and how long it took.
+
+        Args:
+        -----
+            - timings (dict): The timings collected by menu().
+    """
+    for label, (count, total, longest) in timings.items():
+        print(f"{label}: {count} runs, {total:.3f} s in total, {total / count:.3f} s on average, "
+              f"{longest:.3f} s at most")
+
 
 def menu(username, habit_obj, user_obj):
     """
@@ -86,6 +227,11 @@ def menu(username, habit_obj, user_obj):
         Depending on the user's input, the function calls other methods in the habit_obj and user_obj objects
         to perform various actions within the program related to habits tracking.
 
+        The menu runs in a loop over the command tables until the user quits, so a long session does not grow the
+        call stack, and all commands share the one database connection of the user session: the loop holds a
+        connection of the shared pool, which the pool hands back to every operation of the same thread, and gives
+        it back when the session ends, also by an exception or Ctrl+C.
+
         Parameters:
         -----------
             - username (str): A string representing the username of the current user.
@@ -94,126 +240,87 @@ def menu(username, habit_obj, user_obj):
 
         Return:
         -------
-            - None
+            - A dictionary which maps the label of every command that was run to the number of runs,
+              the total and the longest run time in seconds.
     """
-    print("\n" * 2)
-    choice = input("Select an option (1-8):\n1. Choose predefined habits\n2. Create a new habit\n3. "
-                   "Mark a habit as completed\n4. Adjust habits\n5. Habit list overview\n6. Habit performance statistics\n7. "
-                   "User profile\n8. Quit and log out")
-    conn = sqlite3.connect('habit_tracker_db.db')
+    timings = {}
+    # The connection of the session is held by the loop and borrowed again by every command
+    with storage.connection():
+        while True:
+            label, action = select_command(MAIN_MENU)
+            if label is None:
+                print("Please select one of the listed options.")
+                continue
+            if action is None:
+                if label == MAIN_MENU["8"][0]:
+                    break
+                # Going back from a sub-menu shows the main menu again
+                continue
 
-    # In Option 1, from the list of 7 predefined habits, the user can choose a habit or many as he likes.
-    if choice == "1":
-        print("\n" * 1)
-        user_obj.choose_predefined_habits()
-        menu(username, habit_obj, user_obj)
+            started = time.perf_counter()
+            action(user_obj)
+            duration = time.perf_counter() - started
+            count, total, longest = timings.get(label, (0, 0.0, 0.0))
+            timings[label] = (count + 1, total + duration, max(longest, duration))
 
-    # In Option 2, the user can create a new habit on his own.
-    elif choice == "2":
-        print("\n" * 1)
-        user_obj.create_habit()
-        menu(username, habit_obj, user_obj)
+    # Option 8 makes the user logout from the program
+    print("\n" * 1)
+    user_obj.logout()
+    return timings
 
-    # In Option 3, the user can mark the habits completed.
-    elif choice == "3":
-        print("\n" * 1)
-        user_obj.complete_habit()
-        menu(username, habit_obj, user_obj)
 
-    # In Option 4, there are 4 sub-options.
-    elif choice == "4":
-        print("\n" * 2)
-        adjust_choice = input("Select an option (1-4):\n1. Change habit type\n2. Change habit frequency\n3. "
-                              "Delete habit\n4. Go back to main menu")
-        # In sub-option 1, the user can change the habits' types.
-        if adjust_choice == "1":
-            print("\n" * 1)
-            user_obj.change_habit_type()
-            menu(username, habit_obj, user_obj)
-        # In sub-option 2, the user can change the habits' frequencies.
-        elif adjust_choice == "2":
-            print("\n" * 1)
-            user_obj.change_habit_frequency()
-            menu(username, habit_obj, user_obj)
-        # In sub-option 3, the user can delete the habits.
-        elif adjust_choice == "3":
-            print("\n" * 1)
-            user_obj.delete_habit()
-            menu(username, habit_obj, user_obj)
-        # In sub-option 4, the user will be taken back to menu page.
-        elif adjust_choice == "4":
-            print("\n" * 1)
-            menu(username, habit_obj, user_obj)
+def run_script(path, script_format=None, batch_size=batch.DEFAULT_BATCH_SIZE):
+    """
+        Runs a script of register, create, complete and report commands without the interactive menu.
 
-    # In Option 5, there are 4 sub-options.
-    elif choice == "5":
-        print("\n" * 2)
-        habit_list_choice = input("Select an option (1-4):\n1. All habits list\n2. All daily habits list\n3. "
-                                  "All weekly habits list\n4. Go back to main menu")
-        username = user_obj.username
-        # In sub-option 1, the user can see all habits existed in his account.
-        if habit_list_choice == "1":
-            print("\n" * 1)
-            analytics.show_all_habits(username)
-            menu(username, habit_obj, user_obj)
-        # In sub-option 2, the user can see all daily habits existed in his account.
-        elif habit_list_choice == "2":
-            print("\n" * 1)
-            analytics.show_daily_habits(username)
-            menu(username, habit_obj, user_obj)
-        # In sub-option 3, the user can see all weekly habits existed in his account.
-        elif habit_list_choice == "3":
-            print("\n" * 1)
-            analytics.show_weekly_habits(username)
-            menu(username, habit_obj, user_obj)
-        # In sub-option 4, the user will be taken back to menu page.
-        elif habit_list_choice == "4":
-            print("\n" * 1)
-            menu(username, habit_obj, user_obj)
+        The reports and errors are printed as JSON lines, and a summary with the number of commands per second
+        is printed to stderr.
 
-    # In Option 6, there are 5 sub-options.
-    elif choice == "6":
-        print("\n" * 2)
-        performance_choice = input("Select an option (1-5):\n1. Current streak summary\n2. "
-                                   "Current streak of selected habit\n3. Longest streak summary\n4. "
-                                   "Longest streak of selected habit\n5. Go back to main menu")
-        username = user_obj.username
-        # In sub-option 1, the user can see current streak summary of all habits existed in his account.
-        if performance_choice == "1":
-            print("\n" * 1)
-            analytics.current_streak_summary(username)
-            menu(username, habit_obj, user_obj)
-        # In sub-option 2, the user can see current streak of his selected habit.
-        elif performance_choice == "2":
-            print("\n" * 1)
-            analytics.current_streak_of_selected_habit(username)
-            menu(username, habit_obj, user_obj)
-        # In sub-option 3, the user can see the longest run streak summary of all habits existed in his account.
-        elif performance_choice == "3":
-            print("\n" * 1)
-            analytics.longest_streak_summary(username)
-            menu(username, habit_obj, user_obj)
-        # In sub-option 4, the user can see the longest run streak of his selected habit.
-        elif performance_choice == "4":
-            print("\n" * 1)
-            analytics.longest_streak_of_selected_habit(username)
-            menu(username, habit_obj, user_obj)
-        # In sub-option 5, the user will be taken back to menu page.
-        elif performance_choice == "5":
-            print("\n" * 1)
-            menu(username, habit_obj, user_obj)
+        Parameters:
+        -----------
+            - path (str): The file of the script, or '-' to read it from stdin.
+            - script_format (str): 'jsonl' or 'csv'. Defaults to 'csv' for .csv files and to 'jsonl' otherwise.
+            - batch_size (int): The number of commands which are committed together in one transaction.
 
-    # In Option 7, the user can edit their user account profile.
-    elif choice == "7":
-        print("\n" * 1)
-        user_obj.edit_profile()
-        menu(username, habit_obj, user_obj)
+        Return:
+        -------
+            - The ScriptResult tuple of batch.run_commands().
+    """
+    if script_format is None:
+        script_format = "csv" if path.lower().endswith(".csv") else "jsonl"
+
+    # Create the necessary tables in the database and upgrade them to the latest schema version
+    habit_obj = Habit(None, None, None, None, None, None, None, None, 0, 0)
+    habit_obj.habits_table()
+    habit_obj.streaks_table()
+    habit_obj.users_table()
+    migrations.migrate()
+
+    try:
+        if path == "-":
+            result = batch.run_script(sys.stdin, script_format, batch_size)
+        else:
+            with open(path, newline="", encoding="utf-8") as stream:
+                result = batch.run_script(stream, script_format, batch_size)
+    finally:
+        storage.close_pool()
 
-    # In Option 3, this will make th user logout from the program and closes all the connections.
-    elif choice == "8":
-        print("\n" * 1)
-        user_obj.logout()
-        conn.close()
+    rate = result.commands / result.duration if result.duration > 0 else 0.0
+    print(f"{result.commands} commands ({result.errors} failed) in {result.batches} transactions, "
+          f"{result.duration:.3f} s ({rate:.0f} commands/s)", file=sys.stderr)
+    return result
 
 
-main()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="The Habit Tracker App.")
+    parser.add_argument("--timings", action="store_true", help="print the run time of every command after logout")
+    parser.add_argument("--script", metavar="FILE",
+                        help="run the commands of a JSON lines or CSV file ('-' for stdin) instead of the menu")
+    parser.add_argument("--format", choices=batch.SCRIPT_FORMATS, help="the format of the script (default: by extension)")
+    parser.add_argument("--batch-size", type=int, default=batch.DEFAULT_BATCH_SIZE,
+                        help=f"commands per transaction in script mode (default: {batch.DEFAULT_BATCH_SIZE})")
+    args = parser.parse_args()
+    if args.script:
+        run_script(args.script, args.format, args.batch_size)
+    else:
+        main(show_timings=args.timings)
@@ -0,0 +1,584 @@
+"""
+This module contains the versioned schema migrations of the habit tracker database.
+The schema version of a database is kept in SQLite's 'user_version' header field, and every migration
+which is newer than that version is applied in place, each one inside its own transaction.
+It can also be run on its own to upgrade an existing 'habit_tracker_db.db' database file,
+and to convert its stored dates and times between text and epoch seconds.
+The SQL of the triggers and backfills is written into the migrations as it was when they were added, so the
+query helpers of the other modules can change without changing what an old migration does.
+It imports argparse, storage and the timestamp constants from Habit module.
+"""
+
+import argparse
+import storage
+
+from Habit import TEXT_TIMESTAMPS, EPOCH_TIMESTAMPS, TIMESTAMP_FORMATS
+
+
+# The table layouts after migration 1. The integer primary keys are added as the last columns,
+# so the column positions of all earlier columns stay the same for existing queries.
+HABITS_TABLE_V1 = (
+    "CREATE TABLE {table} "
+    "(habit_name TEXT, habit_creator TEXT, habit_type TEXT, habit_frequency TEXT, created_datetime DATETIME, "
+    "last_completion_date DATETIME, habit_streak INTEGER, habit_id INTEGER PRIMARY KEY)"
+)
+STREAKS_TABLE_V1 = (
+    "CREATE TABLE {table} "
+    "(habit_name TEXT, habit_creator TEXT, habit_type TEXT, habit_frequency TEXT, streak_start_date DATETIME, "
+    "streak_end_date DATETIME, streak_length INTEGER, streak_id INTEGER PRIMARY KEY)"
+)
+USERS_TABLE_V1 = (
+    "CREATE TABLE {table} "
+    "(forename TEXT, surname TEXT, username VARCHAR, password VARCHAR, user_id INTEGER PRIMARY KEY)"
+)
+
+# The date and time columns of every table, which convert_timestamps() converts. The longest streak dates of
+# HabitsData are copies of StreaksData dates, which the longest streak triggers convert together with them.
+TIMESTAMP_COLUMNS = {
+    "HabitsData": ("created_datetime", "last_completion_date"),
+    "StreaksData": ("streak_start_date", "streak_end_date"),
+}
+
+
+class MigrationError(ValueError):
+    """
+    Raised when a migration cannot be applied to the data of the database without losing rows.
+    """
+
+
+def table_exists(conn, table):
+    """
+        Checks whether a table exists in the database.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - table (str): The name of the table.
+
+        Returns:
+        --------
+            - True if the table exists, False otherwise.
+    """
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return row is not None
+
+
+def column_names(conn, table):
+    """
+        Returns the column names of a table in their defined order.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - table (str): The name of the table.
+
+        Returns:
+        --------
+            - A list of column names.
+    """
+    return [column[1] for column in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _rebuild_table(conn, table, create_sql, key_column):
+    """
+        Rebuilds a table with the layout of create_sql and keeps the rowids of the old rows as the new primary keys.
+
+        If the table does not exist yet, it is simply created with the new layout.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - table (str): The name of the table.
+            - create_sql (str): The CREATE TABLE statement with a '{table}' placeholder for the table name.
+            - key_column (str): The name of the new integer primary key column.
+    """
+    if not table_exists(conn, table):
+        conn.execute(create_sql.format(table=table))
+        return
+    old_columns = column_names(conn, table)
+    if key_column in old_columns:
+        return
+
+    columns = ", ".join(old_columns)
+    conn.execute(create_sql.format(table=f"{table}_new"))
+    conn.execute(f"INSERT INTO {table}_new ({columns}, {key_column}) SELECT {columns}, rowid FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+
+def _rename_duplicate_habits(conn):
+    """
+        Renames the habits which share their name with an older habit of the same user, which the earlier versions
+        allowed for habits of different frequencies, so the unique index on (habit_creator, habit_name) can be added
+        without losing any habit. The oldest habit keeps its name, the others get their frequency appended,
+        e.g. 'Reading (Weekly)', and their streak rows are renamed with them.
+
+        Returns:
+        --------
+            - A list of tuples of the username, the old and the new habit name of every renamed habit.
+    """
+    if not table_exists(conn, "HabitsData") or "habit_id" in column_names(conn, "HabitsData"):
+        return []
+    rows = conn.execute("SELECT rowid, habit_creator, habit_name, habit_frequency FROM HabitsData "
+                        "WHERE (habit_creator, habit_name) IN (SELECT habit_creator, habit_name FROM HabitsData "
+                        "GROUP BY habit_creator, habit_name HAVING COUNT(*) > 1) "
+                        "ORDER BY habit_creator, habit_name, rowid").fetchall()
+    taken = set(conn.execute("SELECT habit_creator, habit_name FROM HabitsData"))
+    rename_streaks = table_exists(conn, "StreaksData")
+    renamed = []
+    for position, (rowid, habit_creator, habit_name, habit_frequency) in enumerate(rows):
+        if position == 0 or rows[position - 1][1:3] != (habit_creator, habit_name):
+            group = [row for row in rows if row[1:3] == (habit_creator, habit_name)]
+            continue
+        new_name = base_name = f"{habit_name} ({habit_frequency})"
+        number = 2
+        while (habit_creator, new_name) in taken:
+            new_name = f"{base_name} {number}"
+            number += 1
+        taken.add((habit_creator, new_name))
+        conn.execute("UPDATE HabitsData SET habit_name = ? WHERE rowid = ?", (new_name, rowid))
+        # The streak rows only belong to this habit if no other habit of the same name has its frequency
+        if rename_streaks and [row[3] for row in group].count(habit_frequency) == 1:
+            conn.execute("UPDATE StreaksData SET habit_name = ? WHERE habit_creator = ? AND habit_name = ? "
+                         "AND habit_frequency IS ?", (new_name, habit_creator, habit_name, habit_frequency))
+        renamed.append((habit_creator, habit_name, new_name))
+    return renamed
+
+
+def _check_duplicate_usernames(conn):
+    """
+        Stops migration 1 if several user accounts share a username, which the unique index on username does not
+        allow. They cannot be told apart by their habits, which only name their creator, so they are not merged
+        or renamed automatically but left for the administrator to resolve.
+
+        Raises:
+        -------
+            - MigrationError: If a username is duplicated, with the list of the duplicated usernames.
+    """
+    if not table_exists(conn, "User") or "user_id" in column_names(conn, "User"):
+        return
+    duplicates = [username for username, in conn.execute(
+        "SELECT username FROM User GROUP BY username HAVING COUNT(*) > 1 ORDER BY username")]
+    if duplicates:
+        raise MigrationError("Several user accounts share the usernames " + ", ".join(map(str, duplicates)) +
+                             ". Rename or delete the duplicated accounts in the User table and migrate again.")
+
+
+def _add_primary_keys_and_indexes(conn):
+    """
+        Migration 1: Adds integer primary keys to HabitsData, StreaksData and User, and indexes the lookup columns.
+
+        - HabitsData gets 'habit_id' and a UNIQUE index on (habit_creator, habit_name). Habits which share their name
+          with an older habit of the same user are renamed first, see _rename_duplicate_habits().
+        - StreaksData gets 'streak_id' and an index on (habit_creator, habit_name, habit_type, habit_frequency).
+        - User gets 'user_id' and a UNIQUE index on username. The migration stops if a username is duplicated,
+          see _check_duplicate_usernames().
+    """
+    _check_duplicate_usernames(conn)
+    _rename_duplicate_habits(conn)
+    _rebuild_table(conn, "HabitsData", HABITS_TABLE_V1, "habit_id")
+    _rebuild_table(conn, "StreaksData", STREAKS_TABLE_V1, "streak_id")
+    _rebuild_table(conn, "User", USERS_TABLE_V1, "user_id")
+
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_habits_creator_name ON HabitsData (habit_creator, habit_name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_streaks_habit "
+                 "ON StreaksData (habit_creator, habit_name, habit_type, habit_frequency)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON User (username)")
+
+
+# The 'next_due' expression of migrations 2 and 3 for the columns of a row prefix, e.g. 'NEW.' inside a trigger:
+# the last completion date, stored as text or as epoch seconds, plus 2 days for Daily and 8 days for Weekly habits
+NEXT_DUE_V2 = (
+    "(CASE typeof({row}last_completion_date) WHEN 'integer' THEN {row}last_completion_date "
+    "ELSE CAST(strftime('%s', {row}last_completion_date) AS INTEGER) END) "
+    "+ (CASE {row}habit_frequency WHEN 'Daily' THEN 2 WHEN 'Weekly' THEN 8 END) * 86400"
+)
+
+
+def _add_next_due(conn):
+    """
+        Migration 2: Adds the indexed 'next_due' column to HabitsData, the moment from which a habit is overdue.
+
+        The column is filled for the existing habits and kept up to date by triggers whenever a habit is inserted
+        or its last completion date or frequency changes, so the streak expiry only needs to read the due habits.
+    """
+    if "next_due" not in column_names(conn, "HabitsData"):
+        conn.execute("ALTER TABLE HabitsData ADD COLUMN next_due INTEGER")
+    conn.execute("UPDATE HabitsData SET next_due = " + NEXT_DUE_V2.format(row=""))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_habits_next_due ON HabitsData (next_due) "
+                 "WHERE next_due IS NOT NULL")
+    _create_next_due_triggers(conn)
+
+
+def _create_next_due_triggers(conn):
+    """
+        (Re-)Creates the triggers which keep the 'next_due' column of HabitsData up to date.
+    """
+    conn.execute("DROP TRIGGER IF EXISTS trg_habits_next_due_insert")
+    conn.execute("CREATE TRIGGER trg_habits_next_due_insert AFTER INSERT ON HabitsData "
+                 "BEGIN UPDATE HabitsData SET next_due = " + NEXT_DUE_V2.format(row="NEW.") +
+                 " WHERE habit_id = NEW.habit_id; END")
+    conn.execute("DROP TRIGGER IF EXISTS trg_habits_next_due_update")
+    conn.execute("CREATE TRIGGER trg_habits_next_due_update "
+                 "AFTER UPDATE OF last_completion_date, habit_frequency ON HabitsData "
+                 "BEGIN UPDATE HabitsData SET next_due = " + NEXT_DUE_V2.format(row="NEW.") +
+                 " WHERE habit_id = NEW.habit_id; END")
+
+
+def _add_settings(conn):
+    """
+        Migration 3: Adds the Settings table, which stores how the dates and times of the database are written.
+
+        The 'timestamp_format' setting starts as 'text', the format of all existing rows, and can be switched
+        to 'epoch' with convert_timestamps(). The 'next_due' triggers are recreated, so they read both formats.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS Settings (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("INSERT OR IGNORE INTO Settings (key, value) VALUES ('timestamp_format', ?)", (TEXT_TIMESTAMPS,))
+    _create_next_due_triggers(conn)
+
+
+def _add_habit_listing_index(conn):
+    """
+        Migration 4: Indexes the habits of every user in the order they were created, so the habit listings can be
+        paged through with keyset pagination without sorting the habits of the user first.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_habits_creator_id ON HabitsData (habit_creator, habit_id)")
+
+
+# The longest streak columns of HabitsData and their types, which migration 5 adds
+LONGEST_STREAK_COLUMNS = (
+    ("longest_streak", "INTEGER"),
+    ("longest_streak_start_date", "DATETIME"),
+    ("longest_streak_end_date", "DATETIME"),
+    ("longest_streak_id", "INTEGER"),
+)
+
+# Sets the longest streak columns of the HabitsData rows matched by a WHERE clause from their StreaksData rows.
+# Ties are won by the oldest streak, and habits which were never completed get NULL.
+SET_LONGEST_STREAK = (
+    "UPDATE HabitsData SET (longest_streak, longest_streak_start_date, longest_streak_end_date, longest_streak_id) = "
+    "(SELECT s.streak_length, s.streak_start_date, s.streak_end_date, s.streak_id FROM StreaksData s "
+    "WHERE s.habit_creator = HabitsData.habit_creator AND s.habit_name = HabitsData.habit_name "
+    "ORDER BY s.streak_length DESC, s.streak_id LIMIT 1) WHERE "
+)
+
+# Copies a StreaksData row of a trigger into the longest streak columns of its habit
+COPY_LONGEST_STREAK = (
+    "UPDATE HabitsData SET longest_streak = NEW.streak_length, longest_streak_start_date = NEW.streak_start_date, "
+    "longest_streak_end_date = NEW.streak_end_date, longest_streak_id = NEW.streak_id "
+    "WHERE habit_creator = NEW.habit_creator AND habit_name = NEW.habit_name AND "
+)
+
+
+def _add_longest_streak(conn):
+    """
+        Migration 5: Adds the longest streak of every habit to HabitsData, with its start and end dates and the id of
+        its StreaksData row, so the longest streak reports read one row per habit instead of grouping the history.
+
+        The columns are filled for the existing habits and kept up to date by triggers on StreaksData, so they change
+        in the same transaction as the streak rows of a completion or an auto-reset:
+        - a new or growing streak only has to be compared with the longest streak of its habit,
+        - only when the longest streak itself shrinks or is deleted, the streaks of its habit are searched again.
+    """
+    existing_columns = column_names(conn, "HabitsData")
+    for column, column_type in LONGEST_STREAK_COLUMNS:
+        if column not in existing_columns:
+            conn.execute(f"ALTER TABLE HabitsData ADD COLUMN {column} {column_type}")
+
+    # The longest streak of every habit is the first of its streaks numbered from the longest one,
+    # ties are won by the oldest streak
+    conn.execute("UPDATE HabitsData SET longest_streak = NULL, longest_streak_start_date = NULL, "
+                 "longest_streak_end_date = NULL, longest_streak_id = NULL")
+    conn.execute("UPDATE HabitsData SET longest_streak = l.streak_length, "
+                 "longest_streak_start_date = l.streak_start_date, longest_streak_end_date = l.streak_end_date, "
+                 "longest_streak_id = l.streak_id "
+                 "FROM (SELECT s.habit_name, s.habit_creator, s.streak_start_date, s.streak_end_date, s.streak_length, "
+                 "s.streak_id FROM (SELECT streak_id, ROW_NUMBER() OVER (PARTITION BY habit_creator, habit_name "
+                 "ORDER BY streak_length DESC, streak_id) AS streak_rank FROM StreaksData) AS r "
+                 "JOIN StreaksData s ON s.streak_id = r.streak_id WHERE r.streak_rank = 1) AS l "
+                 "WHERE HabitsData.habit_creator = l.habit_creator AND HabitsData.habit_name = l.habit_name")
+    _create_longest_streak_triggers(conn)
+
+
+def _create_longest_streak_triggers(conn):
+    """
+        (Re-)Creates the triggers which keep the longest streak columns of HabitsData up to date.
+    """
+    beats_longest = ("(longest_streak_id IS NULL OR NEW.streak_length > longest_streak "
+                     "OR (NEW.streak_length = longest_streak AND NEW.streak_id < longest_streak_id))")
+    conn.execute("DROP TRIGGER IF EXISTS trg_habits_longest_streak_insert")
+    conn.execute("CREATE TRIGGER trg_habits_longest_streak_insert AFTER INSERT ON HabitsData "
+                 "BEGIN " + SET_LONGEST_STREAK + "habit_id = NEW.habit_id; END")
+    conn.execute("DROP TRIGGER IF EXISTS trg_streaks_longest_insert")
+    conn.execute("CREATE TRIGGER trg_streaks_longest_insert AFTER INSERT ON StreaksData "
+                 "BEGIN " + COPY_LONGEST_STREAK + beats_longest + "; END")
+    conn.execute("DROP TRIGGER IF EXISTS trg_streaks_longest_update")
+    conn.execute("CREATE TRIGGER trg_streaks_longest_update "
+                 "AFTER UPDATE OF streak_start_date, streak_end_date, streak_length ON StreaksData "
+                 "WHEN NEW.streak_length >= OLD.streak_length "
+                 "BEGIN " + COPY_LONGEST_STREAK + "(longest_streak_id = NEW.streak_id OR " + beats_longest + "); END")
+    conn.execute("DROP TRIGGER IF EXISTS trg_streaks_longest_shrink")
+    conn.execute("CREATE TRIGGER trg_streaks_longest_shrink AFTER UPDATE OF streak_length ON StreaksData "
+                 "WHEN NEW.streak_length < OLD.streak_length "
+                 "BEGIN " + SET_LONGEST_STREAK + "habit_creator = NEW.habit_creator AND habit_name = NEW.habit_name "
+                 "AND longest_streak_id = NEW.streak_id; END")
+    conn.execute("DROP TRIGGER IF EXISTS trg_streaks_longest_delete")
+    conn.execute("CREATE TRIGGER trg_streaks_longest_delete AFTER DELETE ON StreaksData "
+                 "BEGIN " + SET_LONGEST_STREAK + "habit_creator = OLD.habit_creator AND habit_name = OLD.habit_name "
+                 "AND longest_streak_id = OLD.streak_id; END")
+
+
+def _add_longest_streak_index(conn):
+    """
+        Migration 6: Indexes the streaks of every habit from the longest one, so the longest streak of a habit is
+        the first index entry of the habit, both for the window function query of streaks.longest_streaks()
+        and for the triggers which search the longest streak again.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_streaks_longest "
+                 "ON StreaksData (habit_creator, habit_name, streak_length DESC, streak_id)")
+
+
+def _add_completions(conn):
+    """
+        Migration 7: Adds the append-only Completions log with one row per accepted check-off of a habit, which
+        HabitService.complete_habit() writes in the same transaction as the streak counters.
+
+        The check-off times are stored as epoch seconds whatever the timestamp format is, so the log never has to be
+        rewritten by convert_timestamps(). Triggers refuse to change its rows, and only allow to delete them together
+        with their habit, so a reused habit id never inherits the completions of a deleted habit.
+        The log is seeded from the streak rows of the existing habits: one completion at the start of every streak
+        and one for every further frequency range of its length.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS Completions "
+                 "(completion_id INTEGER PRIMARY KEY, habit_id INTEGER NOT NULL, completed_at INTEGER NOT NULL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_completions_habit ON Completions (habit_id, completed_at)")
+    conn.execute("DROP TRIGGER IF EXISTS trg_completions_no_update")
+    conn.execute("CREATE TRIGGER trg_completions_no_update BEFORE UPDATE ON Completions "
+                 "BEGIN SELECT RAISE(ABORT, 'The completion log is append-only'); END")
+    conn.execute("DROP TRIGGER IF EXISTS trg_completions_no_delete")
+    conn.execute("CREATE TRIGGER trg_completions_no_delete BEFORE DELETE ON Completions "
+                 "WHEN EXISTS (SELECT 1 FROM HabitsData WHERE habit_id = OLD.habit_id) "
+                 "BEGIN SELECT RAISE(ABORT, 'The completion log is append-only'); END")
+    conn.execute("DROP TRIGGER IF EXISTS trg_habits_delete_completions")
+    conn.execute("CREATE TRIGGER trg_habits_delete_completions AFTER DELETE ON HabitsData "
+                 "BEGIN DELETE FROM Completions WHERE habit_id = OLD.habit_id; END")
+    conn.execute(
+        "INSERT INTO Completions (habit_id, completed_at) "
+        "WITH RECURSIVE checkoffs (habit_id, completed_at, remaining, step) AS ("
+        "SELECT h.habit_id, (CASE typeof(s.streak_start_date) WHEN 'integer' THEN s.streak_start_date "
+        "ELSE CAST(strftime('%s', s.streak_start_date) AS INTEGER) END), s.streak_length - 1, "
+        "(CASE h.habit_frequency WHEN 'Daily' THEN 86400 WHEN 'Weekly' THEN 604800 END) FROM StreaksData s "
+        "JOIN HabitsData h ON h.habit_creator = s.habit_creator AND h.habit_name = s.habit_name "
+        "WHERE s.streak_length > 0 AND s.streak_start_date IS NOT NULL AND s.streak_start_date != 'None' "
+        "AND NOT EXISTS (SELECT 1 FROM Completions c WHERE c.habit_id = h.habit_id) "
+        "UNION ALL SELECT habit_id, completed_at + step, remaining - 1, step FROM checkoffs WHERE remaining > 0) "
+        "SELECT habit_id, completed_at FROM checkoffs ORDER BY habit_id, completed_at")
+
+
+def _add_completion_days(conn):
+    """
+        Migration 8: Adds the CompletionDays rollup with the number of completions of every habit on every day,
+        so the completion rates and heat maps of a user read a few rows per habit instead of its whole log.
+
+        The days are counted in epoch days of the wall-clock time, like the epoch seconds of the Completions log.
+        The rollup is filled from the existing log and kept up to date by triggers on Completions, so it changes in
+        the same transaction as the check-offs and the deletion of habits.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS CompletionDays (habit_id INTEGER NOT NULL, day INTEGER NOT NULL, "
+                 "completions INTEGER NOT NULL, PRIMARY KEY (habit_id, day)) WITHOUT ROWID")
+    conn.execute("DELETE FROM CompletionDays")
+    conn.execute("INSERT INTO CompletionDays (habit_id, day, completions) "
+                 "SELECT habit_id, completed_at / 86400, COUNT(*) FROM Completions GROUP BY habit_id, completed_at / 86400")
+    conn.execute("DROP TRIGGER IF EXISTS trg_completions_days_insert")
+    conn.execute("CREATE TRIGGER trg_completions_days_insert AFTER INSERT ON Completions "
+                 "BEGIN INSERT INTO CompletionDays (habit_id, day, completions) "
+                 "VALUES (NEW.habit_id, NEW.completed_at / 86400, 1) "
+                 "ON CONFLICT (habit_id, day) DO UPDATE SET completions = completions + 1; END")
+    conn.execute("DROP TRIGGER IF EXISTS trg_completions_days_delete")
+    conn.execute("CREATE TRIGGER trg_completions_days_delete AFTER DELETE ON Completions "
+                 "BEGIN UPDATE CompletionDays SET completions = completions - 1 "
+                 "WHERE habit_id = OLD.habit_id AND day = OLD.completed_at / 86400; "
+                 "DELETE FROM CompletionDays WHERE habit_id = OLD.habit_id AND day = OLD.completed_at / 86400 "
+                 "AND completions <= 0; END")
+
+
+def _add_leaderboards(conn):
+    """
+        Migration 9: Adds the StreakDistribution rollup with the number of habits of all users per habit type,
+        frequency, streak kind (current or longest) and streak length, and indexes the current and the longest
+        streaks of every habit type and frequency, so the leaderboards, ranks and distributions never scan HabitsData.
+
+        The rollup is filled for the existing habits and kept up to date by triggers on HabitsData, so it changes in
+        the same transaction as a completion, an auto-reset, a change of the habit type or frequency or a deletion.
+        Every streak kind has its own update trigger, so a check-off only changes the counts of the current streak
+        unless it also makes the longest streak grow.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS StreakDistribution (habit_type TEXT NOT NULL, "
+                 "habit_frequency TEXT NOT NULL, streak_kind TEXT NOT NULL, streak_length INTEGER NOT NULL, "
+                 "habits INTEGER NOT NULL, PRIMARY KEY (habit_type, habit_frequency, streak_kind, streak_length)) "
+                 "WITHOUT ROWID")
+    # The streak kinds and their columns, and the statements which add the habit of a trigger row to the counts
+    # of a streak kind, or remove it. A count is only ever changed by adding the delta and is deleted at 0.
+    kinds = (("current", "habit_streak"), ("longest", "longest_streak"))
+    delta_sql = (
+        "INSERT INTO StreakDistribution (habit_type, habit_frequency, streak_kind, streak_length, habits) "
+        "VALUES (COALESCE({row}habit_type, ''), COALESCE({row}habit_frequency, ''), '{kind}', "
+        "COALESCE({row}{column}, 0), {delta}) ON CONFLICT (habit_type, habit_frequency, streak_kind, streak_length) "
+        "DO UPDATE SET habits = habits + {delta}; "
+        "DELETE FROM StreakDistribution WHERE (habit_type, habit_frequency, streak_kind, streak_length) = "
+        "(COALESCE({row}habit_type, ''), COALESCE({row}habit_frequency, ''), '{kind}', COALESCE({row}{column}, 0)) "
+        "AND habits = 0;"
+    )
+
+    conn.execute("DELETE FROM StreakDistribution")
+    for kind, column in kinds:
+        conn.execute("INSERT INTO StreakDistribution (habit_type, habit_frequency, streak_kind, streak_length, habits) "
+                     f"SELECT COALESCE(habit_type, ''), COALESCE(habit_frequency, ''), ?, COALESCE({column}, 0), "
+                     "COUNT(*) FROM HabitsData GROUP BY 1, 2, 4", (kind,))
+    conn.execute("DROP TRIGGER IF EXISTS trg_habits_distribution_insert")
+    conn.execute("CREATE TRIGGER trg_habits_distribution_insert AFTER INSERT ON HabitsData BEGIN " +
+                 " ".join(delta_sql.format(row="NEW.", delta=1, kind=kind, column=column) for kind, column in kinds) +
+                 " END")
+    conn.execute("DROP TRIGGER IF EXISTS trg_habits_distribution_delete")
+    conn.execute("CREATE TRIGGER trg_habits_distribution_delete AFTER DELETE ON HabitsData BEGIN " +
+                 " ".join(delta_sql.format(row="OLD.", delta=-1, kind=kind, column=column) for kind, column in kinds) +
+                 " END")
+    for kind, column in kinds:
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_habits_distribution_{kind}")
+        conn.execute(f"CREATE TRIGGER trg_habits_distribution_{kind} "
+                     f"AFTER UPDATE OF habit_type, habit_frequency, {column} ON HabitsData "
+                     "WHEN OLD.habit_type IS NOT NEW.habit_type OR OLD.habit_frequency IS NOT NEW.habit_frequency "
+                     f"OR COALESCE(OLD.{column}, 0) != COALESCE(NEW.{column}, 0) "
+                     "BEGIN " + delta_sql.format(row="OLD.", delta=-1, kind=kind, column=column) + " " +
+                     delta_sql.format(row="NEW.", delta=1, kind=kind, column=column) + " END")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_habits_leaderboard_{kind} "
+                     f"ON HabitsData (habit_type, habit_frequency, {column} DESC, habit_id)")
+
+
+# The list of all migrations as (version, description, function), in the order they must be applied
+MIGRATIONS = [
+    (1, "Add integer primary keys and lookup indexes", _add_primary_keys_and_indexes),
+    (2, "Add the indexed next_due column for the streak expiry", _add_next_due),
+    (3, "Add the Settings table with the timestamp format", _add_settings),
+    (4, "Add the index for paging through the habits of a user", _add_habit_listing_index),
+    (5, "Add the longest streak columns maintained by triggers", _add_longest_streak),
+    (6, "Add the index for the longest streak of every habit", _add_longest_streak_index),
+    (7, "Add the append-only completion log", _add_completions),
+    (8, "Add the daily completion rollup", _add_completion_days),
+    (9, "Add the streak leaderboards and distribution rollup", _add_leaderboards),
+]
+
+# The schema version of a fully migrated database
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    """
+        Reads the schema version of the database.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+
+        Returns:
+        --------
+            - The schema version as an int. A database which was never migrated has the version 0.
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn=None, target=LATEST_VERSION):
+    """
+        Applies all migrations which are newer than the schema version of the database.
+
+        Every migration runs in its own transaction together with the update of the schema version,
+        so an interrupted migration leaves the database at the previous version.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - target (int): The version to migrate to. Defaults to the latest version.
+
+        Returns:
+        --------
+            - A list of the versions which were applied.
+    """
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return migrate(pooled_conn, target)
+
+    applied = []
+    for version, description, apply_migration in MIGRATIONS:
+        if version > target:
+            break
+        if version <= schema_version(conn):
+            continue
+        with storage.transaction(conn):
+            apply_migration(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        applied.append(version)
+    return applied
+
+
+def convert_timestamps(conn=None, timestamp_format=EPOCH_TIMESTAMPS):
+    """
+        Converts all stored dates and times of the database into the given format in one transaction,
+        and stores the format in the Settings table, so every following write uses it as well.
+
+        Values which are not a date and time (None, or the text 'None' of the test data) are left as they are.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - timestamp_format (str): TEXT_TIMESTAMPS or EPOCH_TIMESTAMPS.
+
+        Returns:
+        --------
+            - The number of converted values.
+    """
+    if timestamp_format not in TIMESTAMP_FORMATS:
+        raise ValueError(f"Unknown timestamp format: {timestamp_format}")
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return convert_timestamps(pooled_conn, timestamp_format)
+
+    migrate(conn)
+    converted = 0
+    with storage.transaction(conn):
+        for table, columns in TIMESTAMP_COLUMNS.items():
+            for column in columns:
+                if timestamp_format == EPOCH_TIMESTAMPS:
+                    converted += conn.execute(
+                        f"UPDATE {table} SET {column} = CAST(strftime('%s', {column}) AS INTEGER) "
+                        f"WHERE typeof({column}) = 'text' AND strftime('%s', {column}) IS NOT NULL").rowcount
+                else:
+                    converted += conn.execute(
+                        f"UPDATE {table} SET {column} = datetime({column}, 'unixepoch') "
+                        f"WHERE typeof({column}) = 'integer'").rowcount
+        storage.set_setting(conn, 'timestamp_format', timestamp_format)
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upgrade the schema of the habit tracker database.")
+    parser.add_argument("database", nargs="?", help="the SQLite database file (default: habit_tracker_db.db of the app)")
+    parser.add_argument("--timestamps", choices=TIMESTAMP_FORMATS,
+                        help="also convert all stored dates and times to text or to epoch seconds")
+    args = parser.parse_args()
+
+    # Upgrade the database file given on the command line, or the database of the app
+    if args.database:
+        storage.configure(database=args.database)
+    with storage.connection() as migrate_conn:
+        try:
+            applied_versions = migrate(migrate_conn)
+        except MigrationError as e:
+            raise SystemExit(f"The migration stopped: {e}")
+        for applied_version, applied_description, _ in MIGRATIONS:
+            if applied_version in applied_versions:
+                print(f"Applied migration {applied_version}: {applied_description}")
+        print(f"The database is at schema version {schema_version(migrate_conn)}.")
+        if args.timestamps:
+            converted_values = convert_timestamps(migrate_conn, args.timestamps)
+            print(f"Converted {converted_values} dates and times to {args.timestamps} timestamps.")
+    storage.close_pool()
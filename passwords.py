@@ -0,0 +1,208 @@
+"""
+This module contains the password hashing of the habit tracker app.
+Passwords are stored salted and hashed with PBKDF2-HMAC-SHA256 or scrypt of hashlib, with a tunable cost which is
+kept in the Settings table of the database. Passwords of older accounts, which are stored as a plain SHA-256 digest,
+are still verified and are hashed again with the current cost on the next login.
+The slow hashing runs in a small thread pool, so it never occupies more than a few threads of the app, and the result
+of every verification is remembered in an LRU cache, so a repeated login with the same password is not hashed again.
+It imports hashlib, hmac, os, threading, storage and ThreadPoolExecutor from concurrent.futures.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import storage
+
+from concurrent.futures import ThreadPoolExecutor
+
+# The hashing schemes and the number of cost parameters of each of them:
+# pbkdf2_sha256$<iterations> and scrypt$<n>$<r>$<p>
+PBKDF2_SHA256 = "pbkdf2_sha256"
+SCRYPT = "scrypt"
+HASHING_PARAMETERS = {PBKDF2_SHA256: 1, SCRYPT: 3}
+
+# The hashing of new passwords if the Settings table does not name another one
+DEFAULT_PASSWORD_HASHING = "pbkdf2_sha256$600000"
+
+# The number of random bytes of the salt of every password
+SALT_BYTES = 16
+
+# The number of threads which hash passwords at the same time
+DEFAULT_HASH_WORKERS = min(4, os.cpu_count() or 1)
+
+# The number of verifications which are remembered
+VERIFICATION_CACHE_SIZE = 1024
+
+# The cache of verifications. Its keys hold the stored hash and a keyed digest of the password,
+# whose random key only lives in this process, so the cache never holds a password or a reusable digest of it.
+_verified = storage.LRUCache(VERIFICATION_CACHE_SIZE)
+_cache_key = os.urandom(32)
+
+# The thread pool of password_executor()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def parse_hashing(hashing):
+    """
+        Splits a hashing into its scheme and cost parameters, e.g. 'scrypt$16384$8$1' into ('scrypt', (16384, 8, 1)).
+
+        Args:
+        -----
+            - hashing (str): The hashing as it is written in the Settings table and in front of every stored hash.
+
+        Returns:
+        --------
+            - A tuple of the scheme and a tuple of the cost parameters.
+
+        Raises:
+        -------
+            - ValueError: If the scheme is unknown or the parameters are no positive integers.
+    """
+    scheme, *parameters = hashing.split("$")
+    if scheme not in HASHING_PARAMETERS or len(parameters) != HASHING_PARAMETERS[scheme]:
+        raise ValueError(f"Unknown password hashing: {hashing}")
+    parameters = tuple(int(parameter) for parameter in parameters)
+    if any(parameter < 1 for parameter in parameters):
+        raise ValueError(f"The cost parameters must be positive: {hashing}")
+    return scheme, parameters
+
+
+def _derive(password, salt, scheme, parameters):
+    """
+        Derives the digest of a salted password with the given scheme and cost parameters.
+    """
+    if scheme == PBKDF2_SHA256:
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, parameters[0])
+    n, r, p = parameters
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p + 1024 * 1024)
+
+
+def hash_password(password, hashing=DEFAULT_PASSWORD_HASHING):
+    """
+        Hashes a password with a new random salt in the form in which it is stored in the User table:
+        the hashing, the salt and the digest joined by '$', e.g. 'pbkdf2_sha256$600000$<salt>$<digest>'.
+
+        Args:
+        -----
+            - password (str): The password to hash.
+            - hashing (str): The scheme and cost parameters, see parse_hashing().
+
+        Returns:
+        --------
+            - The hashed password as a string.
+    """
+    scheme, parameters = parse_hashing(hashing)
+    salt = os.urandom(SALT_BYTES)
+    return f"{hashing}${salt.hex()}${_derive(password, salt, scheme, parameters).hex()}"
+
+
+def is_legacy_hash(stored_password):
+    """
+        Checks whether a stored password is a plain SHA-256 digest of the older versions of the app.
+    """
+    return "$" not in stored_password
+
+
+def _check_password(password, stored_password):
+    """
+        Hashes a password like its stored hash and compares both in constant time.
+    """
+    if is_legacy_hash(stored_password):
+        return hmac.compare_digest(hashlib.sha256(password.encode('utf-8')).hexdigest(), stored_password)
+    try:
+        hashing, salt, digest = stored_password.rsplit("$", 2)
+        scheme, parameters = parse_hashing(hashing)
+        return hmac.compare_digest(_derive(password, bytes.fromhex(salt), scheme, parameters).hex(), digest)
+    except ValueError:
+        return False
+
+
+def verify_password(password, stored_password, use_cache=True):
+    """
+        Checks a password against its stored hash in constant time.
+
+        Args:
+        -----
+            - password (str): The entered password.
+            - stored_password (str): The hash of the User table, salted or a legacy SHA-256 digest.
+            - use_cache (bool): Whether an earlier verification of the same password and hash is taken
+              from the cache instead of hashing the password again.
+
+        Returns:
+        --------
+            - True if the password is correct, False otherwise.
+    """
+    if not stored_password:
+        return False
+    if not use_cache:
+        return _check_password(password, stored_password)
+    cache_key = (stored_password, hmac.new(_cache_key, password.encode('utf-8'), hashlib.sha256).digest())
+    return _verified.get(cache_key, lambda: _check_password(password, stored_password))
+
+
+def needs_rehash(stored_password, hashing):
+    """
+        Checks whether a stored password should be hashed again, since it is a legacy SHA-256 digest
+        or was hashed with another scheme or cost than the current one.
+
+        Args:
+        -----
+            - stored_password (str): The hash of the User table.
+            - hashing (str): The current scheme and cost parameters.
+
+        Returns:
+        --------
+            - True if the password should be hashed again at the next successful login.
+    """
+    return is_legacy_hash(stored_password) or stored_password.rsplit("$", 2)[0] != hashing
+
+
+def current_hashing(conn):
+    """
+        Returns the scheme and cost parameters for new passwords, which are kept in the Settings table.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+    """
+    return storage.get_setting(conn, 'password_hashing', DEFAULT_PASSWORD_HASHING)
+
+
+def password_executor():
+    """
+        Returns the thread pool which hashes and verifies passwords, and creates it on first use.
+
+        hashlib releases the GIL while it hashes, so the other sessions and background threads of the app
+        keep running while a password is hashed.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DEFAULT_HASH_WORKERS, thread_name_prefix="password")
+    return _executor
+
+
+def run_in_pool(function, *args):
+    """
+        Runs a hashing function in the password thread pool and waits for its result.
+
+        Args:
+        -----
+            - function (callable): hash_password or verify_password.
+            - args: The arguments of the function.
+
+        Returns:
+        --------
+            - The result of the function.
+    """
+    return password_executor().submit(function, *args).result()
+
+
+def verification_cache_stats():
+    """
+        Returns the counters (hits, misses, evictions, invalidations and hit rate) of the verification cache.
+    """
+    return _verified.stats()
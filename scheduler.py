@@ -0,0 +1,205 @@
+"""
+This module contains a background scheduler which auto-resets the expired streaks of all users.
+It sweeps the habits whose indexed 'next_due' moment has come in batches on a configurable interval,
+so that dormant accounts are reset as well and the work does not land on the login of a user.
+It can also be run on its own as a standalone sweeper process.
+It imports argparse, sqlite3, threading, time, migrations, storage, streaks, datetime and to_epoch_seconds from Habit module.
+"""
+
+import argparse
+import sqlite3
+import threading
+import time
+import migrations
+import storage
+import streaks
+
+from datetime import datetime
+from Habit import to_epoch_seconds
+
+
+class StreakExpiryScheduler:
+    """
+    Creating a scheduler which sweeps the expired streaks of all users in a background thread.
+
+    Attributes:
+    -----------
+        - interval (float): The number of seconds between two sweeps.
+        - batch_size (int): The maximum number of habits which are reset in one transaction.
+        - sweeps (int): The number of finished sweeps.
+        - batches (int): The number of transactions of all sweeps.
+        - habits_reset (int): The total number of habits whose streaks were reset.
+        - streaks_ended (int): The total number of streak rows which were ended.
+        - errors (int): The number of sweeps which failed with a database error.
+        - last_sweep (dict): The metrics of the last sweep, see run_once().
+    """
+
+    def __init__(self, interval=60.0, batch_size=1000):
+        """
+        Initializes a scheduler which is not running yet.
+
+        Args:
+        -----
+            - interval (float): The number of seconds between two sweeps.
+            - batch_size (int): The maximum number of habits which are reset in one transaction.
+        """
+        if batch_size < 1:
+            raise ValueError("The batch size must be at least 1.")
+        self.interval = interval
+        self.batch_size = batch_size
+        self.sweeps = 0
+        self.batches = 0
+        self.habits_reset = 0
+        self.streaks_ended = 0
+        self.errors = 0
+        self.last_sweep = None
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def run_once(self, now=None):
+        """
+            Sweeps all expired streaks once, in batches of at most batch_size habits per transaction.
+
+            Args:
+            -----
+                - now (datetime): The datetime against which the habits are checked. Defaults to the current datetime.
+
+            Returns:
+            --------
+                - A dictionary with the metrics of this sweep:
+                  the number of batches, reset habits and ended streaks, the duration in seconds,
+                  the throughput in reset habits per second, the lag of the longest overdue habit when the sweep
+                  started, and the largest lag of a habit when it was reset (both in seconds).
+        """
+        now = (now or datetime.now()).replace(microsecond=0)
+        now_seconds = to_epoch_seconds(now)
+        started = time.perf_counter()
+        batches = habits_reset = streaks_ended = 0
+        reset_lag = 0
+
+        with storage.connection() as conn:
+            oldest_due = conn.execute("SELECT MIN(next_due) FROM HabitsData WHERE next_due IS NOT NULL").fetchone()[0]
+            pending_lag = max(0, now_seconds - oldest_due) if oldest_due is not None else 0
+
+            while True:
+                streak_expiry = streaks.expire_streaks(conn, now=now, limit=self.batch_size)
+                batches += 1
+                habits_reset += streak_expiry.habits_reset
+                streaks_ended += streak_expiry.streaks_ended
+                for habit in streak_expiry.expired:
+                    reset_lag = max(reset_lag, now_seconds - habit.next_due)
+                if streak_expiry.habits_reset < self.batch_size:
+                    break
+
+        duration = time.perf_counter() - started
+        sweep = {
+            'started': now.isoformat(sep=' '),
+            'batches': batches,
+            'habits_reset': habits_reset,
+            'streaks_ended': streaks_ended,
+            'duration': duration,
+            'throughput': habits_reset / duration if duration > 0 else 0.0,
+            'pending_lag': pending_lag,
+            'reset_lag': reset_lag,
+        }
+        with self._lock:
+            self.sweeps += 1
+            self.batches += batches
+            self.habits_reset += habits_reset
+            self.streaks_ended += streaks_ended
+            self.last_sweep = sweep
+        return sweep
+
+    def _run(self):
+        """
+            The loop of the background thread: sweeps right away and then once every interval until stop() is called.
+        """
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except sqlite3.Error:
+                with self._lock:
+                    self.errors += 1
+            self._stop_event.wait(self.interval)
+
+    def start(self):
+        """
+            Starts sweeping in a background daemon thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="streak-expiry-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+            Stops the background thread after its current sweep.
+
+            Args:
+            -----
+                - timeout (float): The number of seconds to wait for the thread to finish. Defaults to no limit.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def metrics(self):
+        """
+            Collects the counters of all sweeps so far.
+
+            Returns:
+            --------
+                - A dictionary with the number of sweeps, batches, reset habits, ended streaks, errors
+                  and the metrics of the last sweep.
+        """
+        with self._lock:
+            return {
+                'sweeps': self.sweeps,
+                'batches': self.batches,
+                'habits_reset': self.habits_reset,
+                'streaks_ended': self.streaks_ended,
+                'errors': self.errors,
+                'last_sweep': self.last_sweep,
+            }
+
+
+def main(argv=None):
+    """
+        The entry point of the standalone sweeper process.
+
+        Args:
+        -----
+            - argv (list): The command line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Auto-reset the expired habit streaks of all users.")
+    parser.add_argument("--database", help="the SQLite database file (default: habit_tracker_db.db of the app)")
+    parser.add_argument("--interval", type=float, default=60.0, help="seconds between two sweeps (default: 60)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="habits per transaction (default: 1000)")
+    parser.add_argument("--once", action="store_true", help="sweep only once and exit")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        storage.configure(database=args.database)
+    migrations.migrate()
+    scheduler = StreakExpiryScheduler(args.interval, args.batch_size)
+    try:
+        while True:
+            sweep = scheduler.run_once()
+            print(f"{sweep['started']}: {sweep['habits_reset']} habits reset and {sweep['streaks_ended']} streaks "
+                  f"ended in {sweep['batches']} batches, {sweep['duration']:.3f} s "
+                  f"({sweep['throughput']:.0f} habits/s), lag {sweep['pending_lag']} s")
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        storage.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+This module contains the server mode of the habit tracker app.
+It serves many clients at once over a local TCP port or a Unix socket with a JSON lines protocol: every request is one
+JSON object on one line with a 'command' (register, login, logout, create, complete or report) and its fields, and
+every response is one JSON object on one line with 'ok' and either the 'result' or the 'error'.
+The commands are executed by the CommandRunner of the batch module, like the commands of a script, in a pool of
+worker threads which borrow their connections from the shared pool of the storage module, whose connections use
+the WAL journal mode, so the readers and the writer of the database never block the event loop or each other.
+It can also be run on its own:
+
+    python server.py --port 8765
+    python server.py --socket /tmp/habit_tracker.sock
+
+It imports argparse, asyncio, json, logging, os, sqlite3, ThreadPoolExecutor from concurrent.futures, storage,
+migrations, CommandRunner and check_fields from batch module, authenticate from service module and
+StreakExpiryScheduler from scheduler module.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import storage
+import migrations
+
+from concurrent.futures import ThreadPoolExecutor
+from batch import CommandRunner, check_fields
+from scheduler import StreakExpiryScheduler
+from service import authenticate
+
+# The default address of the server
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# The longest request line which is accepted, in bytes
+MAX_REQUEST_SIZE = 64 * 1024
+
+# The commands which need a logged-in session. They run for the username of the session.
+SESSION_COMMANDS = ("create", "complete", "report")
+
+# The log of the unexpected errors of the commands
+logger = logging.getLogger(__name__)
+
+
+def execute(command, username=None):
+    """
+        Executes one command of a client on a connection of the shared pool. It runs in a worker thread of the server.
+        A login or register borrows the connection only for its statements, so the slow password verification or
+        hashing does not hold a connection of the pool, which the other requests are waiting for.
+
+        Args:
+        -----
+            - command (dict): The command with its name in the 'command' field.
+            - username (str): The username of the logged-in session, which the session commands run for.
+
+        Returns:
+        --------
+            - The result as a JSON compatible dictionary, or a list of them for reports.
+
+        Raises:
+        -------
+            - ValueError: If the command is unknown, a field has the wrong type or the command cannot be executed.
+            - KeyError: If a required field is missing.
+    """
+    check_fields(command)
+    if command.get("command") == "login":
+        user = authenticate(command["username"], command["password"])
+        if user is None:
+            raise ValueError("Username or password is incorrect.")
+        return user._asdict()
+    if command.get("command") == "register":
+        return CommandRunner(None).run(command)
+    if command.get("command") in SESSION_COMMANDS:
+        if username is None:
+            raise ValueError("Please login first.")
+        command = dict(command, username=username)
+    with storage.connection() as conn:
+        return CommandRunner(conn).run(command)
+
+
+class HabitServer:
+    """
+    Creating an asyncio server which executes the commands of many clients at the same time.
+
+    Attributes:
+    -----------
+        - host (str): The host name of the TCP server. It is not used for a Unix socket.
+        - port (int): The TCP port. The port 0 picks a free port, which is set once the server is started.
+        - path (str): The file path of the Unix socket. Defaults to a TCP server.
+        - workers (int): The number of worker threads, which is the size of the connection pool by default.
+        - sessions (int): The number of clients which are connected at the moment.
+        - requests (int): The number of requests which were answered.
+        - errors (int): The number of requests which failed.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None, workers=None):
+        """
+        Initializes a server which is not started yet.
+
+        Args:
+        -----
+            - host (str): The host name of the TCP server.
+            - port (int): The TCP port, or 0 for a free port.
+            - path (str): The file path of the Unix socket. Defaults to a TCP server.
+            - workers (int): The number of worker threads. Defaults to the size of the connection pool.
+        """
+        self.host = host
+        self.port = port
+        self.path = path
+        self.workers = workers or storage.get_pool().size
+        self.sessions = 0
+        self.requests = 0
+        self.errors = 0
+
+        self._executor = None
+        self._server = None
+
+    async def handle_command(self, command, session):
+        """
+            Executes one request of a client in a worker thread and builds its response.
+            The login and logout commands change the username of the session. A failing command, including a
+            database error or a timeout of the connection pool, is answered with its error. An unexpected error
+            is logged as well, and the session goes on.
+
+            Args:
+            -----
+                - command (dict): The request.
+                - session (dict): The state of the client connection, with the 'username' of a logged-in session.
+
+            Returns:
+            --------
+                - The response as a dictionary.
+        """
+        response = {"id": command["id"]} if "id" in command else {}
+        if command.get("command") == "logout":
+            session["username"] = None
+            return dict(response, ok=True, result=None)
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, execute, command,
+                                                                      session["username"])
+        except (ValueError, KeyError, TypeError) as e:
+            self.errors += 1
+            return dict(response, ok=False, error=str(e) if not isinstance(e, KeyError) else f"Missing field: {e}")
+        except (sqlite3.Error, TimeoutError) as e:
+            # A locked database or a busy connection pool fails only this request, and the session goes on
+            self.errors += 1
+            return dict(response, ok=False, error=f"The database could not execute the command: {e}")
+        except Exception as e:
+            logger.exception("The command %r failed.", command.get("command"))
+            self.errors += 1
+            return dict(response, ok=False, error=f"The command failed: {e}")
+        if command.get("command") == "login":
+            session["username"] = result["username"]
+        return dict(response, ok=True, result=result)
+
+    async def handle_client(self, reader, writer):
+        """
+            Answers the requests of one client, one at a time and in their order, until the client disconnects.
+
+            Args:
+            -----
+                - reader (asyncio.StreamReader): The stream of requests.
+                - writer (asyncio.StreamWriter): The stream of responses.
+        """
+        self.sessions += 1
+        session = {"username": None}
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    writer.write(json.dumps({"ok": False, "error": "The request is too long."}).encode() + b"\n")
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    command = json.loads(line)
+                except json.JSONDecodeError as e:
+                    command = {"invalid": f"Invalid JSON: {e}"}
+                if not isinstance(command, dict):
+                    command = {"invalid": "A command must be a JSON object."}
+                response = await self.handle_command(command, session)
+                self.requests += 1
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def start(self):
+        """
+            Starts to accept clients.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="server")
+        if self.path:
+            self._server = await asyncio.start_unix_server(self.handle_client, self.path, limit=MAX_REQUEST_SIZE)
+        else:
+            self._server = await asyncio.start_server(self.handle_client, self.host, self.port,
+                                                      limit=MAX_REQUEST_SIZE)
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """
+            Stops to accept clients, waits for the running commands and removes the Unix socket.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def serve_forever(self):
+        """
+            Starts the server and accepts clients until the task is cancelled.
+        """
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, path=None, workers=None):
+    """
+        Runs the server with the background streak expiry scheduler until it is interrupted with Ctrl+C.
+
+        Args:
+        -----
+            - host (str): The host name of the TCP server.
+            - port (int): The TCP port.
+            - path (str): The file path of the Unix socket. Defaults to a TCP server.
+            - workers (int): The number of worker threads. Defaults to the size of the connection pool.
+    """
+    migrations.migrate()
+    with storage.connection() as conn:
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    server = HabitServer(host, port, path, workers)
+    scheduler = StreakExpiryScheduler()
+    scheduler.start()
+    print(f"Serving on {path or f'{host}:{port}'} with {server.workers} workers ({journal_mode} journal mode)")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+        storage.close_pool()
+
+
+def main(argv=None):
+    """
+        The entry point of the standalone server.
+
+        Args:
+        -----
+            - argv (list): The command line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Serve the habit tracker to many clients with a JSON lines protocol.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"the host of the TCP server (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"the TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument("--socket", help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, help="the number of worker threads (default: the connection pool size)")
+    parser.add_argument("--database", help="the SQLite database file (default: habit_tracker_db.db of the app)")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        storage.configure(database=args.database)
+    serve(args.host, args.port, args.socket, args.workers)
+
+
+if __name__ == "__main__":
+    main()
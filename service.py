@@ -0,0 +1,673 @@
+"""
+This module contains the non-interactive service layer of the habit tracker app.
+The HabitService takes plain arguments and returns data objects instead of prompting and printing,
+so the habits of a user can be managed from batch jobs, load tests and other programs as well as from the menu,
+whose UserProfile methods are thin wrappers around it.
+It imports re, storage, streaks, namedtuple, contextmanager, datetime, the habit constants and
+timestamp adapters from Habit module and the password hashing of passwords module.
+"""
+
+import re
+import storage
+import streaks
+
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from Habit import (FREQUENCY_DAYS, HABIT_TYPES, TEXT_TIMESTAMPS, from_db_timestamp, seconds_sql, to_db_timestamp,
+                   to_epoch_seconds)
+from passwords import current_hashing, hash_password, needs_rehash, run_in_pool, verify_password
+
+# The possible results of marking a habit completed
+COMPLETED = "completed"
+TOO_EARLY = "too early"
+RESTARTED = "restarted"
+
+# The result of marking a habit completed with HabitService.complete_habit()
+Completion = namedtuple('Completion', ['habit_id', 'habit_name', 'habit_frequency', 'status', 'habit_streak'])
+
+# A habit of the HabitsData table, with its dates and times as datetime objects
+HabitRecord = namedtuple('HabitRecord', ['habit_id', 'habit_name', 'habit_creator', 'habit_type', 'habit_frequency',
+                                         'created_datetime', 'last_completion_date', 'habit_streak'])
+
+# The name, frequency and type of a habit, which the habit selections of the menu list
+HabitSummary = namedtuple('HabitSummary', ['habit_id', 'habit_name', 'habit_frequency', 'habit_type'])
+
+# The longest streak of a habit in the StreaksData table, with its dates and times as datetime objects
+StreakRecord = namedtuple('StreakRecord', ['habit_name', 'habit_creator', 'habit_type', 'habit_frequency',
+                                           'streak_start_date', 'streak_end_date', 'streak_length'])
+
+# A user account of the User table, without its password
+UserRecord = namedtuple('UserRecord', ['user_id', 'forename', 'surname', 'username'])
+
+# The columns of HabitsData in the order of the HabitRecord fields
+HABIT_COLUMNS = ("habit_id, habit_name, habit_creator, habit_type, habit_frequency, created_datetime, "
+                 "last_completion_date, habit_streak")
+
+# The columns of HabitsData in the order of the StreakRecord fields, which give the longest streak of a habit
+LONGEST_STREAK_COLUMNS = ("habit_name, habit_creator, habit_type, habit_frequency, longest_streak_start_date, "
+                          "longest_streak_end_date, longest_streak")
+
+
+class HabitNotFoundError(ValueError):
+    """
+    Raised when the user has no habit with the given id.
+    """
+
+
+class HabitExistsError(ValueError):
+    """
+    Raised when the user already has a habit with the given name.
+    """
+
+
+class UserExistsError(ValueError):
+    """
+    Raised when another user account already has the given username.
+    """
+
+
+def password_is_valid(password):
+    """
+        Checks whether a password fulfills the minimum criteria: at least 8 characters long, upper and lower case
+        letters, a minimum of one number and one special character.
+
+        Args:
+        -----
+            - password (str): The password to check.
+
+        Returns:
+        --------
+            - True if the password is valid, otherwise the message which explains the missing criterion.
+    """
+    if len(password) < 8:
+        return "Your password must be at least 8 characters long."
+    if not re.search(r'[A-Z]', password):
+        return "Your password must contain at least one uppercase letter."
+    if not re.search(r'[a-z]', password):
+        return "Your password must contain at least one lowercase letter."
+    if not re.search(r'\d', password):
+        return "Your password must contain at least one number."
+    if not re.search(r'[^A-Za-z0-9]', password):
+        return "Your password must contain at least one special character."
+    return True
+
+
+@contextmanager
+def _borrow(conn):
+    """
+        Yields the given connection, or borrows one from the shared pool for the length of a with block only,
+        so the slow password hashing between two blocks does not hold a connection of the pool.
+    """
+    if conn is not None:
+        yield conn
+    else:
+        with storage.connection() as pooled_conn:
+            yield pooled_conn
+
+
+def register_user(forename, surname, username, password, conn=None, hashed_password=None):
+    """
+        Creates a user account without any prompts.
+
+        Args:
+        -----
+            - forename (str): The user's forename.
+            - surname (str): The user's surname.
+            - username (str): The username. It must be unique.
+            - password (str): The password. It must fulfill the criteria of password_is_valid().
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - hashed_password (str): The password hashed with hash_password() beforehand, e.g. by a caller which
+              registers users inside its own transaction and must not hash while it holds the write lock.
+              Defaults to hashing the password here.
+
+        Returns:
+        --------
+            - The new UserRecord tuple.
+
+        Raises:
+        -------
+            - ValueError: If the password does not fulfill the criteria.
+            - UserExistsError: If the username already exists.
+    """
+    password_check = password_is_valid(password)
+    if password_check is not True:
+        raise ValueError(password_check)
+    # The slow hashing runs before the transaction of this function, so it does not hold the write lock of the
+    # database, nor a connection of the pool if none was given. A caller which already holds a transaction
+    # passes the hashed password instead.
+    with _borrow(conn) as borrowed_conn:
+        if borrowed_conn.execute("SELECT 1 FROM User WHERE username = ?", (username,)).fetchone():
+            raise UserExistsError(f"The username {username} already exists.")
+        hashing = current_hashing(borrowed_conn)
+    if hashed_password is None:
+        hashed_password = run_in_pool(hash_password, password, hashing)
+    with _borrow(conn) as borrowed_conn, storage.transaction(borrowed_conn) as conn:
+        if conn.execute("SELECT 1 FROM User WHERE username = ?", (username,)).fetchone():
+            raise UserExistsError(f"The username {username} already exists.")
+        user_id = conn.execute("INSERT INTO User (forename, surname, username, password) VALUES (?, ?, ?, ?)",
+                               (forename, surname, username, hashed_password)).lastrowid
+    return UserRecord(user_id, forename, surname, username)
+
+
+def authenticate(username, password, conn=None):
+    """
+        Checks the credentials of a user. The password is verified in the password thread pool, and a password which
+        is stored as a legacy SHA-256 digest or with an outdated cost is hashed again with the current one.
+        Without a given connection, a connection of the shared pool is only borrowed for the statements,
+        not while the password is verified or hashed.
+
+        Args:
+        -----
+            - username (str): The username.
+            - password (str): The entered password.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Returns:
+        --------
+            - The UserRecord tuple of the user if the credentials are correct, otherwise None.
+    """
+    with _borrow(conn) as borrowed_conn:
+        row = borrowed_conn.execute("SELECT user_id, forename, surname, username, password FROM User "
+                                    "WHERE username = ?", (username,)).fetchone()
+        hashing = current_hashing(borrowed_conn)
+    if row is None or not run_in_pool(verify_password, password, row[4]):
+        return None
+
+    if needs_rehash(row[4], hashing):
+        hashed_password = run_in_pool(hash_password, password, hashing)
+        # The stored hash is only replaced if the password was not changed in the meantime
+        with _borrow(conn) as borrowed_conn, storage.transaction(borrowed_conn) as conn:
+            conn.execute("UPDATE User SET password = ? WHERE user_id = ? AND password = ?",
+                         (hashed_password, row[0], row[4]))
+    return UserRecord(*row[:4])
+
+
+def set_password(username, password, conn=None):
+    """
+        Changes the password of a user, which is hashed with the current scheme and cost.
+
+        Args:
+        -----
+            - username (str): The username.
+            - password (str): The new password. It must fulfill the criteria of password_is_valid().
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Raises:
+        -------
+            - ValueError: If the password does not fulfill the criteria.
+    """
+    password_check = password_is_valid(password)
+    if password_check is not True:
+        raise ValueError(password_check)
+    with _borrow(conn) as borrowed_conn:
+        hashing = current_hashing(borrowed_conn)
+    hashed_password = run_in_pool(hash_password, password, hashing)
+    with _borrow(conn) as borrowed_conn, storage.transaction(borrowed_conn) as conn:
+        conn.execute("UPDATE User SET password = ? WHERE username = ?", (hashed_password, username))
+
+
+def invalidate_habits(username=None, conn=None):
+    """
+        Forgets the cached habit list of a user, see HabitService.habit_summaries(). It must be called after the
+        habits of the user are created, changed, deleted or renamed without the HabitService.
+
+        Args:
+        -----
+            - username (str): The username whose habit list is forgotten. Defaults to the habit lists of all users.
+            - conn (sqlite3.Connection): The connection which changed the habits, see storage.invalidate().
+    """
+    storage.invalidate(None if username is None else ('habits', username), conn)
+
+
+def habit_choices(habit_summaries):
+    """
+        Gives every habit of a habit selection its choice title, which shows its name, frequency and type.
+
+        Args:
+        -----
+            - habit_summaries (iterable): HabitSummary tuples, see HabitService.habit_summaries().
+
+        Returns:
+        --------
+            - A dictionary of the choice titles and their HabitSummary tuples, in the order of the habits.
+    """
+    return {f"{habit.habit_name} ~~~ {habit.habit_frequency} ~~~ {habit.habit_type}": habit
+            for habit in habit_summaries}
+
+
+def _habit_record(row):
+    """
+        Converts a row of HABIT_COLUMNS into a HabitRecord.
+
+        Args:
+        -----
+            - row (tuple): The row of HabitsData.
+
+        Returns:
+        --------
+            - A HabitRecord tuple.
+    """
+    return HabitRecord(row[0], row[1], row[2], row[3], row[4], from_db_timestamp(row[5]),
+                       from_db_timestamp(row[6]), row[7])
+
+
+def _streak_record(row):
+    """
+        Converts a row of LONGEST_STREAK_COLUMNS into a StreakRecord.
+
+        Args:
+        -----
+            - row (tuple): The row of HabitsData.
+
+        Returns:
+        --------
+            - A StreakRecord tuple.
+    """
+    return StreakRecord(row[0], row[1], row[2], row[3], from_db_timestamp(row[4]), from_db_timestamp(row[5]), row[6])
+
+
+class HabitService:
+    """
+    Creating a service which manages the habits of one user without any prompts.
+
+    Attributes:
+    -----------
+        - username (str): The username of the habit creator.
+        - conn (sqlite3.Connection): The connection to use, or None to borrow one from the shared pool for every call.
+    """
+
+    def __init__(self, username, conn=None):
+        """
+        Initializes a HabitService object for the given user.
+
+        Args:
+        -----
+            - username (str): The username of the habit creator.
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+        """
+        self.username = username
+        self.conn = conn
+
+    @contextmanager
+    def _connection(self):
+        """
+            Yields the connection of the service, or borrows one from the shared pool for the length of a with block.
+        """
+        if self.conn is not None:
+            yield self.conn
+        else:
+            with storage.connection() as conn:
+                yield conn
+
+    def _get_habit(self, conn, habit_id):
+        """
+            Reads a habit of the user.
+
+            Args:
+            -----
+                - conn (sqlite3.Connection): The database connection.
+                - habit_id (int): The id of the habit in the HabitsData table.
+
+            Returns:
+            --------
+                - A HabitRecord tuple.
+
+            Raises:
+            -------
+                - HabitNotFoundError: If the user has no habit with the given id.
+        """
+        row = conn.execute(f"SELECT {HABIT_COLUMNS} FROM HabitsData WHERE habit_id = ? AND habit_creator = ?",
+                           (habit_id, self.username)).fetchone()
+        if row is None:
+            raise HabitNotFoundError(f"There is no habit with the id {habit_id}.")
+        return _habit_record(row)
+
+    def get_habit(self, habit_id):
+        """
+            Returns a habit of the user.
+
+            Args:
+            -----
+                - habit_id (int): The id of the habit in the HabitsData table.
+
+            Returns:
+            --------
+                - A HabitRecord tuple.
+
+            Raises:
+            -------
+                - HabitNotFoundError: If the user has no habit with the given id.
+        """
+        with self._connection() as conn:
+            return self._get_habit(conn, habit_id)
+
+    def find_habit(self, habit_name):
+        """
+            Looks up a habit of the user by its name.
+
+            Args:
+            -----
+                - habit_name (str): The name of the habit.
+
+            Returns:
+            --------
+                - A HabitRecord tuple, or None if the user has no habit with this name.
+        """
+        with self._connection() as conn:
+            row = conn.execute(f"SELECT {HABIT_COLUMNS} FROM HabitsData WHERE habit_creator = ? AND habit_name = ?",
+                               (self.username, habit_name)).fetchone()
+        return _habit_record(row) if row is not None else None
+
+    def list_habits(self, habit_frequency=None):
+        """
+            Lists the habits of the user in the order they were created.
+
+            Args:
+            -----
+                - habit_frequency (str): Only list the habits with this frequency (Daily or Weekly). Defaults to both.
+
+            Returns:
+            --------
+                - A list of HabitRecord tuples.
+        """
+        with self._connection() as conn:
+            if habit_frequency is None:
+                rows = conn.execute(f"SELECT {HABIT_COLUMNS} FROM HabitsData WHERE habit_creator = ? "
+                                    "ORDER BY habit_id", (self.username,)).fetchall()
+            else:
+                rows = conn.execute(f"SELECT {HABIT_COLUMNS} FROM HabitsData WHERE habit_creator = ? "
+                                    "AND habit_frequency = ? ORDER BY habit_id",
+                                    (self.username, habit_frequency)).fetchall()
+        return [_habit_record(row) for row in rows]
+
+    def habit_summaries(self):
+        """
+            Lists the id, name, frequency and type of every habit of the user in the order they were created.
+
+            The list is read through the cache of the shared pool, so the habit selections of the menu only
+            query the HabitsData table again after the habits of the user were changed.
+
+            Returns:
+            --------
+                - A tuple of HabitSummary tuples.
+        """
+        with self._connection() as conn:
+            return storage.cached(conn, ('habits', self.username), lambda: tuple(
+                HabitSummary(*row) for row in conn.execute(
+                    "SELECT habit_id, habit_name, habit_frequency, habit_type FROM HabitsData WHERE habit_creator = ? "
+                    "ORDER BY habit_id", (self.username,))))
+
+    def create_habit(self, habit_name, habit_type, habit_frequency, created=None):
+        """
+            Creates a new habit for the user with a habit streak of 0 and no last completion date.
+
+            Args:
+            -----
+                - habit_name (str): The name of the habit. It must be unique in the user account.
+                - habit_type (str): One of the HABIT_TYPES.
+                - habit_frequency (str): Daily or Weekly.
+                - created (datetime): The creation datetime. Defaults to the current datetime.
+
+            Returns:
+            --------
+                - The new HabitRecord tuple.
+
+            Raises:
+            -------
+                - ValueError: If the habit type or frequency is unknown.
+                - HabitExistsError: If the user already has a habit with the same name.
+        """
+        habit_name = habit_name.strip()
+        if habit_type not in HABIT_TYPES:
+            raise ValueError(f"Unknown habit type: {habit_type}")
+        if habit_frequency not in FREQUENCY_DAYS:
+            raise ValueError(f"Unknown habit frequency: {habit_frequency}")
+        created = (created or datetime.now()).replace(microsecond=0)
+
+        with storage.transaction(self.conn) as conn:
+            # Habit names are unique in each user account
+            if conn.execute("SELECT 1 FROM HabitsData WHERE habit_creator = ? AND habit_name = ?",
+                            (self.username, habit_name)).fetchone():
+                raise HabitExistsError(f"The habit {habit_name} already exists.")
+            habit_id = conn.execute(
+                "INSERT INTO HabitsData (habit_name, habit_creator, habit_type, habit_frequency, created_datetime, "
+                "last_completion_date, habit_streak) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (habit_name, self.username, habit_type, habit_frequency,
+                 to_db_timestamp(created, self.timestamp_format(conn)), None, 0)).lastrowid
+        invalidate_habits(self.username, self.conn)
+        return HabitRecord(habit_id, habit_name, self.username, habit_type, habit_frequency, created, None, 0)
+
+    def complete_habit(self, habit_id, at=None):
+        """
+            Marks a habit of the user as completed.
+
+            The habit is read, its streak is updated in HabitsData, its streak row in StreaksData is updated or
+            started and the check-off is appended to the Completions log inside one BEGIN IMMEDIATE transaction
+            with one commit, so the tables always agree.
+
+            - If the habit was not completed before, its habit streak becomes 1 and a new streak row is started.
+            - If the habit is checked-off within its frequency range (on the next day after the last completion date
+              for Daily habits, on the 8th day for Weekly habits), the habit streak and the streak length grow by 1.
+            - If the check-off is too early, nothing is changed since only 1 streak is counted in each period.
+            - If the check-off is too late and the streak was not auto-reset yet, the old streak is ended
+              and a new streak is started.
+
+            Args:
+            -----
+                - habit_id (int): The id of the habit in the HabitsData table.
+                - at (datetime): The datetime of the check-off. Defaults to the current datetime.
+
+            Returns:
+            --------
+                - A Completion tuple with the habit id, name, frequency, the status of the check-off
+                  (COMPLETED, TOO_EARLY or RESTARTED) and the habit streak after the check-off.
+
+            Raises:
+            -------
+                - HabitNotFoundError: If the user has no habit with the given id.
+        """
+        at = (at or datetime.now()).replace(microsecond=0)
+
+        with storage.transaction(self.conn) as conn:
+            stored_at = to_db_timestamp(at, self.timestamp_format(conn))
+
+            # The last completion date is read as epoch seconds, so no date text has to be parsed
+            habit = conn.execute(
+                "SELECT habit_name, habit_type, habit_frequency, " + seconds_sql("last_completion_date") +
+                ", habit_streak FROM HabitsData WHERE habit_id = ? AND habit_creator = ?",
+                (habit_id, self.username)).fetchone()
+            if habit is None:
+                raise HabitNotFoundError(f"There is no habit with the id {habit_id}.")
+            habit_name, habit_type, habit_frequency, last_completion_seconds, habit_streak = habit
+
+            # Find out how many days passed since the last completion date, if the habit was completed before
+            days_passed = None
+            if habit_streak and last_completion_seconds is not None:
+                days_passed = (to_epoch_seconds(at) - last_completion_seconds) // 86400
+
+            if days_passed is not None and days_passed < FREQUENCY_DAYS[habit_frequency]:
+                # Only 1 streak is counted in each 1-day period for Daily habits and 7-day period for Weekly habits
+                return Completion(habit_id, habit_name, habit_frequency, TOO_EARLY, habit_streak)
+
+            # The accepted check-off is appended to the completion log together with the counter updates
+            conn.execute("INSERT INTO Completions (habit_id, completed_at) VALUES (?, ?)",
+                         (habit_id, to_epoch_seconds(at)))
+
+            if days_passed == FREQUENCY_DAYS[habit_frequency]:
+                # The habit is checked-off within its frequency range, so the current streak goes on
+                status = COMPLETED
+                habit_streak += 1
+                conn.execute("UPDATE HabitsData SET last_completion_date = ?, habit_streak = ? WHERE habit_id = ?",
+                             (stored_at, habit_streak, habit_id))
+                conn.execute(
+                    "UPDATE StreaksData SET streak_end_date = NULL, streak_length = streak_length + 1 "
+                    "WHERE habit_creator = ? AND habit_name = ? AND habit_type = ? AND habit_frequency = ? AND "
+                    + streaks.OPEN_STREAK, (self.username, habit_name, habit_type, habit_frequency))
+            else:
+                if days_passed is not None:
+                    # The habit missed its frequency range and was not auto-reset yet, so its streak ends now
+                    status = RESTARTED
+                    conn.execute(
+                        "UPDATE StreaksData SET streak_end_date = ?, streak_length = ? "
+                        "WHERE habit_creator = ? AND habit_name = ? AND habit_type = ? AND habit_frequency = ? AND "
+                        + streaks.OPEN_STREAK, (stored_at, habit_streak, self.username, habit_name, habit_type,
+                                                habit_frequency))
+                else:
+                    status = COMPLETED
+
+                # A new streak is started with this check-off
+                habit_streak = 1
+                conn.execute("UPDATE HabitsData SET last_completion_date = ?, habit_streak = ? WHERE habit_id = ?",
+                             (stored_at, habit_streak, habit_id))
+                conn.execute(
+                    "INSERT INTO StreaksData (habit_name, habit_creator, habit_type, habit_frequency, "
+                    "streak_start_date, streak_end_date, streak_length) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (habit_name, self.username, habit_type, habit_frequency, stored_at, None, 1))
+
+        return Completion(habit_id, habit_name, habit_frequency, status, habit_streak)
+
+    def change_habit_type(self, habit_id, habit_type):
+        """
+            Changes the type of a habit of the user in the HabitsData table and in its rows of the StreaksData table.
+
+            Args:
+            -----
+                - habit_id (int): The id of the habit in the HabitsData table.
+                - habit_type (str): One of the HABIT_TYPES.
+
+            Returns:
+            --------
+                - The changed HabitRecord tuple.
+
+            Raises:
+            -------
+                - ValueError: If the habit type is unknown.
+                - HabitNotFoundError: If the user has no habit with the given id.
+        """
+        if habit_type not in HABIT_TYPES:
+            raise ValueError(f"Unknown habit type: {habit_type}")
+        with storage.transaction(self.conn) as conn:
+            habit = self._get_habit(conn, habit_id)
+            conn.execute("UPDATE HabitsData SET habit_type = ? WHERE habit_id = ?", (habit_type, habit_id))
+            conn.execute("UPDATE StreaksData SET habit_type = ? WHERE habit_name = ? AND habit_creator = ?",
+                         (habit_type, habit.habit_name, self.username))
+        invalidate_habits(self.username, self.conn)
+        return habit._replace(habit_type=habit_type)
+
+    def change_habit_frequency(self, habit_id, habit_frequency):
+        """
+            Changes the frequency of a habit of the user in the HabitsData table and in its rows of the StreaksData table.
+
+            Args:
+            -----
+                - habit_id (int): The id of the habit in the HabitsData table.
+                - habit_frequency (str): Daily or Weekly.
+
+            Returns:
+            --------
+                - The changed HabitRecord tuple.
+
+            Raises:
+            -------
+                - ValueError: If the habit frequency is unknown.
+                - HabitNotFoundError: If the user has no habit with the given id.
+        """
+        if habit_frequency not in FREQUENCY_DAYS:
+            raise ValueError(f"Unknown habit frequency: {habit_frequency}")
+        with storage.transaction(self.conn) as conn:
+            habit = self._get_habit(conn, habit_id)
+            conn.execute("UPDATE HabitsData SET habit_frequency = ? WHERE habit_id = ?", (habit_frequency, habit_id))
+            conn.execute("UPDATE StreaksData SET habit_frequency = ? WHERE habit_name = ? AND habit_creator = ?",
+                         (habit_frequency, habit.habit_name, self.username))
+        invalidate_habits(self.username, self.conn)
+        return habit._replace(habit_frequency=habit_frequency)
+
+    def delete_habit(self, habit_id):
+        """
+            Deletes a habit of the user together with its rows of the StreaksData table.
+
+            Args:
+            -----
+                - habit_id (int): The id of the habit in the HabitsData table.
+
+            Returns:
+            --------
+                - The deleted HabitRecord tuple.
+
+            Raises:
+            -------
+                - HabitNotFoundError: If the user has no habit with the given id.
+        """
+        with storage.transaction(self.conn) as conn:
+            habit = self._get_habit(conn, habit_id)
+            conn.execute("DELETE FROM HabitsData WHERE habit_id = ?", (habit_id,))
+            conn.execute(
+                "DELETE FROM StreaksData WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
+                "AND habit_frequency = ?", (habit.habit_name, self.username, habit.habit_type, habit.habit_frequency))
+        invalidate_habits(self.username, self.conn)
+        return habit
+
+    def longest_streaks(self):
+        """
+            Lists the longest streak of every habit of the user which was completed at least once, sorted by habit name.
+
+            Returns:
+            --------
+                - A list of StreakRecord tuples.
+        """
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT {LONGEST_STREAK_COLUMNS} FROM HabitsData WHERE habit_creator = ? "
+                "AND longest_streak_id IS NOT NULL ORDER BY habit_name, habit_type, habit_frequency",
+                (self.username,)).fetchall()
+        return [_streak_record(row) for row in rows]
+
+    def longest_streak(self, habit_id):
+        """
+            Returns the longest streak of a habit of the user.
+
+            Args:
+            -----
+                - habit_id (int): The id of the habit in the HabitsData table.
+
+            Returns:
+            --------
+                - A StreakRecord tuple, or None if the habit was never completed.
+
+            Raises:
+            -------
+                - HabitNotFoundError: If the user has no habit with the given id.
+        """
+        with self._connection() as conn:
+            row = conn.execute(f"SELECT {LONGEST_STREAK_COLUMNS}, longest_streak_id FROM HabitsData "
+                               "WHERE habit_id = ? AND habit_creator = ?", (habit_id, self.username)).fetchone()
+        if row is None:
+            raise HabitNotFoundError(f"There is no habit with the id {habit_id}.")
+        return _streak_record(row) if row[-1] is not None else None
+
+    def expire_streaks(self, habit_frequency=None, now=None):
+        """
+            Auto-Resets the streaks of all habits of the user which were not checked-off within their frequency range.
+
+            Args:
+            -----
+                - habit_frequency (str): Only reset the habits with this frequency (Daily or Weekly). Defaults to both.
+                - now (datetime): The datetime against which the habits are checked. Defaults to the current datetime.
+
+            Returns:
+            --------
+                - A StreakExpiry tuple, see streaks.expire_streaks().
+        """
+        with self._connection() as conn:
+            return streaks.expire_streaks(conn, self.username, habit_frequency, now)
+
+    def timestamp_format(self, conn):
+        """
+            Returns the format in which the dates and times are written to the database ('text' or 'epoch').
+
+            Args:
+            -----
+                - conn (sqlite3.Connection): The database connection.
+        """
+        return storage.get_setting(conn, 'timestamp_format', TEXT_TIMESTAMPS)
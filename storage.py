@@ -0,0 +1,565 @@
+"""
+This module provides the shared storage layer of the habit tracker app.
+It keeps a bounded, thread-safe pool of SQLite connections which Habit, UserProfile, analytics and main all draw from,
+so that no function has to open its own connection to the 'habit_tracker_db.db' database,
+and an LRU cache of data which is read often and changed rarely, e.g. the habit lists of the users.
+It imports os, queue, sqlite3, threading, time, OrderedDict from collections and contextmanager from contextlib.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Build the file path for the database file
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'habit_tracker_db.db')
+
+# The default number of connections which the pool keeps open at the same time
+DEFAULT_POOL_SIZE = 5
+
+# The default number of values which the cache of the pool keeps, see cached()
+DEFAULT_CACHE_SIZE = 128
+
+# The PRAGMA statements which are applied once to every new connection of the pool
+DEFAULT_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class LRUCache:
+    """
+    Creating a thread-safe cache which keeps a bounded number of values and forgets the least recently used one first.
+
+    A value which is invalidated while it is being loaded is not stored, so a load which raced with a change
+    never brings an outdated value back into the cache.
+
+    Attributes:
+    -----------
+        - size (int): The maximum number of values which are kept.
+        - hits (int): The number of requests served from the cache.
+        - misses (int): The number of requests which had to load the value.
+        - evictions (int): The number of values which were forgotten to make room for another one.
+        - invalidations (int): The number of values which were forgotten because they were changed.
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        """
+        Initializes an empty cache.
+
+        Args:
+        -----
+            - size (int): The maximum number of values which are kept.
+        """
+        if size < 1:
+            raise ValueError("The cache size must be at least 1.")
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._values = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """
+            Returns the value of a key, which is loaded and kept if it is not in the cache.
+
+            Args:
+            -----
+                - key (hashable): The key of the value.
+                - load (callable): Loads the value without arguments.
+
+            Returns:
+            --------
+                - The value of the key.
+        """
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                self.hits += 1
+                return self._values[key]
+            self.misses += 1
+            generation = self._generation
+
+        value = load()
+        with self._lock:
+            if generation == self._generation:
+                self._values[key] = value
+                self._values.move_to_end(key)
+                while len(self._values) > self.size:
+                    self._values.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, key=None):
+        """
+            Forgets the value of a key, or all values if no key is given.
+
+            Args:
+            -----
+                - key (hashable): The key of the value. Defaults to all keys.
+        """
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self.invalidations += len(self._values)
+                self._values.clear()
+            elif self._values.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        """
+            Collects the counters of the cache.
+
+            Returns:
+            --------
+                - A dictionary with the cache size, the number of kept values, hits, misses, evictions,
+                  invalidations and the hit rate.
+        """
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': self.size,
+                'values': len(self._values),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / requests if requests else 0.0,
+            }
+
+
+class ConnectionPool:
+    """
+    Creating a bounded, thread-safe pool of SQLite connections.
+
+    A thread which already holds a connection gets the very same connection back when it asks again,
+    so nested calls (e.g. a UserProfile method calling an analytics function) share one connection.
+
+    Attributes:
+    -----------
+        - database (str): The file path of the SQLite database.
+        - size (int): The maximum number of connections which can be open at the same time.
+        - timeout (float): The number of seconds to wait for a free connection before giving up.
+        - pragmas (tuple): The PRAGMA statements applied once to every new connection.
+        - hits (int): The number of requests served by an already opened connection.
+        - misses (int): The number of requests which had to open a new connection.
+        - waits (int): The number of requests which had to wait for another thread to release a connection.
+        - wait_time (float): The total number of seconds spent waiting for a free connection.
+        - settings (dict): The settings of the database which were already read, see get_setting().
+        - cache (LRUCache): The cache of data of the database which is read often, see cached().
+        - pending_invalidations (dict): The cache keys which the open transaction of a connection changed.
+          They are only invalidated when the transaction commits, see invalidate().
+    """
+
+    def __init__(self, database=DB_PATH, size=DEFAULT_POOL_SIZE, timeout=30.0, pragmas=DEFAULT_PRAGMAS):
+        """
+        Initializes an empty pool. Connections are only opened when they are requested for the first time.
+
+        Args:
+        -----
+            - database (str): The file path of the SQLite database.
+            - size (int): The maximum number of connections which can be open at the same time.
+            - timeout (float): The number of seconds to wait for a free connection before giving up.
+            - pragmas (tuple): The PRAGMA statements applied once to every new connection.
+        """
+        if size < 1:
+            raise ValueError("The pool size must be at least 1.")
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = tuple(pragmas)
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.settings = {}
+        self.cache = LRUCache()
+        self.pending_invalidations = {}
+
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        """
+            Opens a new connection and applies the PRAGMA setup to it.
+
+            Returns:
+            --------
+                - A new sqlite3.Connection object.
+        """
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """
+            Gives a connection to the calling thread.
+
+            If the thread already holds a connection, the same connection is returned again.
+            Otherwise an idle connection is reused, a new connection is opened while the pool is not full,
+            or the thread waits until another thread releases its connection.
+
+            Returns:
+            --------
+                - A sqlite3.Connection object which must be given back with release().
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            with self._lock:
+                self.hits += 1
+            return conn
+
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+        except queue.Empty:
+            with self._lock:
+                can_open = len(self._all) < self.size
+                if can_open:
+                    # Reserve the place in the pool before opening the connection outside the lock
+                    self._all.append(None)
+                    self.misses += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._all.remove(None)
+                    raise
+                with self._lock:
+                    self._all[self._all.index(None)] = conn
+            else:
+                # The pool is full, so wait for another thread to give a connection back
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No database connection became free within {self.timeout} seconds.")
+                finally:
+                    with self._lock:
+                        self.waits += 1
+                        self.wait_time += time.perf_counter() - started
+                with self._lock:
+                    self.hits += 1
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        """
+            Gives a connection back to the pool.
+
+            The connection only becomes idle once the thread has released it as often as it acquired it.
+            Any transaction which was left open at that point is rolled back.
+
+            Args:
+            -----
+                - conn (sqlite3.Connection): The connection which was returned by acquire().
+        """
+        if getattr(self._local, 'conn', None) is not conn:
+            raise ValueError("This connection is not held by the current thread.")
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        self.pending_invalidations.pop(conn, None)
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+            Context manager version of acquire() and release().
+
+            Yields:
+            -------
+                - A sqlite3.Connection object which is given back to the pool at the end of the block.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """
+            Collects the counters of the pool.
+
+            Returns:
+            --------
+                - A dictionary with the pool size, the number of open and idle connections,
+                  hits, misses, waits and the total wait time in seconds.
+        """
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': sum(1 for conn in self._all if conn is not None),
+                'idle': self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+            }
+
+    def close(self):
+        """
+            Closes every connection of the pool, including the ones which are still held by a thread.
+        """
+        with self._lock:
+            connections = [conn for conn in self._all if conn is not None]
+            self._all = []
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+# The pool which is shared by the whole app
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure(database=None, size=None, pragmas=None):
+    """
+        Replaces the shared pool by a new one with the given settings and closes the old pool.
+
+        Args:
+        -----
+            - database (str): The file path of the SQLite database. Defaults to 'habit_tracker_db.db' of the app.
+            - size (int): The maximum number of connections. Defaults to the DEFAULT_POOL_SIZE.
+            - pragmas (tuple): The PRAGMA statements for every new connection. Defaults to the DEFAULT_PRAGMAS.
+
+        Returns:
+        --------
+            - The new ConnectionPool object.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(database or DB_PATH, size or DEFAULT_POOL_SIZE,
+                               pragmas=DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        return _pool
+
+
+def get_pool():
+    """
+        Returns the shared pool and creates it with the default settings on first use.
+
+        Returns:
+        --------
+            - The shared ConnectionPool object.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def connection():
+    """
+        Borrows a connection from the shared pool for the length of a with block.
+
+        Returns:
+        --------
+            - A context manager which yields a sqlite3.Connection object.
+    """
+    return get_pool().connection()
+
+
+@contextmanager
+def transaction(conn=None):
+    """
+        Runs the statements of a with block as one atomic transaction.
+
+        The outermost block starts the transaction with BEGIN IMMEDIATE, so the write lock is taken up front,
+        and commits it once at the end. A block inside an already open transaction becomes a SAVEPOINT instead,
+        so callers can batch several transactional operations into one commit.
+        If the block raises an exception, all its changes are rolled back.
+        The cache keys which were invalidated during the transaction are forgotten once it has committed.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+
+        Yields:
+        -------
+            - The sqlite3.Connection object on which the transaction runs.
+    """
+    if conn is None:
+        with connection() as pooled_conn:
+            with transaction(pooled_conn):
+                yield pooled_conn
+        return
+
+    if conn.in_transaction:
+        conn.execute("SAVEPOINT nested_transaction")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK TO nested_transaction")
+            conn.execute("RELEASE nested_transaction")
+            raise
+        conn.execute("RELEASE nested_transaction")
+    else:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            _finish_invalidations(conn, False)
+            raise
+        conn.commit()
+        _finish_invalidations(conn, True)
+
+
+def get_setting(conn, key, default=None):
+    """
+        Reads a setting of the database from the Settings table.
+
+        For the connections of the shared pool, the value is read only once and then kept by the pool,
+        so hot paths can ask for it on every call. A database which has no Settings table yet gives the default.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - key (str): The name of the setting.
+            - default (str): The value if the setting is not stored.
+
+        Returns:
+        --------
+            - The value of the setting as a string.
+    """
+    pool = get_pool()
+    pooled = conn in pool._all
+    if pooled and key in pool.settings:
+        return pool.settings[key]
+    try:
+        row = conn.execute("SELECT value FROM Settings WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return default
+    value = row[0] if row is not None else default
+    if pooled:
+        pool.settings[key] = value
+    return value
+
+
+def set_setting(conn, key, value):
+    """
+        Stores a setting of the database in the Settings table and forgets the value kept by the shared pool.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - key (str): The name of the setting.
+            - value (str): The new value of the setting.
+    """
+    conn.execute("INSERT INTO Settings (key, value) VALUES (?, ?) "
+                 "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+    get_pool().settings.pop(key, None)
+
+
+def cached(conn, key, load):
+    """
+        Reads a value through the cache of the shared pool.
+
+        Only the connections of the shared pool use the cache, since it belongs to the database of the pool.
+        For any other connection the value is always loaded, and so is it inside a transaction, which may see
+        changes that are not committed yet. Every function which changes the data of a key must call invalidate()
+        with it after the change.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The database connection.
+            - key (hashable): The key of the value, e.g. ('habits', username).
+            - load (callable): Loads the value from the connection without arguments.
+
+        Returns:
+        --------
+            - The value of the key.
+    """
+    pool = get_pool()
+    if conn not in pool._all or conn.in_transaction:
+        return load()
+    return pool.cache.get(key, load)
+
+
+def invalidate(key=None, conn=None):
+    """
+        Forgets the value of a key in the cache of the shared pool, or all values if no key is given.
+
+        If the connection of the change is inside a transaction, the other connections still read the old value
+        until it commits, so the key is only forgotten when transaction() commits the outermost transaction.
+
+        Args:
+        -----
+            - key (hashable): The key of the value. Defaults to all keys.
+            - conn (sqlite3.Connection): The connection which changed the data. Defaults to the connection
+              which the calling thread holds from the shared pool.
+    """
+    pool = get_pool()
+    conn = conn or getattr(pool._local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        pool.pending_invalidations.setdefault(conn, set()).add(key)
+    else:
+        pool.cache.invalidate(key)
+
+
+def _finish_invalidations(conn, committed):
+    """
+        Forgets the cache keys which were invalidated during the transaction of a connection once it has committed,
+        or drops them if it was rolled back.
+    """
+    if _pool is None:
+        return
+    keys = _pool.pending_invalidations.pop(conn, ())
+    if committed:
+        for key in (None,) if None in keys else keys:
+            _pool.cache.invalidate(key)
+
+
+def cache_stats():
+    """
+        Returns the counters (hits, misses, evictions, invalidations and hit rate) of the cache of the shared pool.
+    """
+    return get_pool().cache.stats()
+
+
+def pool_stats():
+    """
+        Returns the counters (hits, misses, waits and wait time) of the shared pool.
+    """
+    return get_pool().stats()
+
+
+def close_pool():
+    """
+        Closes all connections of the shared pool. The next request opens a fresh pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
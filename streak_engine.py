@@ -0,0 +1,219 @@
+"""
+This module contains the batch streak engine of the habit tracker app.
+It computes the streak history of many habits at once from the timestamps of their completions: every streak segment
+with its start, end and length, and the current and the longest streak of every habit, with the rules of
+HabitService.complete_habit() and of the auto-reset of expired streaks.
+If NumPy is installed, the completions of all habits are processed as arrays with diff and cumsum operations instead
+of one completion after the other, otherwise the engine falls back to replay_habit() for every habit.
+It imports namedtuple, FREQUENCY_DAYS from Habit module and, if it is installed, numpy.
+"""
+
+from collections import namedtuple
+from Habit import FREQUENCY_DAYS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Whether compute_streaks() works on NumPy arrays
+VECTORIZED = np is not None
+
+# The date of a running streak's end and of the last completion of a habit without a current streak
+NO_DATE = -1
+
+# The streak history of a habit which replay_habit() computed from its completions. Every streak is a tuple of its
+# start, its end (None for the running streak) and its length, with the dates as epoch seconds.
+ReplayedHabit = namedtuple('ReplayedHabit', ['habit_streak', 'last_completion', 'streaks'])
+
+# The streak segments of compute_streaks(), as one list per column, grouped by habit and in the order of their start
+StreakSegments = namedtuple('StreakSegments', ['habit_id', 'start', 'end', 'length'])
+
+# The streaks of every habit of compute_streaks(), as one list per column: the position and the number of its
+# segments in StreakSegments, its current streak and last completion, and its longest streak (the oldest on ties)
+HabitStreaks = namedtuple('HabitStreaks', ['habit_id', 'first_segment', 'segments', 'current_streak', 'last_completion',
+                                           'longest_streak', 'longest_start', 'longest_end'])
+
+# The result of compute_streaks()
+StreakHistory = namedtuple('StreakHistory', ['segments', 'habits'])
+
+
+def replay_habit(completed_at, habit_frequency, now_seconds):
+    """
+        Computes the streak history of one habit from its completions with the rules of HabitService.complete_habit()
+        and of the auto-reset of expired streaks.
+
+        - A completion within the frequency range after the last one (on the next day for Daily habits, on the 8th
+          day for Weekly habits) makes the streak grow by 1, and an earlier one is not counted.
+        - After a missed frequency range, the streak ends at the moment it became overdue, which is when the
+          auto-reset ends it at the earliest, and the next completion starts a new streak.
+        - The last streak is still running unless it is overdue at now_seconds.
+
+        Args:
+        -----
+            - completed_at (iterable): The epoch seconds of the completions in their order.
+            - habit_frequency (str): Daily or Weekly.
+            - now_seconds (int): The epoch seconds against which the last streak is checked.
+
+        Returns:
+        --------
+            - A ReplayedHabit tuple.
+    """
+    period = FREQUENCY_DAYS[habit_frequency] * 86400
+    history = []
+    habit_streak = 0
+    streak_start = last_completion = None
+    for completion in completed_at:
+        if habit_streak:
+            days_passed = (completion - last_completion) // 86400
+            if days_passed < FREQUENCY_DAYS[habit_frequency]:
+                continue
+            if days_passed == FREQUENCY_DAYS[habit_frequency]:
+                habit_streak += 1
+                last_completion = completion
+                continue
+            history.append((streak_start, last_completion + period + 86400, habit_streak))
+        habit_streak = 1
+        streak_start = last_completion = completion
+
+    if habit_streak and last_completion + period + 86400 <= now_seconds:
+        history.append((streak_start, last_completion + period + 86400, habit_streak))
+        habit_streak, last_completion = 0, None
+    elif habit_streak:
+        history.append((streak_start, None, habit_streak))
+    return ReplayedHabit(habit_streak, last_completion, history)
+
+
+def compute_streaks(habit_ids, completed_at, habit_frequencies, now_seconds):
+    """
+        Computes the streak history of many habits at once from their completions.
+
+        Args:
+        -----
+            - habit_ids (sequence): The habit id of every completion, with the completions of a habit next to each other.
+            - completed_at (sequence): The epoch seconds of every completion, in their order within each habit.
+            - habit_frequencies (dict): The frequency (Daily or Weekly) of every habit id.
+            - now_seconds (int): The epoch seconds against which the last streak of every habit is checked.
+
+        Returns:
+        --------
+            - A StreakHistory tuple of the StreakSegments and the HabitStreaks, whose dates are epoch seconds,
+              or NO_DATE for the end of a running streak and the last completion of a habit without a current streak.
+    """
+    if not VECTORIZED:
+        return _compute_streaks_python(habit_ids, completed_at, habit_frequencies, now_seconds)
+    if len(completed_at) == 0:
+        return StreakHistory(StreakSegments([], [], [], []), HabitStreaks([], [], [], [], [], [], [], []))
+    habit_ids = np.asarray(habit_ids, dtype=np.int64)
+    # The frequency is looked up once per habit and repeated for all its completions
+    habit_starts = np.flatnonzero(_group_starts(habit_ids))
+    frequency_days = np.repeat(np.array([FREQUENCY_DAYS[habit_frequencies[habit_id]]
+                                         for habit_id in habit_ids[habit_starts].tolist()], dtype=np.int64),
+                               np.diff(np.append(habit_starts, len(habit_ids))))
+    return _compute_streaks_numpy(habit_ids, np.asarray(completed_at, dtype=np.int64), frequency_days, now_seconds)
+
+
+def _compute_streaks_python(habit_ids, completed_at, habit_frequencies, now_seconds):
+    """
+        Computes compute_streaks() with replay_habit() for every habit, if NumPy is not installed.
+    """
+    segments = StreakSegments([], [], [], [])
+    habits = HabitStreaks([], [], [], [], [], [], [], [])
+    position = 0
+    while position < len(habit_ids):
+        end = position
+        while end < len(habit_ids) and habit_ids[end] == habit_ids[position]:
+            end += 1
+        replayed = replay_habit(completed_at[position:end], habit_frequencies[habit_ids[position]], now_seconds)
+        longest = max(replayed.streaks, key=lambda streak: streak[2])
+        habits.habit_id.append(habit_ids[position])
+        habits.first_segment.append(len(segments.start))
+        habits.segments.append(len(replayed.streaks))
+        habits.current_streak.append(replayed.habit_streak)
+        habits.last_completion.append(NO_DATE if replayed.last_completion is None else replayed.last_completion)
+        habits.longest_streak.append(longest[2])
+        habits.longest_start.append(longest[0])
+        habits.longest_end.append(NO_DATE if longest[1] is None else longest[1])
+        for start, streak_end, length in replayed.streaks:
+            segments.habit_id.append(habit_ids[position])
+            segments.start.append(start)
+            segments.end.append(NO_DATE if streak_end is None else streak_end)
+            segments.length.append(length)
+        position = end
+    return StreakHistory(segments, habits)
+
+
+def _group_starts(values):
+    """
+        Marks the first element of every run of equal values of an array.
+    """
+    starts = np.empty(len(values), dtype=bool)
+    starts[0] = True
+    np.not_equal(values[1:], values[:-1], out=starts[1:])
+    return starts
+
+
+def _accepted(habit_ids, completed_at, frequency_days, new_habit, early):
+    """
+        Marks the completions which count, leaving out the ones within the frequency range after the last counted
+        completion. Whether a completion counts depends on the one before it, so only the habits with such early
+        completions are walked through one completion after the other.
+    """
+    accepted = np.ones(len(completed_at), dtype=bool)
+    habit_starts = np.flatnonzero(new_habit)
+    habit_ends = np.append(habit_starts[1:], len(completed_at))
+    for group in np.unique(np.cumsum(new_habit)[early] - 1).tolist():
+        start, end = int(habit_starts[group]), int(habit_ends[group])
+        # Python integers are compared much faster than NumPy scalars
+        times, days = completed_at[start:end].tolist(), frequency_days[start:end].tolist()
+        last_completion = times[0]
+        for position in range(1, end - start):
+            if (times[position] - last_completion) // 86400 < days[position]:
+                accepted[start + position] = False
+            else:
+                last_completion = times[position]
+    return accepted
+
+
+def _compute_streaks_numpy(habit_ids, completed_at, frequency_days, now_seconds):
+    """
+        Computes compute_streaks() with NumPy array operations.
+    """
+    new_habit = _group_starts(habit_ids)
+    days_passed = np.zeros(len(completed_at), dtype=np.int64)
+    days_passed[1:] = np.diff(completed_at) // 86400
+    early = ~new_habit & (days_passed < frequency_days)
+    if early.any():
+        accepted = _accepted(habit_ids, completed_at, frequency_days, new_habit, early)
+        habit_ids, completed_at, frequency_days = habit_ids[accepted], completed_at[accepted], frequency_days[accepted]
+        new_habit = _group_starts(habit_ids)
+        days_passed = np.zeros(len(completed_at), dtype=np.int64)
+        days_passed[1:] = np.diff(completed_at) // 86400
+
+    # A streak segment starts with the first completion of a habit and with every completion after a missed range
+    first = np.flatnonzero(new_habit | (days_passed != frequency_days))
+    last = np.append(first[1:] - 1, len(completed_at) - 1)
+    length = last - first + 1
+    segment_habit = habit_ids[first]
+    overdue = completed_at[last] + (frequency_days[first] + 1) * 86400
+
+    # Only the last segment of a habit can still be running, if it is not overdue yet
+    habit_first = np.flatnonzero(_group_starts(segment_habit))
+    habit_last = np.append(habit_first[1:] - 1, len(first) - 1)
+    running = np.zeros(len(first), dtype=bool)
+    running[habit_last] = overdue[habit_last] > now_seconds
+    end = np.where(running, NO_DATE, overdue)
+
+    # The longest streak of a habit is its first segment with the greatest length
+    counts = habit_last - habit_first + 1
+    longest_streak = np.maximum.reduceat(length, habit_first)
+    segment_group = np.repeat(np.arange(len(habit_first)), counts)
+    candidates = np.flatnonzero(length == longest_streak[segment_group])
+    longest = candidates[np.unique(segment_group[candidates], return_index=True)[1]]
+
+    segments = StreakSegments(segment_habit.tolist(), completed_at[first].tolist(), end.tolist(), length.tolist())
+    habits = HabitStreaks(segment_habit[habit_first].tolist(), habit_first.tolist(), counts.tolist(),
+                          np.where(running[habit_last], length[habit_last], 0).tolist(),
+                          np.where(running[habit_last], completed_at[last[habit_last]], NO_DATE).tolist(),
+                          longest_streak.tolist(), completed_at[first[longest]].tolist(), end[longest].tolist())
+    return StreakHistory(segments, habits)
@@ -0,0 +1,208 @@
+"""
+This module contains the set-based streak reset engine of the habit tracker app.
+Instead of checking the habits one by one, it ends the streaks of all overdue habits of one user, or of all users,
+with a handful of SQL statements inside one transaction.
+It also finds the longest streak of every habit in the streak history with one window function query.
+It imports storage, namedtuple, datetime and the habit constants and timestamp adapters from Habit module.
+"""
+
+import storage
+
+from collections import namedtuple
+from datetime import datetime
+from Habit import FREQUENCY_DAYS, TEXT_TIMESTAMPS, seconds_sql, to_db_timestamp, to_epoch_seconds
+
+# The condition for the streak row which is still running. Rows imported from the test data store the text 'None'.
+OPEN_STREAK = "(streak_end_date IS NULL OR streak_end_date = 'None')"
+
+# The result of expire_streaks()
+StreakExpiry = namedtuple('StreakExpiry', ['habits_reset', 'streaks_ended', 'expired'])
+
+# The longest streak of a habit found by longest_streaks()
+LongestStreak = namedtuple('LongestStreak', ['habit_name', 'habit_creator', 'habit_type', 'habit_frequency',
+                                             'streak_start_date', 'streak_end_date', 'streak_length', 'streak_id'])
+
+# A habit whose streak was reset by expire_streaks()
+ExpiredHabit = namedtuple('ExpiredHabit', ['habit_id', 'habit_name', 'habit_creator', 'habit_type',
+                                           'habit_frequency', 'habit_streak', 'next_due'])
+
+
+def next_due_sql(row=""):
+    """
+        Builds the SQL expression for the 'next_due' column of HabitsData.
+
+        'next_due' is the moment (in seconds, see Habit.to_epoch_seconds()) from which a habit is overdue:
+        2 days after the last completion date for Daily habits and 8 days after it for Weekly habits.
+        It is None for habits without a last completion date. The last completion date may be stored as text or as epoch seconds.
+        As the expression is also used inside triggers, the frequencies are written into it as literals
+        instead of parameters.
+
+        Args:
+        -----
+            - row (str): The prefix of the columns, e.g. 'NEW.' inside a trigger.
+
+        Returns:
+        --------
+            - The SQL expression as a string.
+    """
+    cases = " ".join(f"WHEN '{frequency}' THEN {days + 1}" for frequency, days in FREQUENCY_DAYS.items())
+    return (f"{seconds_sql(row + 'last_completion_date')} "
+            f"+ (CASE {row}habit_frequency {cases} END) * 86400")
+
+
+def expire_streaks(conn=None, username=None, frequency=None, now=None, limit=None):
+    """
+        Auto-Resets the streaks of all habits which were not checked-off within their frequency range.
+
+        A Daily habit is overdue when more than 1 day passed since its last completion date, and a Weekly habit
+        when more than 7 days passed, which is when its indexed 'next_due' moment has come.
+        For every overdue habit in one transaction,
+            - the running streak row in StreaksData gets the current datetime as its streak end date and
+              the habit streak as its streak length,
+            - the habit streak in HabitsData is reset to 0 and the last completion date to None.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - username (str): Only reset the habits of this user. Defaults to the habits of all users.
+            - frequency (str): Only reset the habits with this frequency (Daily or Weekly). Defaults to both.
+            - now (datetime): The datetime against which the habits are checked. Defaults to the current datetime.
+            - limit (int): The maximum number of habits to reset, the longest overdue first. Defaults to no limit.
+
+        Returns:
+        --------
+            - A StreakExpiry tuple with the number of reset habits, the number of ended streak rows
+              and the list of ExpiredHabit tuples.
+    """
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return expire_streaks(pooled_conn, username, frequency, now, limit)
+
+    now = (now or datetime.now()).replace(microsecond=0)
+    stored_now = to_db_timestamp(now, storage.get_setting(conn, 'timestamp_format', TEXT_TIMESTAMPS))
+
+    conditions = ["next_due <= ?"]
+    params = [to_epoch_seconds(now)]
+    if username is not None:
+        conditions.append("habit_creator = ?")
+        params.append(username)
+    if frequency is not None:
+        conditions.append("habit_frequency = ?")
+        params.append(frequency)
+    params.append(-1 if limit is None else limit)
+
+    with storage.transaction(conn):
+        # Collect the overdue habits once, so the following statements only touch these rows
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS expired_habits "
+                     "(habit_id INTEGER PRIMARY KEY, habit_name TEXT, habit_creator TEXT, habit_type TEXT, "
+                     "habit_frequency TEXT, habit_streak INTEGER, next_due INTEGER, UNIQUE (habit_creator, habit_name))")
+        conn.execute("DELETE FROM temp.expired_habits")
+        conn.execute("INSERT INTO temp.expired_habits SELECT habit_id, habit_name, habit_creator, habit_type, "
+                     "habit_frequency, habit_streak, next_due FROM HabitsData WHERE " + " AND ".join(conditions) +
+                     " ORDER BY next_due LIMIT ?", params)
+
+        # End the running streaks of the overdue habits
+        streaks_ended = conn.execute(
+            "UPDATE StreaksData SET streak_end_date = ?, streak_length = "
+            "(SELECT e.habit_streak FROM temp.expired_habits e "
+            "WHERE e.habit_creator = StreaksData.habit_creator AND e.habit_name = StreaksData.habit_name) "
+            "WHERE streak_id IN (SELECT s.streak_id FROM temp.expired_habits e JOIN StreaksData s "
+            "ON s.habit_creator = e.habit_creator AND s.habit_name = e.habit_name AND s.habit_type = e.habit_type "
+            "AND s.habit_frequency = e.habit_frequency WHERE " + OPEN_STREAK + ")", (stored_now,)).rowcount
+
+        # Reset the habit streaks of the overdue habits, which also clears their 'next_due' moment
+        habits_reset = conn.execute(
+            "UPDATE HabitsData SET last_completion_date = NULL, habit_streak = 0 "
+            "WHERE habit_id IN (SELECT habit_id FROM temp.expired_habits)").rowcount
+
+        expired = [ExpiredHabit(*row) for row in conn.execute(
+            "SELECT habit_id, habit_name, habit_creator, habit_type, habit_frequency, habit_streak, next_due "
+            "FROM temp.expired_habits ORDER BY habit_id")]
+        conn.execute("DELETE FROM temp.expired_habits")
+
+    return StreakExpiry(habits_reset, streaks_ended, expired)
+
+
+def longest_streaks_sql(where=""):
+    """
+        Builds the query for the longest streak of every habit in StreaksData.
+
+        The streaks of every habit are numbered from the longest one with ROW_NUMBER(), and the first streak of every
+        habit is joined with its whole StreaksData row, so its dates belong to its streak length.
+        Ties are won by the oldest streak. The numbering only reads the index on
+        (habit_creator, habit_name, streak_length DESC, streak_id), which delivers the streaks in that order,
+        so no sort is needed and only the rows of the longest streaks are read from the table.
+
+        Args:
+        -----
+            - where (str): An optional condition on the indexed columns of StreaksData, e.g. "habit_creator = ?".
+
+        Returns:
+        --------
+            - The SQL query as a string, whose rows have the fields of a LongestStreak tuple.
+    """
+    ranked = ("SELECT streak_id, ROW_NUMBER() OVER "
+              "(PARTITION BY habit_creator, habit_name ORDER BY streak_length DESC, streak_id) AS streak_rank "
+              f"FROM StreaksData{' WHERE ' + where if where else ''}")
+    return ("SELECT s.habit_name, s.habit_creator, s.habit_type, s.habit_frequency, s.streak_start_date, "
+            f"s.streak_end_date, s.streak_length, s.streak_id FROM ({ranked}) AS r "
+            "JOIN StreaksData s ON s.streak_id = r.streak_id WHERE r.streak_rank = 1 "
+            "ORDER BY s.habit_creator, s.habit_name")
+
+
+def longest_streaks(conn=None, username=None):
+    """
+        Finds the longest streak of every habit in the streak history.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - username (str): Only search the streaks of this user. Defaults to the streaks of all users.
+
+        Returns:
+        --------
+            - A list of LongestStreak tuples sorted by habit creator and habit name.
+    """
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return longest_streaks(pooled_conn, username)
+
+    if username is None:
+        rows = conn.execute(longest_streaks_sql())
+    else:
+        rows = conn.execute(longest_streaks_sql("habit_creator = ?"), (username,))
+    return [LongestStreak(*row) for row in rows]
+
+
+def rebuild_longest_streaks(conn=None, username=None):
+    """
+        Recomputes the longest streak columns of HabitsData from the streak history in one transaction,
+        e.g. after the StreaksData rows were changed without the triggers of the database.
+
+        Args:
+        -----
+            - conn (sqlite3.Connection): The connection to use. Defaults to a connection of the shared pool.
+            - username (str): Only rebuild the habits of this user. Defaults to the habits of all users.
+
+        Returns:
+        --------
+            - The number of habits which have a longest streak.
+    """
+    if conn is None:
+        with storage.connection() as pooled_conn:
+            return rebuild_longest_streaks(pooled_conn, username)
+
+    if username is None:
+        where, params = "", ()
+    else:
+        where, params = "habit_creator = ?", (username,)
+    with storage.transaction(conn):
+        conn.execute("UPDATE HabitsData SET longest_streak = NULL, longest_streak_start_date = NULL, "
+                     "longest_streak_end_date = NULL, longest_streak_id = NULL" + (" WHERE " + where if where else ""),
+                     params)
+        return conn.execute(
+            "UPDATE HabitsData SET longest_streak = l.streak_length, longest_streak_start_date = l.streak_start_date, "
+            "longest_streak_end_date = l.streak_end_date, longest_streak_id = l.streak_id "
+            f"FROM ({longest_streaks_sql(where)}) AS l "
+            "WHERE HabitsData.habit_creator = l.habit_creator AND HabitsData.habit_name = l.habit_name",
+            params).rowcount
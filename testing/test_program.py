@@ -1,26 +1,51 @@
 """
-This module contains an unittest.TestCase class for testing 15 functions of the whole habit tracker app.
+This module contains an unittest.TestCase class for testing 44 functions of the whole habit tracker app.
 It imports several libraries and necessary modules.
 """
 
+import asyncio
 import io
+import json
+import os
+import random
 import sys
 import sqlite3
+import tempfile
+import threading
 import unittest
 import analytics
+import batch
+import completions
+import csv
+import exporter
+import hashlib
+import importer
+import leaderboard
+import main
+import migrations
+import passwords
+import storage
+import streak_engine
+import streaks
 from io import StringIO
 from contextlib import redirect_stdout
-from datetime import datetime
+from datetime import datetime, timedelta
 from unittest import mock
 from unittest.mock import patch
 from freezegun import freeze_time
-from functions import UserProfile
+from texttable import Texttable
+from benchmarks import suite, synthetic
+from functions import COMPLETED, RESTARTED, TOO_EARLY, UserProfile
+from Habit import EPOCH_TIMESTAMPS, TEXT_TIMESTAMPS, Habit, habit_row_factory, text_sql, to_epoch_seconds
+from scheduler import StreakExpiryScheduler
+from server import HabitServer, execute
+from service import HabitExistsError, HabitNotFoundError, HabitService, authenticate, habit_choices
 
 
 class TestHabitTracker(unittest.TestCase):
     """
         This class defines unit tests for the HabitTracker program.
-        It inherits from the unittest.TestCase class and contains 15 test methods.
+        It inherits from the unittest.TestCase class and contains 44 test methods.
     """
 
     def setUp(self):
@@ -135,83 +160,88 @@ class TestHabitTracker(unittest.TestCase):
     def test_complete_habit_uncompleted_before(self):
         """
             This function tests the complete_habit() method of the UserProfile class where that mock chosen habit has not been completed before.
-            It uses mock objects to simulate user input and database calls, and checks that the database has been
+            It sets up the habit in the database, uses mock objects to simulate user input, and checks that the database has been
             updated correctly and the expected output message has been printed.
         """
         with mock.patch("functions.questionary.select") as mock_select:
             mock_select.return_value = mock.MagicMock(ask=mock.Mock(
                 side_effect=["Meditation ~~~ Daily ~~~ Emotional Relaxation"]))
-            with mock.patch("functions.UserProfile.is_habit_completed_before", return_value=False):
-                # Define the references which are expected to get result like these
-                habit_name = "Meditation"
-                username = "username1"
-                habit_type = "Emotional Relaxation"
-                habit_frequency = "Daily"
-                created_datetime = '2023-01-30 00:00:00'
-                last_completion_date = datetime.now().replace(microsecond=0)
-                string_last_completion_date = datetime.strftime(last_completion_date, "%Y-%m-%d %H:%M:%S")
-                habit_streak = 1
-                streak_start_date = datetime.now().replace(microsecond=0)
-                string_streak_start_date = datetime.strftime(streak_start_date, "%Y-%m-%d %H:%M:%S")
-                streak_end_date = None
-                streak_length = 1
-                with sqlite3.connect("habit_tracker_db.db") as conn:
-                    user = UserProfile("Tom", "Ford", "username1",
-                                       "d8b2d6602b97dfe655ccb90f8292c4508708211fd2cf38015ac2e53189add9f1")
-                    # Call the complete_habit() function with the 'conn' argument
-                    user.complete_habit()
+            # Define the references which are expected to get result like these
+            habit_name = "Meditation"
+            username = "username1"
+            habit_type = "Emotional Relaxation"
+            habit_frequency = "Daily"
+            created_datetime = '2023-01-30 00:00:00'
+            last_completion_date = datetime.now().replace(microsecond=0)
+            string_last_completion_date = datetime.strftime(last_completion_date, "%Y-%m-%d %H:%M:%S")
+            habit_streak = 1
+            streak_start_date = datetime.now().replace(microsecond=0)
+            string_streak_start_date = datetime.strftime(streak_start_date, "%Y-%m-%d %H:%M:%S")
+            streak_end_date = None
+            streak_length = 1
+            with sqlite3.connect("habit_tracker_db.db") as conn:
+                # The selected habit has not been completed before
+                conn.execute("UPDATE HabitsData SET last_completion_date = ?, habit_streak = ? "
+                             "WHERE habit_name = ? AND habit_creator = ?",
+                             (None, 0, habit_name, username))
+                conn.commit()
+                storage.invalidate()
+                user = UserProfile("Tom", "Ford", "username1",
+                                   "d8b2d6602b97dfe655ccb90f8292c4508708211fd2cf38015ac2e53189add9f1")
+                # Call the complete_habit() function with the 'conn' argument
+                user.complete_habit()
 
-                    # Verify that the selected habit is updated properly at HabitsData table in the database
-                    cur = conn.cursor()
-                    cur.execute(
-                        "SELECT * FROM HabitsData WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
-                        "AND habit_frequency = ? AND created_datetime = ? ",
-                        [habit_name, username, habit_type, habit_frequency, created_datetime])
-                    result = cur.fetchall()
-                    if result:
-                        self.assertEqual(result[0][0], habit_name)
-                        self.assertEqual(result[0][1], username)
-                        self.assertEqual(result[0][2], habit_type)
-                        self.assertEqual(result[0][3], habit_frequency)
-                        self.assertEqual(result[0][4], created_datetime)
-                        self.assertEqual(result[0][5], string_last_completion_date)
-                        self.assertEqual(result[0][6], habit_streak)
+                # Verify that the selected habit is updated properly at HabitsData table in the database
+                cur = conn.cursor()
+                cur.execute(
+                    "SELECT * FROM HabitsData WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
+                    "AND habit_frequency = ? AND created_datetime = ? ",
+                    [habit_name, username, habit_type, habit_frequency, created_datetime])
+                result = cur.fetchall()
+                if result:
+                    self.assertEqual(result[0][0], habit_name)
+                    self.assertEqual(result[0][1], username)
+                    self.assertEqual(result[0][2], habit_type)
+                    self.assertEqual(result[0][3], habit_frequency)
+                    self.assertEqual(result[0][4], created_datetime)
+                    self.assertEqual(result[0][5], string_last_completion_date)
+                    self.assertEqual(result[0][6], habit_streak)
 
-                    # Verify that the selected habit is updated properly at StreaksData table in the database
-                    cur.execute(
-                        "SELECT * FROM StreaksData WHERE habit_name = ? and habit_creator = ? and habit_type = ? "
-                        "and habit_frequency = ? and streak_start_date = ? and streak_end_date = ? and "
-                        "streak_length = ?", (habit_name, username, habit_type, habit_frequency, streak_start_date,
-                                              streak_start_date, streak_length))
-                    result = cur.fetchall()
-                    if result:
-                        self.assertEqual(result[0][0], habit_name)
-                        self.assertEqual(result[0][1], username)
-                        self.assertEqual(result[0][2], habit_type)
-                        self.assertEqual(result[0][3], habit_frequency)
-                        self.assertEqual(result[0][4], string_streak_start_date)
-                        self.assertEqual(result[0][5], streak_end_date)
-                        self.assertEqual(result[0][6], streak_length)
+                # Verify that the selected habit is updated properly at StreaksData table in the database
+                cur.execute(
+                    "SELECT * FROM StreaksData WHERE habit_name = ? and habit_creator = ? and habit_type = ? "
+                    "and habit_frequency = ? and streak_start_date = ? and streak_end_date = ? and "
+                    "streak_length = ?", (habit_name, username, habit_type, habit_frequency, streak_start_date,
+                                          streak_start_date, streak_length))
+                result = cur.fetchall()
+                if result:
+                    self.assertEqual(result[0][0], habit_name)
+                    self.assertEqual(result[0][1], username)
+                    self.assertEqual(result[0][2], habit_type)
+                    self.assertEqual(result[0][3], habit_frequency)
+                    self.assertEqual(result[0][4], string_streak_start_date)
+                    self.assertEqual(result[0][5], streak_end_date)
+                    self.assertEqual(result[0][6], streak_length)
 
-                    # Verify that the correct message is displayed
-                    expected_output = "Hooray! You completed Meditation."
-                    self.assertIn(expected_output, self.output.getvalue())
+                # Verify that the correct message is displayed
+                expected_output = "Hooray! You completed Meditation."
+                self.assertIn(expected_output, self.output.getvalue())
 
-                    # Clear data changes that were processed while running the test
-                    cur.execute("UPDATE HabitsData SET last_completion_date = ?, habit_streak = 0 "
-                                "WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
-                                "AND habit_frequency = ? AND created_datetime = ?",
-                                (None, habit_name, username, habit_type, habit_frequency, created_datetime))
-                    conn.commit()
-                    cur.execute("DELETE FROM StreaksData WHERE habit_name = ? and habit_creator = ?",
-                                (habit_name, username))
-                    conn.commit()
+                # Clear data changes that were processed while running the test
+                cur.execute("UPDATE HabitsData SET last_completion_date = ?, habit_streak = 0 "
+                            "WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
+                            "AND habit_frequency = ? AND created_datetime = ?",
+                            (None, habit_name, username, habit_type, habit_frequency, created_datetime))
+                conn.commit()
+                cur.execute("DELETE FROM StreaksData WHERE habit_name = ? and habit_creator = ?",
+                            (habit_name, username))
+                conn.commit()
 
     @freeze_time('2023-01-31 00:10:00')
     def test_complete_habit_completed_before_option1(self):
         """
             This function tests the complete_habit() method of the UserProfile class where that mock chosen habit has been completed before.
-            It uses mock objects to simulate user input and database calls, and checks that the database has been
+            It sets up the habit in the database, uses mock objects to simulate user input, and checks that the database has been
             updated correctly and the expected output message has been printed.
 
             The test case uses the `@freeze_time` decorator to freeze the time to a specific date and time.
@@ -219,71 +249,76 @@ class TestHabitTracker(unittest.TestCase):
         with mock.patch("functions.questionary.select") as mock_select:
             mock_select.return_value = mock.MagicMock(ask=mock.Mock(
                 side_effect=["Exercise ~~~ Daily ~~~ Physical Health"]))
-            with mock.patch("functions.UserProfile.is_habit_completed_before", return_value=True):
-                # Define the references which are expected to get result like these
-                habit_name = "Exercise"
-                username = "username2"
-                habit_type = "Physical Health"
-                habit_frequency = "Daily"
-                created_datetime = '2023-01-02 00:00:00'
-                habit_streak = 30
-                last_completion_date = datetime.now().replace(microsecond=0)
-                string_last_completion_date = datetime.strftime(last_completion_date, "%Y-%m-%d %H:%M:%S")
-                streak_start_date = '2023-01-02 00:05:00'
-                streak_end_date = None
-                streak_length = 30
-                with sqlite3.connect("habit_tracker_db.db") as conn:
-                    user = UserProfile("Daisy", "Luna", "username2",
-                                       "6b6b681e6617c2d34d5bc96d5bdc23020b5a81e88f150d89968d96750227bf7a")
-                    # Call the complete_habit() function with the 'conn' argument
-                    user.complete_habit()
+            # Define the references which are expected to get result like these
+            habit_name = "Exercise"
+            username = "username2"
+            habit_type = "Physical Health"
+            habit_frequency = "Daily"
+            created_datetime = '2023-01-02 00:00:00'
+            habit_streak = 30
+            last_completion_date = datetime.now().replace(microsecond=0)
+            string_last_completion_date = datetime.strftime(last_completion_date, "%Y-%m-%d %H:%M:%S")
+            streak_start_date = '2023-01-02 00:05:00'
+            streak_end_date = None
+            streak_length = 30
+            with sqlite3.connect("habit_tracker_db.db") as conn:
+                # The selected habit has been completed before, the last time the day before
+                conn.execute("UPDATE HabitsData SET last_completion_date = ?, habit_streak = ? "
+                             "WHERE habit_name = ? AND habit_creator = ?",
+                             ('2023-01-30 00:05:00', 29, habit_name, username))
+                conn.commit()
+                storage.invalidate()
+                user = UserProfile("Daisy", "Luna", "username2",
+                                   "6b6b681e6617c2d34d5bc96d5bdc23020b5a81e88f150d89968d96750227bf7a")
+                # Call the complete_habit() function with the 'conn' argument
+                user.complete_habit()
 
-                    # Verify that the selected habit is updated properly at HabitsData table in the database
-                    cur = conn.cursor()
-                    cur.execute(
-                        "SELECT * FROM HabitsData WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
-                        "AND habit_frequency = ? AND created_datetime = ? ",
-                        [habit_name, username, habit_type, habit_frequency, created_datetime])
-                    result = cur.fetchall()
-                    if result:
-                        self.assertEqual(result[0][0], habit_name)
-                        self.assertEqual(result[0][1], username)
-                        self.assertEqual(result[0][2], habit_type)
-                        self.assertEqual(result[0][3], habit_frequency)
-                        self.assertEqual(result[0][4], created_datetime)
-                        self.assertEqual(result[0][5], string_last_completion_date)
-                        self.assertEqual(result[0][6], habit_streak)
+                # Verify that the selected habit is updated properly at HabitsData table in the database
+                cur = conn.cursor()
+                cur.execute(
+                    "SELECT * FROM HabitsData WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
+                    "AND habit_frequency = ? AND created_datetime = ? ",
+                    [habit_name, username, habit_type, habit_frequency, created_datetime])
+                result = cur.fetchall()
+                if result:
+                    self.assertEqual(result[0][0], habit_name)
+                    self.assertEqual(result[0][1], username)
+                    self.assertEqual(result[0][2], habit_type)
+                    self.assertEqual(result[0][3], habit_frequency)
+                    self.assertEqual(result[0][4], created_datetime)
+                    self.assertEqual(result[0][5], string_last_completion_date)
+                    self.assertEqual(result[0][6], habit_streak)
 
-                    # Verify that the selected habit is updated properly at StreaksData table in the database
-                    cur.execute(
-                        "SELECT * FROM StreaksData WHERE habit_name = ? and habit_creator = ? and habit_type = ? "
-                        "and habit_frequency = ? and streak_start_date = ? and streak_end_date = ? and "
-                        "streak_length = ?", (habit_name, username, habit_type, habit_frequency, streak_start_date,
-                                              streak_start_date, streak_length))
-                    result = cur.fetchall()
-                    if result:
-                        self.assertEqual(result[0][0], habit_name)
-                        self.assertEqual(result[0][1], username)
-                        self.assertEqual(result[0][2], habit_type)
-                        self.assertEqual(result[0][3], habit_frequency)
-                        self.assertEqual(result[0][4], streak_start_date)
-                        self.assertEqual(result[0][5], streak_end_date)
-                        self.assertEqual(result[0][6], streak_length)
+                # Verify that the selected habit is updated properly at StreaksData table in the database
+                cur.execute(
+                    "SELECT * FROM StreaksData WHERE habit_name = ? and habit_creator = ? and habit_type = ? "
+                    "and habit_frequency = ? and streak_start_date = ? and streak_end_date = ? and "
+                    "streak_length = ?", (habit_name, username, habit_type, habit_frequency, streak_start_date,
+                                          streak_start_date, streak_length))
+                result = cur.fetchall()
+                if result:
+                    self.assertEqual(result[0][0], habit_name)
+                    self.assertEqual(result[0][1], username)
+                    self.assertEqual(result[0][2], habit_type)
+                    self.assertEqual(result[0][3], habit_frequency)
+                    self.assertEqual(result[0][4], streak_start_date)
+                    self.assertEqual(result[0][5], streak_end_date)
+                    self.assertEqual(result[0][6], streak_length)
 
-                    # Verify that the correct message is displayed
-                    expected_output = "Hooray! You completed Exercise."
-                    self.assertIn(expected_output, self.output.getvalue())
+                # Verify that the correct message is displayed
+                expected_output = "Hooray! You completed Exercise."
+                self.assertIn(expected_output, self.output.getvalue())
 
-                    # Clear data changes that were processed while running the test
-                    cur.execute(
-                        "UPDATE HabitsData SET last_completion_date = ?, habit_streak = 29 WHERE habit_name = ? "
-                        "and habit_creator = ? ",
-                        ['2023-01-30 00:05:00', habit_name, username])
-                    conn.commit()
-                    cur.execute("UPDATE StreaksData SET streak_end_date = ?, streak_length = 29 "
-                                "WHERE habit_name = ? and habit_creator = ?",
-                                (None, habit_name, username))
-                    conn.commit()
+                # Clear data changes that were processed while running the test
+                cur.execute(
+                    "UPDATE HabitsData SET last_completion_date = ?, habit_streak = 29 WHERE habit_name = ? "
+                    "and habit_creator = ? ",
+                    ['2023-01-30 00:05:00', habit_name, username])
+                conn.commit()
+                cur.execute("UPDATE StreaksData SET streak_end_date = ?, streak_length = 29 "
+                            "WHERE habit_name = ? and habit_creator = ?",
+                            (None, habit_name, username))
+                conn.commit()
 
     @freeze_time('2023-01-30 12:00:00')
     def test_complete_habit_completed_before_option2(self):
@@ -291,24 +326,29 @@ class TestHabitTracker(unittest.TestCase):
             This function tests the complete_habit() method of the UserProfile class
             where the mock chosen habit will be mark completed on the same day as its last completion date.
 
-            It uses mock objects to simulate user input and database calls, and checks that the expected output message has been printed.
+            It sets up the habit in the database, uses mock objects to simulate user input, and checks that the expected output message has been printed.
             The test case uses the `@freeze_time` decorator to freeze the time to a specific date and time.
         """
 
         with mock.patch("functions.questionary.select") as mock_select:
             mock_select.return_value = mock.MagicMock(ask=mock.Mock(
                 side_effect=["Exercise ~~~ Daily ~~~ Physical Health"]))
-            with mock.patch("functions.UserProfile.is_habit_completed_before", return_value=True):
-                with sqlite3.connect("habit_tracker_db.db"):
-                    user = UserProfile("Daisy", "Luna", "username2",
-                                       "6b6b681e6617c2d34d5bc96d5bdc23020b5a81e88f150d89968d96750227bf7a")
-                    # Call the complete_habit() function with the 'conn' argument
-                    user.complete_habit()
+            with sqlite3.connect("habit_tracker_db.db") as conn:
+                # The selected habit has been completed before, the last time on the same day
+                conn.execute("UPDATE HabitsData SET last_completion_date = ?, habit_streak = ? "
+                             "WHERE habit_name = ? AND habit_creator = ?",
+                             ('2023-01-30 00:05:00', 29, 'Exercise', 'username2'))
+                conn.commit()
+                storage.invalidate()
+                user = UserProfile("Daisy", "Luna", "username2",
+                                   "6b6b681e6617c2d34d5bc96d5bdc23020b5a81e88f150d89968d96750227bf7a")
+                # Call the complete_habit() function with the 'conn' argument
+                user.complete_habit()
 
-                    # Verify that the correct message is displayed
-                    expected_output = "There is no 24 hours long from the last completion date of this daily habit. " \
-                                      "Only 1 streak is counted for Daily habits in 24 hours."
-                    self.assertIn(expected_output, self.output.getvalue())
+                # Verify that the correct message is displayed
+                expected_output = "There is no 24 hours long from the last completion date of this daily habit. " \
+                                  "Only 1 streak is counted for Daily habits in 24 hours."
+                self.assertIn(expected_output, self.output.getvalue())
 
     def test_delete_habit(self):
         """
@@ -371,154 +411,164 @@ class TestHabitTracker(unittest.TestCase):
     def test_reset_daily_streak(self):
         """
             This method defines a unit test for the reset_daily_streak() function of the UserProfile class.
-            It mocks the output of is_last_completion_date_present to True and checks that the mock selected daily habit is correctly made reset the streaks
+            It sets up a mock selected daily habit whose last completion date is more than 24 hours ago, checks that its streaks are correctly reset
             at the database and checks that the expected output message has been printed.
             The test case uses the `@freeze_time` decorator to freeze the time to a specific date and time.
         """
 
-        with mock.patch("functions.UserProfile.is_last_completion_date_present", return_value=True):
-            # Define the references which are expected to get result like these
-            habit_name = "Writing Diary"
-            username = "username2"
-            habit_type = "Personal Growth"
-            habit_frequency = "Daily"
-            created_datetime = '2023-01-01 00:00:00'
-            last_completion_date = None
-            habit_streak = 0
-            streak_start_date = '2023-01-01 00:05:00'
-            streak_end_date = datetime.now().replace(microsecond=0)
-            string_streak_end_date = datetime.strftime(streak_end_date, "%Y-%m-%d %H:%M:%S")
-            streak_length = 27
-            with sqlite3.connect("habit_tracker_db.db") as conn:
-                user = UserProfile("Daisy", "Luna", "username2",
-                                   "6b6b681e6617c2d34d5bc96d5bdc23020b5a81e88f150d89968d96750227bf7a")
-                # Call the reset_daily_streak() function with the 'conn' argument
-                user.reset_daily_streak()
-
-                # Verify that the streak of mock selected habit is updated properly at HabitsData table in the database
-                cur = conn.cursor()
-                cur.execute(
-                    "SELECT * FROM HabitsData WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
-                    "AND habit_frequency = ? AND created_datetime = ? AND last_completion_date = ? "
-                    "AND habit_streak = ?",
-                    [habit_name, username, habit_type, habit_frequency, created_datetime, last_completion_date,
-                     habit_streak])
-                result = cur.fetchall()
-                if result:
-                    self.assertEqual(result[0][0], habit_name)
-                    self.assertEqual(result[0][1], username)
-                    self.assertEqual(result[0][2], habit_type)
-                    self.assertEqual(result[0][3], habit_frequency)
-                    self.assertEqual(result[0][4], created_datetime)
-                    self.assertEqual(result[0][5], last_completion_date)
-                    self.assertEqual(result[0][6], habit_streak)
-
-                # Verify that the streak of mock selected habit is updated properly at StreaksData table in the database
-                cur.execute(
-                    "SELECT * FROM StreaksData WHERE habit_name = ? and habit_creator = ? and habit_type = ? "
-                    "and habit_frequency = ? and streak_start_date = ? ",
-                    (habit_name, username, habit_type, habit_frequency, streak_start_date))
-                result = cur.fetchall()
-                if result:
-                    self.assertEqual(result[0][0], habit_name)
-                    self.assertEqual(result[0][1], username)
-                    self.assertEqual(result[0][2], habit_type)
-                    self.assertEqual(result[0][3], habit_frequency)
-                    self.assertEqual(result[0][4], streak_start_date)
-                    self.assertEqual(result[0][5], string_streak_end_date)
-                    self.assertEqual(result[0][6], streak_length)
+        # Define the references which are expected to get result like these
+        habit_name = "Writing Diary"
+        username = "username2"
+        habit_type = "Personal Growth"
+        habit_frequency = "Daily"
+        created_datetime = '2023-01-01 00:00:00'
+        last_completion_date = None
+        habit_streak = 0
+        streak_start_date = '2023-01-01 00:05:00'
+        streak_end_date = datetime.now().replace(microsecond=0)
+        string_streak_end_date = datetime.strftime(streak_end_date, "%Y-%m-%d %H:%M:%S")
+        streak_length = 27
+        with sqlite3.connect("habit_tracker_db.db") as conn:
+            # The selected habit has a last completion date more than 24 hours ago
+            conn.execute("UPDATE HabitsData SET last_completion_date = ?, habit_streak = ? "
+                         "WHERE habit_name = ? AND habit_creator = ?",
+                         ('2023-01-27 00:05:00', 27, habit_name, username))
+            conn.commit()
+            storage.invalidate()
+            user = UserProfile("Daisy", "Luna", "username2",
+                               "6b6b681e6617c2d34d5bc96d5bdc23020b5a81e88f150d89968d96750227bf7a")
+            # Call the reset_daily_streak() function with the 'conn' argument
+            user.reset_daily_streak()
+
+            # Verify that the streak of mock selected habit is updated properly at HabitsData table in the database
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT * FROM HabitsData WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
+                "AND habit_frequency = ? AND created_datetime = ? AND last_completion_date = ? "
+                "AND habit_streak = ?",
+                [habit_name, username, habit_type, habit_frequency, created_datetime, last_completion_date,
+                 habit_streak])
+            result = cur.fetchall()
+            if result:
+                self.assertEqual(result[0][0], habit_name)
+                self.assertEqual(result[0][1], username)
+                self.assertEqual(result[0][2], habit_type)
+                self.assertEqual(result[0][3], habit_frequency)
+                self.assertEqual(result[0][4], created_datetime)
+                self.assertEqual(result[0][5], last_completion_date)
+                self.assertEqual(result[0][6], habit_streak)
+
+            # Verify that the streak of mock selected habit is updated properly at StreaksData table in the database
+            cur.execute(
+                "SELECT * FROM StreaksData WHERE habit_name = ? and habit_creator = ? and habit_type = ? "
+                "and habit_frequency = ? and streak_start_date = ? ",
+                (habit_name, username, habit_type, habit_frequency, streak_start_date))
+            result = cur.fetchall()
+            if result:
+                self.assertEqual(result[0][0], habit_name)
+                self.assertEqual(result[0][1], username)
+                self.assertEqual(result[0][2], habit_type)
+                self.assertEqual(result[0][3], habit_frequency)
+                self.assertEqual(result[0][4], streak_start_date)
+                self.assertEqual(result[0][5], string_streak_end_date)
+                self.assertEqual(result[0][6], streak_length)
 
-                # Verify that the correct message is displayed
-                expected_output = f"The streaks of {habit_name} have been auto-reset to 0 " \
-                                  f"since there is no marking completed during last 24 hours."
-                self.assertIn(expected_output, self.output.getvalue().strip())
+            # Verify that the correct message is displayed
+            expected_output = f"The streaks of {habit_name} have been auto-reset to 0 " \
+                              f"since there is no marking completed during last 24 hours."
+            self.assertIn(expected_output, self.output.getvalue().strip())
 
-                # Clear data changes that were processed while running the test
-                cur.execute("UPDATE HabitsData set last_completion_date = ?, habit_streak = 27 WHERE habit_name = ?"
-                            "AND habit_creator = ?",
-                            ('2023-01-27 00:05:00', habit_name, username))
-                conn.commit()
-                cur.execute(
-                    "UPDATE StreaksData SET streak_end_date = ? "
-                    "WHERE habit_name = ? AND habit_creator = ?",
-                    [None, habit_name, username])
-                conn.commit()
+            # Clear data changes that were processed while running the test
+            cur.execute("UPDATE HabitsData set last_completion_date = ?, habit_streak = 27 WHERE habit_name = ?"
+                        "AND habit_creator = ?",
+                        ('2023-01-27 00:05:00', habit_name, username))
+            conn.commit()
+            cur.execute(
+                "UPDATE StreaksData SET streak_end_date = ? "
+                "WHERE habit_name = ? AND habit_creator = ?",
+                [None, habit_name, username])
+            conn.commit()
 
     @freeze_time('2023-02-05 00:05:00')
     def test_reset_weekly_streak(self):
         """
             This method defines a unit test for the reset_weekly_habit() function of the UserProfile class.
-            It mocks the output of is_last_completion_date_present to True and checks that the mock selected weekly habit is correctly made reset the streaks
+            It sets up a mock selected weekly habit whose last completion date is more than 7 days ago, checks that its streaks are correctly reset
             at the database and checks that the expected output message has been printed.
             The test case uses the `@freeze_time` decorator to freeze the time to a specific date and time.
         """
-        with mock.patch("functions.UserProfile.is_last_completion_date_present", return_value=True):
-            # Define the references which are expected to get result like these
-            habit_name = "Self-assessment"
-            username = "username2"
-            habit_type = "Personal Growth"
-            habit_frequency = "Weekly"
-            created_datetime = '2023-01-01 00:00:00'
-            last_completion_date = None
-            habit_streak = 0
-            streak_start_date = '2023-01-01 00:05:00'
-            streak_end_date = datetime.now().replace(microsecond=0)
-            string_streak_end_date = datetime.strftime(streak_end_date, "%Y-%m-%d %H:%M:%S")
-            streak_length = 4
-            with sqlite3.connect("habit_tracker_db.db") as conn:
-                user = UserProfile("Daisy", "Luna", "username2",
-                                   "6b6b681e6617c2d34d5bc96d5bdc23020b5a81e88f150d89968d96750227bf7a")
-                # Call the reset_weekly_habit() function with the 'conn' argument
-                user.reset_weekly_streak()
-
-                # Verify that the streak of mock selected habit is updated properly at HabitsData table in the database
-                cur = conn.cursor()
-                cur.execute(
-                    "SELECT * FROM HabitsData WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
-                    "AND habit_frequency = ? AND created_datetime = ? AND last_completion_date = ? "
-                    "AND habit_streak = ?",
-                    [habit_name, username, habit_type, habit_frequency, created_datetime, last_completion_date,
-                     habit_streak])
-                result = cur.fetchall()
-                if result:
-                    self.assertEqual(result[0][0], habit_name)
-                    self.assertEqual(result[0][1], username)
-                    self.assertEqual(result[0][2], habit_type)
-                    self.assertEqual(result[0][3], habit_frequency)
-                    self.assertEqual(result[0][4], created_datetime)
-                    self.assertEqual(result[0][5], last_completion_date)
-                    self.assertEqual(result[0][6], habit_streak)
-
-                # Verify that the streak of mock selected habit is updated properly at StreaksData table in the database
-                cur.execute(
-                    "SELECT * FROM StreaksData WHERE habit_name = ? and habit_creator = ? and habit_type = ? "
-                    "and habit_frequency = ? and streak_start_date = ? ",
-                    (habit_name, username, habit_type, habit_frequency, streak_start_date))
-                result = cur.fetchall()
-                if result:
-                    self.assertEqual(result[0][0], habit_name)
-                    self.assertEqual(result[0][1], username)
-                    self.assertEqual(result[0][2], habit_type)
-                    self.assertEqual(result[0][3], habit_frequency)
-                    self.assertEqual(result[0][4], streak_start_date)
-                    self.assertEqual(result[0][5], string_streak_end_date)
-                    self.assertEqual(result[0][6], streak_length)
+        # Define the references which are expected to get result like these
+        habit_name = "Self-assessment"
+        username = "username2"
+        habit_type = "Personal Growth"
+        habit_frequency = "Weekly"
+        created_datetime = '2023-01-01 00:00:00'
+        last_completion_date = None
+        habit_streak = 0
+        streak_start_date = '2023-01-01 00:05:00'
+        streak_end_date = datetime.now().replace(microsecond=0)
+        string_streak_end_date = datetime.strftime(streak_end_date, "%Y-%m-%d %H:%M:%S")
+        streak_length = 4
+        with sqlite3.connect("habit_tracker_db.db") as conn:
+            # The selected habit has a last completion date more than 7 days ago
+            conn.execute("UPDATE HabitsData SET last_completion_date = ?, habit_streak = ? "
+                         "WHERE habit_name = ? AND habit_creator = ?",
+                         ('2023-01-28 00:05:00', 4, habit_name, username))
+            conn.commit()
+            storage.invalidate()
+            user = UserProfile("Daisy", "Luna", "username2",
+                               "6b6b681e6617c2d34d5bc96d5bdc23020b5a81e88f150d89968d96750227bf7a")
+            # Call the reset_weekly_habit() function with the 'conn' argument
+            user.reset_weekly_streak()
+
+            # Verify that the streak of mock selected habit is updated properly at HabitsData table in the database
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT * FROM HabitsData WHERE habit_name = ? AND habit_creator = ? AND habit_type = ? "
+                "AND habit_frequency = ? AND created_datetime = ? AND last_completion_date = ? "
+                "AND habit_streak = ?",
+                [habit_name, username, habit_type, habit_frequency, created_datetime, last_completion_date,
+                 habit_streak])
+            result = cur.fetchall()
+            if result:
+                self.assertEqual(result[0][0], habit_name)
+                self.assertEqual(result[0][1], username)
+                self.assertEqual(result[0][2], habit_type)
+                self.assertEqual(result[0][3], habit_frequency)
+                self.assertEqual(result[0][4], created_datetime)
+                self.assertEqual(result[0][5], last_completion_date)
+                self.assertEqual(result[0][6], habit_streak)
+
+            # Verify that the streak of mock selected habit is updated properly at StreaksData table in the database
+            cur.execute(
+                "SELECT * FROM StreaksData WHERE habit_name = ? and habit_creator = ? and habit_type = ? "
+                "and habit_frequency = ? and streak_start_date = ? ",
+                (habit_name, username, habit_type, habit_frequency, streak_start_date))
+            result = cur.fetchall()
+            if result:
+                self.assertEqual(result[0][0], habit_name)
+                self.assertEqual(result[0][1], username)
+                self.assertEqual(result[0][2], habit_type)
+                self.assertEqual(result[0][3], habit_frequency)
+                self.assertEqual(result[0][4], streak_start_date)
+                self.assertEqual(result[0][5], string_streak_end_date)
+                self.assertEqual(result[0][6], streak_length)
 
-                # Verify that the correct message is displayed
-                expected_output = f"The streaks of {habit_name} have been auto-reset to 0 " \
-                                  f"since there is no marking completed during last 7 days."
-                self.assertIn(expected_output, self.output.getvalue().strip())
+            # Verify that the correct message is displayed
+            expected_output = f"The streaks of {habit_name} have been auto-reset to 0 " \
+                              f"since there is no marking completed during last 7 days."
+            self.assertIn(expected_output, self.output.getvalue().strip())
 
-                # Clear data changes that were processed while running the test
-                cur.execute("UPDATE HabitsData set last_completion_date = ?, habit_streak = 4 WHERE habit_name = ?"
-                            "AND habit_creator = ?",
-                            ('2023-01-28 00:05:00', habit_name, username))
-                conn.commit()
-                cur.execute(
-                    "UPDATE StreaksData SET streak_end_date = ? "
-                    "WHERE habit_name = ? AND habit_creator = ?",
-                    [None, habit_name, username])
-                conn.commit()
+            # Clear data changes that were processed while running the test
+            cur.execute("UPDATE HabitsData set last_completion_date = ?, habit_streak = 4 WHERE habit_name = ?"
+                        "AND habit_creator = ?",
+                        ('2023-01-28 00:05:00', habit_name, username))
+            conn.commit()
+            cur.execute(
+                "UPDATE StreaksData SET streak_end_date = ? "
+                "WHERE habit_name = ? AND habit_creator = ?",
+                [None, habit_name, username])
+            conn.commit()
 
     def test_show_all_habits(self):
         """
@@ -711,6 +761,12 @@ class TestHabitTracker(unittest.TestCase):
         # Compare the actual and expected outputs
         self.assertEqual(actual_output, expected_output)
 
+        # The longest streaks are read page by page in the order of the table
+        pages = list(analytics.iter_longest_streak_pages(username, page_size=2))
+        self.assertEqual([len(page) for page in pages], [2, 1])
+        self.assertEqual([row[0] for page in pages for row in page], ["Family Time", "Healthy Diet", "Self-assessment"])
+        self.assertEqual(sum(pages, []), next(analytics.iter_longest_streak_pages(username)))
+
     def test_longest_streak_of_selected_habit(self):
         """
             This method defines a unit test for the longest_streak_of_selected_habit() function of the analytics module.
@@ -730,3 +786,1323 @@ class TestHabitTracker(unittest.TestCase):
             expected_output = ("The longest run streak of your selected habit is as follows.\n"
                 f"Longest streak of Healthy Diet ~~~ Daily ~~~ Physical Health: 13")
             self.assertIn(expected_output, self.output.getvalue().strip())
+
+    def test_connection_pool(self):
+        """
+            This method defines a unit test for the ConnectionPool class of the storage module.
+            It checks that a thread gets the same connection back while it holds one, that idle connections are reused
+            instead of opening new ones, and that a full pool makes another thread wait for a released connection.
+            A UserProfile object only borrows a connection of the shared pool while one of its operations runs,
+            so a failing operation does not keep it from the other threads.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pool = storage.ConnectionPool(os.path.join(tmp_dir, "pool_test.db"), size=1, timeout=5)
+            try:
+                # A nested request of the same thread is served by the connection the thread already holds
+                with pool.connection() as outer:
+                    with pool.connection() as inner:
+                        self.assertIs(outer, inner)
+                        self.assertEqual(inner.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+                    # The only connection is held by this thread, so another thread has to wait for it
+                    borrowed = []
+                    waiting_thread = threading.Thread(target=lambda: borrowed.append(pool.acquire()))
+                    waiting_thread.start()
+                waiting_thread.join(timeout=5)
+                self.assertEqual(borrowed, [outer])
+
+                stats = pool.stats()
+                self.assertEqual(stats['misses'], 1)
+                self.assertEqual(stats['hits'], 2)
+                self.assertEqual(stats['waits'], 1)
+                self.assertEqual(stats['open'], 1)
+            finally:
+                pool.close()
+
+            storage.configure(database=os.path.join(tmp_dir, "profile_pool_test.db"), size=1)
+            try:
+                migrations.migrate()
+                storage.get_pool().timeout = 1
+                user = UserProfile("Tom", "Ford", "username1", "password")
+                with self.assertRaises(HabitNotFoundError):
+                    user.complete(1)
+                borrowed = []
+                borrowing_thread = threading.Thread(target=lambda: borrowed.append(storage.get_pool().acquire()))
+                borrowing_thread.start()
+                borrowing_thread.join(timeout=5)
+                self.assertEqual(len(borrowed), 1)
+                self.assertEqual(storage.pool_stats()['waits'], 0)
+            finally:
+                storage.configure()
+
+    def test_migrate(self):
+        """
+            This method defines a unit test for the migrate() function of the migrations module.
+            It creates the tables in their original layout without keys, runs the migrations on them and checks that
+            the rows keep their positions, get integer primary keys and that the lookup indexes exist, and that a
+            habit which shares its name with an older habit of the same user is renamed with its streaks, not dropped.
+            User accounts which share a username stop the migration instead of being dropped.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "migrate_test.db"))
+            try:
+                conn.execute("CREATE TABLE HabitsData (habit_name TEXT, habit_creator TEXT, habit_type TEXT, "
+                             "habit_frequency TEXT, created_datetime DATETIME, last_completion_date DATETIME, "
+                             "habit_streak INTEGER)")
+                conn.execute("CREATE TABLE StreaksData (habit_name TEXT, habit_creator TEXT, habit_type TEXT, "
+                             "habit_frequency TEXT, streak_start_date DATETIME, streak_end_date DATETIME, "
+                             "streak_length INTEGER)")
+                conn.execute("CREATE TABLE User (forename TEXT, surname TEXT, username VARCHAR, password VARCHAR)")
+                # The same habit name twice in one account with different frequencies, which the earlier versions
+                # allowed and the unique index does not allow anymore
+                conn.executemany("INSERT INTO HabitsData VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                    ('Exercise', 'username1', 'Physical Health', 'Daily', '2023-01-01 00:00:00', None, 0),
+                    ('Exercise', 'username1', 'Physical Health', 'Weekly', '2023-01-02 00:00:00', None, 0),
+                    ('Exercise', 'username2', 'Physical Health', 'Daily', '2023-01-03 00:00:00', None, 0)])
+                conn.executemany("INSERT INTO StreaksData VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                    ('Exercise', 'username2', 'Physical Health', 'Daily', '2023-01-03 00:05:00', None, 1),
+                    ('Exercise', 'username1', 'Physical Health', 'Weekly', '2023-01-02 00:05:00', None, 1)])
+                conn.execute("INSERT INTO User VALUES ('Tom', 'Ford', 'username1', 'hash')")
+                conn.commit()
+
+                self.assertEqual(migrations.migrate(conn), [version for version, _, _ in migrations.MIGRATIONS])
+                self.assertEqual(migrations.schema_version(conn), migrations.LATEST_VERSION)
+                # Running the migrations again does nothing
+                self.assertEqual(migrations.migrate(conn), [])
+
+                habits = conn.execute("SELECT habit_name, habit_creator, habit_type, habit_frequency, created_datetime, "
+                                      "last_completion_date, habit_streak, habit_id FROM HabitsData "
+                                      "ORDER BY habit_id").fetchall()
+                self.assertEqual(habits, [
+                    ('Exercise', 'username1', 'Physical Health', 'Daily', '2023-01-01 00:00:00', None, 0, 1),
+                    ('Exercise (Weekly)', 'username1', 'Physical Health', 'Weekly', '2023-01-02 00:00:00', None, 0, 2),
+                    ('Exercise', 'username2', 'Physical Health', 'Daily', '2023-01-03 00:00:00', None, 0, 3)])
+                self.assertEqual(conn.execute("SELECT habit_name, habit_creator, streak_length, streak_id "
+                                              "FROM StreaksData ORDER BY streak_id").fetchall(),
+                                 [('Exercise', 'username2', 1, 1), ('Exercise (Weekly)', 'username1', 1, 2)])
+                self.assertEqual(conn.execute("SELECT username, user_id FROM User").fetchall(), [('username1', 1)])
+
+                with self.assertRaises(sqlite3.IntegrityError):
+                    conn.execute("INSERT INTO HabitsData (habit_name, habit_creator) VALUES ('Exercise', 'username2')")
+                plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM StreaksData WHERE habit_creator = ? AND "
+                                    "habit_name = ? AND habit_type = ? AND habit_frequency = ?",
+                                    ('username2', 'Exercise', 'Physical Health', 'Daily')).fetchall()
+                self.assertIn("idx_streaks_habit", plan[0][3])
+            finally:
+                conn.close()
+
+            conn = sqlite3.connect(os.path.join(tmp_dir, "migrate_duplicate_users_test.db"))
+            try:
+                conn.execute("CREATE TABLE User (forename TEXT, surname TEXT, username VARCHAR, password VARCHAR)")
+                conn.executemany("INSERT INTO User VALUES (?, ?, ?, ?)", [
+                    ('Tom', 'Ford', 'username1', 'hash1'), ('Tim', 'Ford', 'username1', 'hash2'),
+                    ('Daisy', 'Luna', 'username2', 'hash3')])
+                conn.commit()
+                with self.assertRaises(migrations.MigrationError) as error:
+                    migrations.migrate(conn)
+                self.assertIn("username1", str(error.exception))
+                self.assertNotIn("username2", str(error.exception))
+                # The migration is rolled back, so every account is kept
+                self.assertEqual(migrations.schema_version(conn), 0)
+                self.assertEqual(conn.execute("SELECT password FROM User ORDER BY rowid").fetchall(),
+                                 [('hash1',), ('hash2',), ('hash3',)])
+            finally:
+                conn.close()
+
+    def test_complete(self):
+        """
+            This method defines a unit test for the complete() function of the UserProfile class.
+            It checks the check-offs of a daily habit on its first completion, too early on the same day,
+            on the next day and after a missed day, together with the rows written to both tables.
+        """
+        habit_name = "Reading"
+        username = "username1"
+        first_completion = datetime(2023, 2, 1, 8, 0, 0)
+        with sqlite3.connect("habit_tracker_db.db") as conn:
+            cur = conn.cursor()
+            cur.execute("INSERT INTO HabitsData (habit_name, habit_creator, habit_type, habit_frequency, "
+                        "created_datetime, last_completion_date, habit_streak) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (habit_name, username, 'Personal Growth', 'Daily', '2023-02-01 00:00:00', None, 0))
+            habit_id = cur.lastrowid
+            conn.commit()
+            try:
+                user = UserProfile("Tom", "Ford", "username1",
+                                   "d8b2d6602b97dfe655ccb90f8292c4508708211fd2cf38015ac2e53189add9f1")
+                results = [user.complete(habit_id, at=first_completion + delay) for delay in
+                           (timedelta(0), timedelta(hours=2), timedelta(days=1), timedelta(days=5))]
+                self.assertEqual([(result.status, result.habit_streak) for result in results],
+                                 [(COMPLETED, 1), (TOO_EARLY, 1), (COMPLETED, 2), (RESTARTED, 1)])
+
+                cur.execute("SELECT last_completion_date, habit_streak FROM HabitsData WHERE habit_id = ?",
+                            (habit_id,))
+                self.assertEqual(cur.fetchone(), ('2023-02-06 08:00:00', 1))
+                cur.execute("SELECT streak_start_date, streak_end_date, streak_length FROM StreaksData "
+                            "WHERE habit_name = ? AND habit_creator = ? ORDER BY streak_start_date",
+                            (habit_name, username))
+                self.assertEqual(cur.fetchall(), [('2023-02-01 08:00:00', '2023-02-06 08:00:00', 2),
+                                                  ('2023-02-06 08:00:00', None, 1)])
+
+                # Other users cannot mark this habit completed
+                other_user = UserProfile("Daisy", "Luna", "username2",
+                                         "6b6b681e6617c2d34d5bc96d5bdc23020b5a81e88f150d89968d96750227bf7a")
+                with self.assertRaises(ValueError):
+                    other_user.complete(habit_id)
+            finally:
+                # Clear data changes that were processed while running the test
+                cur.execute("DELETE FROM HabitsData WHERE habit_id = ?", (habit_id,))
+                cur.execute("DELETE FROM StreaksData WHERE habit_name = ? AND habit_creator = ?",
+                            (habit_name, username))
+                conn.commit()
+
+    def test_expire_streaks(self):
+        """
+            This method defines a unit test for the expire_streaks() function of the streaks module.
+            It checks that the overdue daily and weekly habits of all users are reset in one call,
+            that only the running streak rows are ended and that habits within their range are left alone.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "expire_test.db"))
+            try:
+                migrations.migrate(conn)
+                conn.executemany("INSERT INTO HabitsData (habit_name, habit_creator, habit_type, habit_frequency, "
+                                 "created_datetime, last_completion_date, habit_streak) VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                                     ('Exercise', 'username1', 'Physical Health', 'Daily', '2023-01-01 00:00:00',
+                                      '2023-01-28 00:05:00', 3),
+                                     ('Family Time', 'username1', 'Relationships', 'Weekly', '2023-01-01 00:00:00',
+                                      '2023-01-25 00:05:00', 2),
+                                     ('Exercise', 'username2', 'Physical Health', 'Daily', '2023-01-01 00:00:00',
+                                      '2023-01-29 00:05:00', 5),
+                                     ('Meditation', 'username2', 'Emotional Relaxation', 'Weekly',
+                                      '2023-01-01 00:00:00', '2023-01-20 00:05:00', 1)])
+                conn.executemany("INSERT INTO StreaksData (habit_name, habit_creator, habit_type, habit_frequency, "
+                                 "streak_start_date, streak_end_date, streak_length) VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                                     ('Exercise', 'username1', 'Physical Health', 'Daily', '2023-01-10 00:05:00',
+                                      '2023-01-20 00:05:00', 10),
+                                     ('Exercise', 'username1', 'Physical Health', 'Daily', '2023-01-26 00:05:00',
+                                      None, 3),
+                                     ('Meditation', 'username2', 'Emotional Relaxation', 'Weekly',
+                                      '2023-01-20 00:05:00', 'None', 1)])
+                conn.commit()
+
+                streak_expiry = streaks.expire_streaks(conn, now=datetime(2023, 1, 30, 12, 0, 0))
+
+                self.assertEqual(streak_expiry.habits_reset, 2)
+                self.assertEqual(streak_expiry.streaks_ended, 2)
+                self.assertEqual([(habit.habit_name, habit.habit_creator) for habit in streak_expiry.expired],
+                                 [('Exercise', 'username1'), ('Meditation', 'username2')])
+                self.assertEqual(conn.execute("SELECT habit_name, habit_creator, last_completion_date, habit_streak "
+                                              "FROM HabitsData ORDER BY habit_id").fetchall(), [
+                    ('Exercise', 'username1', None, 0),
+                    ('Family Time', 'username1', '2023-01-25 00:05:00', 2),
+                    ('Exercise', 'username2', '2023-01-29 00:05:00', 5),
+                    ('Meditation', 'username2', None, 0)])
+                self.assertEqual(conn.execute("SELECT streak_end_date, streak_length FROM StreaksData "
+                                              "ORDER BY streak_id").fetchall(), [
+                    ('2023-01-20 00:05:00', 10),
+                    ('2023-01-30 12:00:00', 3),
+                    ('2023-01-30 12:00:00', 1)])
+            finally:
+                conn.close()
+
+    def test_streak_expiry_scheduler(self):
+        """
+            This method defines a unit test for the run_once() function of the StreakExpiryScheduler class.
+            It checks that one sweep resets the overdue habits of all users in batches,
+            leaves the habits which are not due yet alone and reports its metrics.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage.configure(database=os.path.join(tmp_dir, "scheduler_test.db"))
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    conn.executemany("INSERT INTO HabitsData (habit_name, habit_creator, habit_type, habit_frequency, "
+                                     "created_datetime, last_completion_date, habit_streak) "
+                                     "VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                                         ('Exercise', 'username1', 'Physical Health', 'Daily',
+                                          '2023-01-01 00:00:00', '2023-01-27 12:00:00', 3),
+                                         ('Meditation', 'username2', 'Emotional Relaxation', 'Daily',
+                                          '2023-01-01 00:00:00', '2023-01-28 00:00:00', 2),
+                                         ('Family Time', 'username3', 'Relationships', 'Weekly',
+                                          '2023-01-01 00:00:00', '2023-01-22 00:00:00', 1),
+                                         ('Writing Diary', 'username3', 'Personal Growth', 'Daily',
+                                          '2023-01-01 00:00:00', '2023-01-29 00:00:00', 4)])
+                    conn.commit()
+
+                scheduler = StreakExpiryScheduler(interval=60, batch_size=2)
+                sweep = scheduler.run_once(now=datetime(2023, 1, 30, 0, 0, 0))
+
+                self.assertEqual(sweep['habits_reset'], 3)
+                self.assertEqual(sweep['batches'], 2)
+                # Exercise was due since 2023-01-29 12:00:00, half a day before the sweep
+                self.assertEqual(sweep['pending_lag'], 12 * 60 * 60)
+                self.assertEqual(scheduler.metrics()['habits_reset'], 3)
+                with storage.connection() as conn:
+                    self.assertEqual(conn.execute("SELECT habit_name FROM HabitsData WHERE habit_streak > 0 "
+                                                  "AND next_due IS NOT NULL").fetchall(), [('Writing Diary',)])
+            finally:
+                storage.configure()
+
+    def test_convert_timestamps(self):
+        """
+            This method defines a unit test for the convert_timestamps() function of the migrations module.
+            It checks that the stored dates and times are converted to epoch seconds and back without changing them,
+            and that a check-off after the conversion is stored as epoch seconds as well.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage.configure(database=os.path.join(tmp_dir, "timestamps_test.db"))
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    conn.execute("INSERT INTO HabitsData (habit_name, habit_creator, habit_type, habit_frequency, "
+                                 "created_datetime, last_completion_date, habit_streak) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 ('Reading', 'username1', 'Personal Growth', 'Daily', '2023-01-01 00:00:00',
+                                  '2023-01-29 08:00:00', 2))
+                    conn.execute("INSERT INTO StreaksData (habit_name, habit_creator, habit_type, habit_frequency, "
+                                 "streak_start_date, streak_end_date, streak_length) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 ('Reading', 'username1', 'Personal Growth', 'Daily', '2023-01-28 08:00:00', None, 2))
+                    conn.commit()
+
+                    self.assertEqual(migrations.convert_timestamps(conn, EPOCH_TIMESTAMPS), 3)
+                    self.assertEqual(conn.execute("SELECT typeof(created_datetime), typeof(last_completion_date), "
+                                                  "next_due FROM HabitsData").fetchone(),
+                                     ('integer', 'integer', to_epoch_seconds(datetime(2023, 1, 31, 8, 0, 0))))
+
+                    user = UserProfile("Test", "User", "username1", "password")
+                    completion = user.complete(1, at=datetime(2023, 1, 30, 9, 0, 0))
+                    user.logout()
+                    self.assertEqual((completion.status, completion.habit_streak), (COMPLETED, 3))
+                    self.assertEqual(conn.execute("SELECT last_completion_date FROM HabitsData").fetchone()[0],
+                                     to_epoch_seconds(datetime(2023, 1, 30, 9, 0, 0)))
+                    self.assertEqual(conn.execute("SELECT " + text_sql("last_completion_date") +
+                                                  " FROM HabitsData").fetchone()[0], '2023-01-30 09:00:00')
+
+                    self.assertEqual(migrations.convert_timestamps(conn, TEXT_TIMESTAMPS), 3)
+                    self.assertEqual(conn.execute("SELECT created_datetime, last_completion_date FROM HabitsData "
+                                                  "UNION ALL SELECT streak_start_date, streak_end_date "
+                                                  "FROM StreaksData").fetchall(),
+                                     [('2023-01-01 00:00:00', '2023-01-30 09:00:00'), ('2023-01-28 08:00:00', None)])
+            finally:
+                storage.configure()
+
+    def test_completion_log(self):
+        """
+            This method defines a unit test for the completions module. It checks that the accepted check-offs are
+            appended to the append-only Completions log, that the log is seeded from existing streak rows, and that
+            the replay finds and repairs corrupted streak counters and streak rows.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "completions_test.db"))
+            try:
+                migrations.migrate(conn)
+                service = HabitService("username1", conn)
+                habit = service.create_habit("Reading", "Personal Growth", "Daily", datetime(2023, 1, 1))
+                for at in (datetime(2023, 1, 1, 8), datetime(2023, 1, 2, 9), datetime(2023, 1, 2, 20),
+                           datetime(2023, 1, 5, 10), datetime(2023, 1, 6, 10)):
+                    service.complete_habit(habit.habit_id, at)
+                # The check-off which was too early is not logged
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM Completions").fetchone()[0], 4)
+                self.assertRaises(sqlite3.IntegrityError, conn.execute, "UPDATE Completions SET completed_at = 0")
+                self.assertRaises(sqlite3.IntegrityError, conn.execute, "DELETE FROM Completions")
+                conn.rollback()
+
+                now = datetime(2023, 1, 6, 12)
+                self.assertEqual(completions.replay_completions(conn, now=now, apply=False).mismatched, [])
+                with conn:
+                    conn.execute("UPDATE HabitsData SET habit_streak = 7")
+                    conn.execute("DELETE FROM StreaksData")
+                result = completions.replay_completions(conn, now=now)
+                self.assertEqual((result.habits, result.completions, result.streaks, result.mismatched),
+                                 (1, 4, 2, [habit.habit_id]))
+                self.assertEqual(conn.execute("SELECT habit_streak, last_completion_date, longest_streak "
+                                              "FROM HabitsData").fetchone(), (2, "2023-01-06 10:00:00", 2))
+                # The first streak ends when it became overdue, 2 days after its last check-off
+                self.assertEqual(conn.execute("SELECT streak_start_date, streak_end_date, streak_length "
+                                              "FROM StreaksData ORDER BY streak_id").fetchall(),
+                                 [("2023-01-01 08:00:00", "2023-01-04 09:00:00", 2),
+                                  ("2023-01-05 10:00:00", None, 2)])
+                self.assertEqual(completions.replay_completions(conn, now=now, apply=False).mismatched, [])
+
+                # The streak rows of a habit without completions are seeded into the log, one per frequency range
+                weekly = service.create_habit("Hiking", "Physical Health", "Weekly", datetime(2023, 1, 1))
+                with conn:
+                    conn.execute("INSERT INTO StreaksData (habit_name, habit_creator, habit_type, habit_frequency, "
+                                 "streak_start_date, streak_end_date, streak_length) VALUES ('Hiking', 'username1', "
+                                 "'Physical Health', 'Weekly', '2023-01-01 08:00:00', '2023-01-25 08:00:00', 3)")
+                    self.assertEqual(completions.seed_completions(conn), 3)
+                seeded = [row[0] for row in conn.execute("SELECT completed_at FROM Completions WHERE habit_id = ?",
+                                                         (weekly.habit_id,))]
+                self.assertEqual(seeded, [to_epoch_seconds(datetime(2023, 1, day, 8)) for day in (1, 8, 15)])
+                self.assertEqual(streak_engine.replay_habit(seeded, "Weekly", to_epoch_seconds(now)).habit_streak, 3)
+
+                # The completions are only deleted together with their habit
+                service.delete_habit(habit.habit_id)
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM Completions").fetchone()[0], 3)
+            finally:
+                conn.close()
+
+    def test_compute_streaks(self):
+        """
+            This method defines a unit test for the compute_streaks() function of the streak_engine module. It checks
+            the streak segments, the current and the longest streaks of several habits, including check-offs which are
+            too early to count, and that the NumPy engine agrees with replay_habit() on a random history.
+        """
+        day = 86400
+        history = streak_engine.compute_streaks(
+            [1, 1, 1, 1, 1, 2, 2, 2],
+            [0, day + 3600, day + 7200, 5 * day, 6 * day, 0, 7 * day, 14 * day + 60],
+            {1: "Daily", 2: "Weekly"}, 6 * day + 3600)
+        self.assertEqual(list(zip(*history.segments)),
+                         [(1, 0, 3 * day + 3600, 2), (1, 5 * day, streak_engine.NO_DATE, 2),
+                          (2, 0, streak_engine.NO_DATE, 3)])
+        self.assertEqual(list(zip(*history.habits)),
+                         [(1, 0, 2, 2, 6 * day, 2, 0, 3 * day + 3600), (2, 2, 1, 3, 14 * day + 60, 3, 0, -1)])
+
+        # Every habit of a random history gets the streaks of replay_habit()
+        randomizer = random.Random(0)
+        habit_ids, completed_at, frequencies = [], [], {}
+        for habit_id in range(1, 51):
+            frequencies[habit_id] = "Daily" if habit_id % 2 else "Weekly"
+            at = randomizer.randint(0, 10 * day)
+            for _ in range(randomizer.randint(1, 40)):
+                at += randomizer.choice((0, 1, 1, 1, 2, 7, 7, 8, 9)) * day + randomizer.randint(-7200, 7200)
+                habit_ids.append(habit_id)
+                completed_at.append(at)
+        now = completed_at[-1] + day
+        history = streak_engine.compute_streaks(habit_ids, completed_at, frequencies, now)
+        for position, habit_id in enumerate(history.habits.habit_id):
+            replayed = streak_engine.replay_habit([at for completion_habit, at in zip(habit_ids, completed_at)
+                                                   if completion_habit == habit_id],
+                                                  frequencies[habit_id], now)
+            first = history.habits.first_segment[position]
+            segments = list(zip(*history.segments))[first:first + history.habits.segments[position]]
+            self.assertEqual([(start, None if end == -1 else end, length) for _, start, end, length in segments],
+                             replayed.streaks)
+            self.assertEqual(history.habits.current_streak[position], replayed.habit_streak)
+            self.assertEqual(history.habits.longest_streak[position], max(streak[2] for streak in replayed.streaks))
+
+    def test_completion_rates(self):
+        """
+            This method defines a unit test for the completion analytics of the analytics module. It checks that the
+            CompletionDays rollup follows the completion log, and the completion rates over trailing windows, the
+            rolling completion trend, the weekday counts, the habit type aggregates and the weekday heat map table.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage.configure(database=os.path.join(tmp_dir, "rates_test.db"))
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    service = HabitService("username1", conn)
+                    reading = service.create_habit("Reading", "Personal Growth", "Daily", datetime(2023, 1, 1))
+                    hiking = service.create_habit("Hiking", "Physical Health", "Weekly", datetime(2023, 1, 4))
+                    running = service.create_habit("Running", "Physical Health", "Daily", datetime(2023, 1, 9))
+                    for day in (1, 2, 3, 5, 6, 7, 9, 10):
+                        service.complete_habit(reading.habit_id, datetime(2023, 1, day, 8))
+                    service.complete_habit(hiking.habit_id, datetime(2023, 1, 4, 18))
+                    self.assertEqual(conn.execute("SELECT habit_id, day, completions FROM CompletionDays "
+                                                  "ORDER BY habit_id, day").fetchall(),
+                                     conn.execute("SELECT habit_id, completed_at / 86400, COUNT(*) FROM Completions "
+                                                  "GROUP BY 1, 2 ORDER BY 1, 2").fetchall())
+
+                    now = datetime(2023, 1, 10, 12)
+                    rates = analytics.completion_rates("username1", now=now, conn=conn)
+                    self.assertEqual([(r.habit_name, r.completions, r.expected) for r in rates],
+                                     [("Hiking", (1, 1, 1), (1, 1, 1)), ("Reading", (5, 8, 8), (7, 10, 10)),
+                                      ("Running", (0, 0, 0), (2, 2, 2))])
+                    self.assertEqual(rates[1].rates, (5 / 7, 0.8, 0.8))
+
+                    trend = analytics.completion_trend(running.habit_id, days=3, now=now, conn=conn)
+                    self.assertEqual([(point.date.day, point.completions, point.rate) for point in trend],
+                                     [(8, 0, None), (9, 0, 0.0), (10, 0, 0.0)])
+                    trend = analytics.completion_trend(reading.habit_id, days=3, now=now, conn=conn)
+                    self.assertEqual([(point.completions, point.rate) for point in trend],
+                                     [(0, 5 / 7), (1, 5 / 7), (1, 5 / 7)])
+
+                    weekdays = analytics.weekday_completions("username1", conn=conn)
+                    self.assertEqual([(w.habit_name, w.counts) for w in weekdays],
+                                     [("Hiking", (0, 0, 1, 0, 0, 0, 0)), ("Reading", (2, 2, 0, 1, 1, 1, 1)),
+                                      ("Running", (0,) * 7)])
+                    self.assertEqual(analytics.weekday_completions("username1", days=3, now=now, conn=conn)[1].counts,
+                                     (1, 1, 0, 0, 0, 0, 0))
+
+                    summaries = analytics.habit_type_rates("username1", now=now, conn=conn)
+                    self.assertEqual([(s.habit_type, s.habits, s.completions, s.expected) for s in summaries],
+                                     [("Personal Growth", 1, (5, 8, 8), (7, 10, 10)),
+                                      ("Physical Health", 2, (1, 1, 1), (3, 3, 3))])
+
+                    analytics.weekday_heat_map("username1")
+                    self.assertIn("Your Weekday Heat Map", self.output.getvalue())
+
+                    # The rollup rows are deleted together with their habit
+                    service.delete_habit(reading.habit_id)
+                    self.assertEqual(conn.execute("SELECT COUNT(*) FROM CompletionDays WHERE habit_id = ?",
+                                                  (reading.habit_id,)).fetchone()[0], 0)
+            finally:
+                storage.configure()
+
+    def test_leaderboard(self):
+        """
+            This method defines a unit test for the leaderboard module. It checks the leaderboards of all users with
+            shared ranks, the ranks and distributions of the StreakDistribution rollup, that the rollup follows the
+            check-offs, auto-resets, changes and deletions of habits, and the leaderboard report of the scripts.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "leaderboard_test.db"))
+            try:
+                migrations.migrate(conn)
+                habits = {}
+                for username, days in (("ann", 3), ("bob", 5), ("cid", 3), ("dan", 0)):
+                    service = HabitService(username, conn)
+                    habits[username] = service.create_habit("Running", "Physical Health", "Daily",
+                                                            datetime(2023, 1, 1)).habit_id
+                    for day in range(1, days + 1):
+                        service.complete_habit(habits[username], datetime(2023, 1, day, 8))
+
+                entries = leaderboard.top_streaks("Physical Health", "Daily", conn=conn)
+                self.assertEqual([(entry.rank, entry.habit_creator, entry.streak) for entry in entries],
+                                 [(1, "bob", 5), (2, "ann", 3), (2, "cid", 3)])
+                self.assertEqual(leaderboard.top_streaks("Physical Health", "Daily", "longest", 1, conn)[0].streak, 5)
+                self.assertEqual(leaderboard.streak_rank(habits["cid"], conn=conn), (2, 4, 3))
+                self.assertEqual(leaderboard.streak_distribution(conn=conn), [(0, 1), (3, 2), (5, 1)])
+                self.assertEqual(leaderboard.streak_statistics(leaderboard.streak_distribution(conn=conn)),
+                                 (4, 2.75, 3, 5, 5, 5))
+                self.assertRaises(ValueError, leaderboard.top_streaks, "Physical Health", "Daily", "best", 10, conn)
+
+                # The auto-reset, a change of the habit type and a deletion move the habits in the rollup
+                streaks.expire_streaks(conn, username="ann", now=datetime(2023, 1, 10))
+                HabitService("bob", conn).change_habit_type(habits["bob"], "Personal Growth")
+                HabitService("dan", conn).delete_habit(habits["dan"])
+                self.assertEqual(leaderboard.streak_distribution(habit_type="Physical Health", conn=conn),
+                                 [(0, 1), (3, 1)])
+                self.assertEqual(leaderboard.streak_distribution("longest", habit_type="Physical Health", conn=conn),
+                                 [(3, 2)])
+                self.assertEqual(leaderboard.leaderboard_groups(conn),
+                                 [("Personal Growth", "Daily", 1), ("Physical Health", "Daily", 2)])
+                distribution = conn.execute("SELECT * FROM StreakDistribution ORDER BY 1, 2, 3, 4").fetchall()
+                with conn:
+                    leaderboard.rebuild_distribution(conn)
+                self.assertEqual(conn.execute("SELECT * FROM StreakDistribution ORDER BY 1, 2, 3, 4").fetchall(),
+                                 distribution)
+
+                report = batch.CommandRunner(conn).run({"command": "report", "report": "leaderboard", "username": "ann",
+                                                        "habit_type": "Physical Health", "habit_frequency": "Daily",
+                                                        "kind": "longest", "limit": "1"})
+                self.assertEqual(report, [{"rank": 1, "habit_id": habits["ann"], "habit_creator": "ann",
+                                           "habit_name": "Running", "streak": 3}])
+            finally:
+                conn.close()
+
+    def test_benchmark_suite(self):
+        """
+            This method defines a unit test for the synthetic and suite modules of the benchmarks.
+            It checks that a tiny synthetic database has the configured size and streaks which match its completion
+            log, that the suite times every operation on it, and that a p95 latency which grew by more than the
+            tolerance is reported as a regression.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage.configure(database=os.path.join(tmp_dir, "benchmark_test.db"))
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    database = synthetic.create_database(conn, 4, 3, 30, seed=1)
+                    self.assertEqual((database.users, database.habits), (4, 12))
+                    self.assertEqual(conn.execute("SELECT COUNT(*) FROM Completions").fetchone()[0],
+                                     database.completions)
+                    self.assertEqual(conn.execute("SELECT COUNT(*) FROM StreaksData").fetchone()[0], database.streaks)
+                    self.assertGreater(database.completions, 0)
+                    self.assertEqual(completions.replay_completions(conn, now=database.end, apply=False).mismatched, [])
+
+                    results = suite.run_suite(conn, database, operations=3, logins=2)
+            finally:
+                storage.configure()
+
+        self.assertEqual(results["register_user"]["operations"], 2)
+        self.assertEqual(results["complete_habit"]["operations"], 3)
+        for name in suite.ANALYTICS_FUNCTIONS:
+            self.assertEqual(results[f"analytics.{name}"]["operations"], 3)
+        self.assertTrue(all(summary["p95_ms"] >= 0 for summary in results.values()))
+
+        baseline = {"complete_habit": {"p95_ms": 1.0}, "authenticate": {"p95_ms": 1.0}, "removed": {"p95_ms": 1.0}}
+        current = {"complete_habit": {"p95_ms": 1.2}, "authenticate": {"p95_ms": 1.3}, "added": {"p95_ms": 9.0}}
+        self.assertEqual(suite.find_regressions(current, baseline, 0.25), [("authenticate", 1.0, 1.3)])
+
+    def test_habit_server_malformed_request(self):
+        """
+            This method defines a unit test for the error handling of the HabitServer class of the server module.
+            It checks that a command with a field of the wrong type and a command which fails unexpectedly are
+            answered with an error, that the unexpected error is logged, and that the same connection still answers.
+        """
+        async def request(reader, writer, command):
+            writer.write(json.dumps(command).encode() + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        async def run_client():
+            server = HabitServer(port=0, workers=1)
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                try:
+                    create = {"command": "create", "habit_name": "Reading", "habit_type": "Personal Growth",
+                              "habit_frequency": "Daily"}
+                    responses = [await request(reader, writer, command) for command in (
+                        {"command": "register", "forename": "Ann", "surname": "Lee", "username": "ann",
+                         "password": "Secret#123"},
+                        {"command": "login", "username": "ann", "password": "Secret#123"},
+                        dict(create, habit_name=123))]
+                    with mock.patch("server.CommandRunner.run", side_effect=RuntimeError("unexpected")), \
+                            self.assertLogs("server", "ERROR") as logs:
+                        responses.append(await request(reader, writer, create))
+                    responses.append(await request(reader, writer, create))
+                finally:
+                    writer.close()
+                    await writer.wait_closed()
+                while server.sessions:
+                    await asyncio.sleep(0.01)
+                return responses, logs.output, server.errors
+            finally:
+                await server.stop()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage.configure(database=os.path.join(tmp_dir, "server_malformed_test.db"))
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    with storage.transaction(conn):
+                        storage.set_setting(conn, 'password_hashing', "pbkdf2_sha256$1000")
+                responses, logs, errors = asyncio.run(run_client())
+            finally:
+                storage.configure()
+
+        self.assertEqual([response["ok"] for response in responses], [True, True, False, False, True])
+        self.assertEqual(responses[2]["error"], "The field habit_name must be a string.")
+        self.assertEqual(responses[3]["error"], "The command failed: unexpected")
+        self.assertEqual(len(logs), 1)
+        self.assertEqual(responses[4]["result"]["habit_name"], "Reading")
+        self.assertEqual(errors, 2)
+
+    def test_execute_hashing_without_connection(self):
+        """
+            This method defines a unit test for the execute() function of the server module.
+            It checks that the password of a register and of a login is hashed and verified while no connection of
+            the shared pool is borrowed, so slow logins cannot use up the pool.
+        """
+        def idle_pool():
+            stats = storage.pool_stats()
+            return stats['idle'] == stats['open']
+
+        def checked(function):
+            def wrapper(*args):
+                pool_idle.append(idle_pool())
+                return function(*args)
+            return wrapper
+
+        pool_idle = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage.configure(database=os.path.join(tmp_dir, "execute_test.db"), size=1)
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    with storage.transaction(conn):
+                        # The stored hash is outdated, so the login hashes the password again
+                        storage.set_setting(conn, 'password_hashing', "pbkdf2_sha256$1000")
+                with mock.patch("service.hash_password", checked(passwords.hash_password)), \
+                        mock.patch("service.verify_password", checked(passwords.verify_password)):
+                    execute({"command": "register", "forename": "Ann", "surname": "Lee", "username": "ann",
+                             "password": "Secret#123"})
+                    with storage.connection() as conn:
+                        with storage.transaction(conn):
+                            storage.set_setting(conn, 'password_hashing', "pbkdf2_sha256$2000")
+                    user = execute({"command": "login", "username": "ann", "password": "Secret#123"})
+            finally:
+                storage.configure()
+
+        self.assertEqual(user["username"], "ann")
+        self.assertEqual(pool_idle, [True, True, True])
+
+    def test_selected_habit_deleted(self):
+        """
+            This method defines a unit test for the analytics functions which display a habit selected by the user.
+            It checks that a habit deleted after its choices were read is reported as no longer existing
+            instead of failing.
+        """
+        choices = {"Yoga ~~~ Daily ~~~ Physical Health": mock.Mock(habit_id=-1)}
+        with mock.patch("analytics.habit_choices", return_value=choices), \
+                mock.patch("analytics.questionary.select") as mock_select:
+            mock_select.return_value = mock.MagicMock(ask=mock.Mock(return_value="Yoga ~~~ Daily ~~~ Physical Health"))
+            self.assertIsNone(analytics.current_streak_of_selected_habit("username1"))
+            self.assertIsNone(analytics.longest_streak_of_selected_habit("username1"))
+            self.assertEqual(analytics.completion_trend_of_selected_habit("username1"), [])
+        self.assertEqual(self.output.getvalue().count("Yoga ~~~ Daily ~~~ Physical Health no longer exists."), 3)
+
+    def test_habit_service(self):
+        """
+            This method defines a unit test for the HabitService class of the service module.
+            It checks that habits are created, completed, changed and deleted without any prompts,
+            and that the results are returned as data objects.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "service_test.db"))
+            try:
+                migrations.migrate(conn)
+                service = HabitService("username1", conn)
+                habit = service.create_habit("Reading", "Personal Growth", "Daily", created=datetime(2023, 2, 1))
+                self.assertEqual((habit.habit_name, habit.habit_creator, habit.habit_streak), ("Reading", "username1", 0))
+                with self.assertRaises(HabitExistsError):
+                    service.create_habit("Reading", "Personal Growth", "Weekly")
+                with self.assertRaises(ValueError):
+                    service.create_habit("Running", "Sports", "Daily")
+
+                for day in (1, 2, 3):
+                    service.complete_habit(habit.habit_id, at=datetime(2023, 2, day, 8, 0, 0))
+                self.assertEqual(service.get_habit(habit.habit_id).last_completion_date, datetime(2023, 2, 3, 8, 0, 0))
+
+                service.change_habit_type(habit.habit_id, "Emotional Relaxation")
+                changed_habit = service.change_habit_frequency(habit.habit_id, "Weekly")
+                self.assertEqual((changed_habit.habit_type, changed_habit.habit_frequency),
+                                 ("Emotional Relaxation", "Weekly"))
+                self.assertEqual(service.list_habits("Daily"), [])
+                longest_streak = service.longest_streak(habit.habit_id)
+                self.assertEqual((longest_streak.habit_type, longest_streak.streak_start_date,
+                                  longest_streak.streak_length),
+                                 ("Emotional Relaxation", datetime(2023, 2, 1, 8, 0, 0), 3))
+                self.assertEqual(service.longest_streaks(), [longest_streak])
+
+                # Other users cannot see or change this habit
+                with self.assertRaises(HabitNotFoundError):
+                    HabitService("username2", conn).delete_habit(habit.habit_id)
+                self.assertEqual(service.delete_habit(habit.habit_id).habit_name, "Reading")
+                self.assertEqual(service.list_habits(), [])
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM StreaksData").fetchone()[0], 0)
+            finally:
+                conn.close()
+
+    def test_longest_streak_columns(self):
+        """
+            This method defines a unit test for the longest streak columns of HabitsData, which are kept up to date
+            by the triggers of migration 5. It checks them after completions, a restart, an auto-reset and
+            the deletion of the longest streak against the longest streak searched in StreaksData.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "longest_streak_test.db"))
+            try:
+                migrations.migrate(conn)
+                service = HabitService("username1", conn)
+                habit = service.create_habit("Reading", "Personal Growth", "Daily", created=datetime(2023, 3, 1))
+                self.assertIsNone(service.longest_streak(habit.habit_id))
+
+                def longest_streak():
+                    stored = conn.execute("SELECT longest_streak, " + text_sql("longest_streak_start_date") + ", " +
+                                          text_sql("longest_streak_end_date") + ", longest_streak_id "
+                                          "FROM HabitsData WHERE habit_id = ?", (habit.habit_id,)).fetchone()
+                    searched = conn.execute("SELECT streak_length, " + text_sql("streak_start_date") + ", " +
+                                            text_sql("streak_end_date") + ", streak_id FROM StreaksData "
+                                            "ORDER BY streak_length DESC, streak_id LIMIT 1").fetchone()
+                    self.assertEqual(stored, searched)
+                    return stored[:3]
+
+                # A first streak of 3 days, which is restarted by a late check-off
+                for day in (1, 2, 3):
+                    service.complete_habit(habit.habit_id, at=datetime(2023, 3, day, 8, 0, 0))
+                self.assertEqual(longest_streak(), (3, '2023-03-01 08:00:00', None))
+                service.complete_habit(habit.habit_id, at=datetime(2023, 3, 6, 8, 0, 0))
+                self.assertEqual(longest_streak(), (3, '2023-03-01 08:00:00', '2023-03-06 08:00:00'))
+
+                # The second streak only becomes the longest one when it is longer, and keeps it when it is auto-reset
+                for day in (7, 8):
+                    service.complete_habit(habit.habit_id, at=datetime(2023, 3, day, 8, 0, 0))
+                self.assertEqual(longest_streak(), (3, '2023-03-01 08:00:00', '2023-03-06 08:00:00'))
+                service.complete_habit(habit.habit_id, at=datetime(2023, 3, 9, 8, 0, 0))
+                self.assertEqual(longest_streak(), (4, '2023-03-06 08:00:00', None))
+                service.expire_streaks(now=datetime(2023, 3, 12, 8, 0, 0))
+                self.assertEqual(longest_streak(), (4, '2023-03-06 08:00:00', '2023-03-12 08:00:00'))
+                self.assertEqual(service.longest_streak(habit.habit_id).streak_length, 4)
+
+                # Without the longest streak, the first streak is the longest one again
+                conn.execute("DELETE FROM StreaksData WHERE streak_length = 4")
+                self.assertEqual(longest_streak(), (3, '2023-03-01 08:00:00', '2023-03-06 08:00:00'))
+            finally:
+                conn.close()
+
+    def test_longest_streaks(self):
+        """
+            This method defines a unit test for the longest_streaks() and rebuild_longest_streaks() functions of
+            the streaks module. It checks that the window function query finds the whole row of the longest streak
+            of every habit, and that the longest streak columns of HabitsData are rebuilt from it.
+        """
+        test_data_dir = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "longest_streaks_test.db"))
+            try:
+                migrations.migrate(conn)
+                importer.import_file("habits", os.path.join(test_data_dir, "Test Data (Habits).csv"), conn)
+                importer.import_file("streaks", os.path.join(test_data_dir, "Test Data (Streaks).csv"), conn)
+
+                longest_streaks = streaks.longest_streaks(conn, "username1")
+                self.assertEqual([(streak.habit_name, streak.streak_start_date, streak.streak_end_date,
+                                   streak.streak_length) for streak in longest_streaks],
+                                 [('Family Time', '2023-01-01 00:05:00', None, 5),
+                                  ('Healthy Diet', '2023-01-01 00:05:00', '2023-01-14 00:30:00', 13),
+                                  ('Self-assessment', '2023-01-01 00:05:00', None, 5)])
+                for streak in streaks.longest_streaks(conn):
+                    self.assertEqual(streak.streak_id, conn.execute(
+                        "SELECT streak_id FROM StreaksData WHERE habit_creator = ? AND habit_name = ? "
+                        "ORDER BY streak_length DESC, streak_id LIMIT 1",
+                        (streak.habit_creator, streak.habit_name)).fetchone()[0])
+
+                columns = ("SELECT habit_id, longest_streak, longest_streak_start_date, longest_streak_end_date, "
+                           "longest_streak_id FROM HabitsData ORDER BY habit_id")
+                maintained = conn.execute(columns).fetchall()
+                conn.execute("UPDATE HabitsData SET longest_streak = 0")
+                self.assertEqual(streaks.rebuild_longest_streaks(conn, "username1"), 3)
+                self.assertEqual(streaks.rebuild_longest_streaks(conn),
+                                 len([row for row in maintained if row[-1] is not None]))
+                self.assertEqual(conn.execute(columns).fetchall(), maintained)
+            finally:
+                conn.close()
+
+    def test_habit_cache(self):
+        """
+            This method defines a unit test for the LRUCache class of the storage module and the cached habit lists
+            of the HabitService class. It checks the LRU eviction and the counters, and that the habit list of a user
+            is read from the cache until one of its habits is created, changed or deleted. Inside a transaction, the
+            list is not cached, and it is only forgotten once the outermost transaction commits.
+        """
+        cache = storage.LRUCache(size=2)
+        for key in ("a", "b", "a", "c", "b"):
+            cache.get(key, lambda: key.upper())
+        # "b" was the least recently used key when "c" was added, and "a" when "b" was loaded again
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (1, 4, 2))
+        cache.invalidate("b")
+        self.assertEqual(cache.get("c", lambda: "new"), "C")
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage.configure(database=os.path.join(tmp_dir, "cache_test.db"))
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    service = HabitService("username1", conn)
+                    habit = service.create_habit("Reading", "Personal Growth", "Daily")
+                    self.assertEqual(service.habit_summaries(),
+                                     ((habit.habit_id, "Reading", "Daily", "Personal Growth"),))
+                    self.assertIs(service.habit_summaries(), service.habit_summaries())
+                    self.assertEqual(storage.cache_stats()['hits'], 2)
+
+                    # Completions do not change the habit list, but changes of the habits do
+                    service.complete_habit(habit.habit_id)
+                    self.assertEqual(storage.cache_stats()['misses'], 1)
+                    service.change_habit_frequency(habit.habit_id, "Weekly")
+                    self.assertEqual(service.habit_summaries()[0].habit_frequency, "Weekly")
+                    service.delete_habit(habit.habit_id)
+                    self.assertEqual(service.habit_summaries(), ())
+                    self.assertEqual(storage.cache_stats()['misses'], 3)
+
+                    # Connections which are not from the shared pool always read the table
+                    direct_conn = sqlite3.connect(os.path.join(tmp_dir, "cache_test.db"))
+                    try:
+                        HabitService("username1", direct_conn).create_habit("Running", "Physical Health", "Daily")
+                        self.assertEqual(len(HabitService("username1", direct_conn).habit_summaries()), 1)
+                    finally:
+                        direct_conn.close()
+                    self.assertEqual(storage.cache_stats()['misses'], 3)
+
+                    # A change inside an open transaction keeps the committed list cached for the other connections
+                    summaries = service.habit_summaries()
+                    with storage.transaction(conn):
+                        writing = service.create_habit("Writing", "Personal Growth", "Daily")
+                        self.assertEqual(len(service.habit_summaries()), 2)
+                        self.assertIs(storage.get_pool().cache.get(('habits', 'username1'), tuple), summaries)
+                    self.assertEqual(len(service.habit_summaries()), 2)
+                    self.assertIs(service.habit_summaries(), service.habit_summaries())
+
+                    # A rolled back change does not forget the list
+                    summaries = service.habit_summaries()
+                    with self.assertRaises(RuntimeError):
+                        with storage.transaction(conn):
+                            service.delete_habit(writing.habit_id)
+                            raise RuntimeError("rolled back")
+                    self.assertIs(service.habit_summaries(), summaries)
+            finally:
+                storage.configure()
+
+    def test_habit_choices(self):
+        """
+            This method defines a unit test for the habit_choices() function of the service module.
+            It checks that a habit selected in the menu is changed by its id, which its choice title carries.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage.configure(database=os.path.join(tmp_dir, "choices_test.db"))
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    service = HabitService("username1", conn)
+                    reading = service.create_habit("Reading", "Personal Growth", "Daily")
+                    running = service.create_habit("Running", "Physical Health", "Weekly")
+                    choices = habit_choices(service.habit_summaries())
+                    self.assertEqual(list(choices), ["Reading ~~~ Daily ~~~ Personal Growth",
+                                                     "Running ~~~ Weekly ~~~ Physical Health"])
+                    self.assertEqual(choices["Running ~~~ Weekly ~~~ Physical Health"].habit_id, running.habit_id)
+
+                    user = UserProfile("Tom", "Ford", "username1", "password")
+                    with mock.patch("functions.questionary.select") as mock_select, \
+                            mock.patch("service.HabitService.find_habit") as mock_find_habit:
+                        mock_select.return_value = mock.MagicMock(ask=mock.Mock(
+                            side_effect=["Running ~~~ Weekly ~~~ Physical Health", "Relationships"]))
+                        user.change_habit_type()
+                    user.logout()
+                    mock_find_habit.assert_not_called()
+                    self.assertEqual(service.get_habit(running.habit_id).habit_type, "Relationships")
+                    self.assertEqual(service.get_habit(reading.habit_id).habit_type, "Personal Growth")
+                    self.assertIn('Success! The type of "Running" has been updated to "Relationships".',
+                                  self.output.getvalue())
+            finally:
+                storage.configure()
+
+    def test_habit_row_factory(self):
+        """
+            This method defines a unit test for the Habit class and the habit_row_factory() function of the Habit module.
+            It checks that a Habit keeps its attributes in slots, and that Habit objects are built straight from the rows
+            of a cursor with their dates and times as datetime objects.
+        """
+        habit = Habit("Reading", "username1", "Personal Growth", "Daily", datetime(2023, 1, 1))
+        self.assertFalse(hasattr(habit, "__dict__"))
+        with self.assertRaises(AttributeError):
+            habit.note = "Every evening"
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "row_factory_test.db"))
+            try:
+                migrations.migrate(conn)
+                HabitService("username1", conn).create_habit("Reading", "Personal Growth", "Daily",
+                                                             created=datetime(2023, 1, 1))
+                migrations.convert_timestamps(conn, EPOCH_TIMESTAMPS)
+                HabitService("username2", conn).create_habit("Reading", "Personal Growth", "Daily",
+                                                             created=datetime(2023, 1, 2))
+
+                cursor = conn.cursor()
+                cursor.row_factory = habit_row_factory
+                habits = cursor.execute("SELECT * FROM HabitsData ORDER BY habit_id").fetchall()
+                self.assertEqual(habits, [Habit("Reading", "username1", "Personal Growth", "Daily",
+                                                datetime(2023, 1, 1), habit_id=1),
+                                          Habit("Reading", "username2", "Personal Growth", "Daily",
+                                                datetime(2023, 1, 2), habit_id=2)])
+                # The habits share one string for their type
+                self.assertIs(habits[0].habit_type, habits[1].habit_type)
+
+                streak = cursor.execute("SELECT habit_name, 5 AS streak_length FROM HabitsData").fetchone()
+                self.assertEqual((streak.habit_name, streak.streak_length, streak.habit_creator), ("Reading", 5, None))
+            finally:
+                conn.close()
+
+    def test_authenticate(self):
+        """
+            This method defines a unit test for the password hashing of the passwords module and the authenticate()
+            function of the service module. It checks that passwords are salted, that a wrong password is refused,
+            and that a legacy SHA-256 password is hashed again with the current cost on the next login.
+        """
+        hashed = passwords.hash_password("Secret#123", "pbkdf2_sha256$1000")
+        self.assertTrue(hashed.startswith("pbkdf2_sha256$1000$"))
+        self.assertNotEqual(hashed, passwords.hash_password("Secret#123", "pbkdf2_sha256$1000"))
+        self.assertTrue(passwords.verify_password("Secret#123", hashed))
+        self.assertFalse(passwords.verify_password("Secret#124", hashed))
+        self.assertTrue(passwords.verify_password("Secret#123", passwords.hash_password("Secret#123", "scrypt$16$8$1")))
+        self.assertRaises(ValueError, passwords.hash_password, "Secret#123", "md5$1")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage.configure(database=os.path.join(tmp_dir, "password_test.db"))
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    with storage.transaction(conn):
+                        storage.set_setting(conn, 'password_hashing', "pbkdf2_sha256$1000")
+                        conn.execute("INSERT INTO User (forename, surname, username, password) VALUES (?, ?, ?, ?)",
+                                     ("Tom", "Ford", "username1", hashlib.sha256(b"Secret#123").hexdigest()))
+
+                    self.assertIsNone(authenticate("username1", "Secret#124", conn))
+                    self.assertIsNone(authenticate("username2", "Secret#123", conn))
+                    self.assertEqual(authenticate("username1", "Secret#123", conn).forename, "Tom")
+                    stored = conn.execute("SELECT password FROM User WHERE username = 'username1'").fetchone()[0]
+                    self.assertTrue(stored.startswith("pbkdf2_sha256$1000$"))
+
+                    # Later logins keep the new hash, and the repeated ones are verified from the cache
+                    self.assertEqual(authenticate("username1", "Secret#123", conn).username, "username1")
+                    hits = passwords.verification_cache_stats()['hits']
+                    self.assertEqual(authenticate("username1", "Secret#123", conn).username, "username1")
+                    self.assertEqual(passwords.verification_cache_stats()['hits'], hits + 1)
+                    self.assertEqual(conn.execute("SELECT password FROM User").fetchone()[0], stored)
+            finally:
+                storage.configure()
+
+    def test_menu(self):
+        """
+            This method defines a unit test for the menu() function of the main module.
+            It checks that the menu loops over many commands without calling itself, goes back from sub-menus,
+            re-prompts after an invalid option, logs the user out on option 8 and returns the command timings.
+            All commands run on the one pooled connection of the session, which is given back when the session ends,
+            also by Ctrl+C.
+        """
+        def session_connection():
+            return storage.get_pool()._local.conn
+
+        def idle_pool():
+            stats = storage.pool_stats()
+            return stats['idle'] == stats['open']
+
+        user = mock.MagicMock(username="username1")
+        choices = ["5", "1"] * 200 + ["4", "4", "9", "3", "8"]
+        connections = []
+        with mock.patch('builtins.input', side_effect=choices):
+            with mock.patch("main.analytics.show_all_habits",
+                            side_effect=lambda username: connections.append(session_connection())) \
+                    as mock_show_all_habits:
+                timings = main.menu("username1", None, user)
+        self.assertIsNotNone(connections[0])
+        self.assertEqual(set(map(id, connections)), {id(connections[0])})
+        self.assertTrue(idle_pool())
+
+        with mock.patch('builtins.input', side_effect=["5", KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                main.menu("username1", None, mock.MagicMock(username="username1"))
+        self.assertTrue(idle_pool())
+
+        self.assertEqual(mock_show_all_habits.call_count, 200)
+        mock_show_all_habits.assert_called_with("username1")
+        user.complete_habit.assert_called_once_with()
+        user.logout.assert_called_once_with()
+        self.assertEqual(sorted(timings), ["All habits list", "Mark a habit as completed"])
+        self.assertEqual(timings["All habits list"][0], 200)
+        self.assertIn("Please select one of the listed options.", self.output.getvalue())
+
+    def test_run_commands(self):
+        """
+            This method defines a unit test for the run_script() function of the batch module.
+            It checks that a CSV script registers a user, creates and completes a habit in batched transactions,
+            reports the failing commands without undoing the rest of their batch, including a command which fails in
+            the database, and prints the reports as JSON lines. The password of the register command must be hashed
+            before the transaction of its batch is opened. A JSON command with a field of the wrong type is reported
+            as well, and the commands before it in its batch are kept.
+        """
+        script = io.StringIO(
+            "command,forename,surname,username,password,habit_name,habit_type,habit_frequency,at,report\n"
+            "register,Ann,Lee,ann,Secret#123,,,,,\n"
+            "register,Ann,Lee,ann,Secret#123,,,,,\n"
+            "create,,,ann,,Reading,Personal Growth,Daily,2023-02-01 00:00:00,\n"
+            "create,,,ann,,Broken,Personal Growth,Daily,2023-02-01 00:00:00,\n"
+            "complete,,,ann,,Reading,,,2023-02-01 08:00:00,\n"
+            "complete,,,ann,,Reading,,,2023-02-02 08:00:00,\n"
+            "complete,,,ann,,Running,,,2023-02-02 08:00:00,\n"
+            "report,,,ann,,,,,,longest_streaks\n")
+        output = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "batch_test.db"))
+            try:
+                migrations.migrate(conn)
+                conn.execute("CREATE TRIGGER broken_habit BEFORE INSERT ON HabitsData WHEN NEW.habit_name = 'Broken' "
+                             "BEGIN SELECT RAISE(ABORT, 'broken habit'); END")
+                hashed_in_transaction = []
+
+                def hash_outside_transaction(password, hashing):
+                    hashed_in_transaction.append(conn.in_transaction)
+                    return passwords.hash_password(password, hashing)
+
+                with mock.patch("batch.hash_password", hash_outside_transaction):
+                    result = batch.run_commands(batch.read_csv(script), conn, batch_size=3, output=output)
+                self.assertEqual(hashed_in_transaction, [False])
+                self.assertEqual((result.commands, result.errors, result.batches), (8, 3, 3))
+                self.assertEqual(conn.execute("SELECT username FROM User").fetchall(), [('ann',)])
+                self.assertEqual(conn.execute("SELECT habit_streak FROM HabitsData WHERE habit_creator = 'ann'")
+                                 .fetchone()[0], 2)
+
+                script = io.StringIO(
+                    '{"command": "create", "username": "ann", "habit_name": "Writing", '
+                    '"habit_type": "Personal Growth", "habit_frequency": "Daily"}\n'
+                    '{"command": "create", "username": "ann", "habit_name": 123, '
+                    '"habit_type": "Personal Growth", "habit_frequency": "Daily"}\n')
+                malformed_output = io.StringIO()
+                result = batch.run_commands(batch.read_jsonl(script), conn, output=malformed_output)
+                self.assertEqual((result.commands, result.errors), (2, 1))
+                self.assertEqual(json.loads(malformed_output.getvalue()),
+                                 {"line": 2, "command": "create", "error": "The field habit_name must be a string."})
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM HabitsData WHERE habit_name = 'Writing'")
+                                 .fetchone()[0], 1)
+            finally:
+                conn.close()
+
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([line["line"] for line in lines], [3, 5, 8, 9])
+        self.assertIn("broken habit", lines[1]["error"])
+        self.assertEqual(lines[3]["report"][0]["streak_start_date"], "2023-02-01 08:00:00")
+        self.assertEqual(lines[3]["report"][0]["streak_length"], 2)
+
+    def test_habit_server_locked_database(self):
+        """
+            This method defines a unit test for the error handling of the HabitServer class of the server module.
+            It checks that a command which fails since another connection holds the write lock of the database is
+            answered with an error and counted, and that the session of the client goes on after the lock is released.
+        """
+        async def request(reader, writer, command):
+            writer.write(json.dumps(command).encode() + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        async def run_client(lock_conn):
+            server = HabitServer(port=0, workers=1)
+            await server.start()
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+                try:
+                    register = {"command": "register", "forename": "Ann", "surname": "Lee", "username": "ann",
+                                "password": "Secret#123"}
+                    lock_conn.execute("BEGIN IMMEDIATE")
+                    locked = await request(reader, writer, register)
+                    lock_conn.rollback()
+                    unlocked = await request(reader, writer, register)
+                finally:
+                    writer.close()
+                    await writer.wait_closed()
+                # The session ends once the server has read the end of the stream
+                while server.sessions:
+                    await asyncio.sleep(0.01)
+                return locked, unlocked, server.errors
+            finally:
+                await server.stop()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "server_locked_test.db")
+            storage.configure(database=path, pragmas=("PRAGMA journal_mode = WAL", "PRAGMA busy_timeout = 100"))
+            lock_conn = sqlite3.connect(path, isolation_level=None)
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    with storage.transaction(conn):
+                        storage.set_setting(conn, 'password_hashing', "pbkdf2_sha256$1000")
+                locked, unlocked, errors = asyncio.run(run_client(lock_conn))
+            finally:
+                lock_conn.close()
+                storage.configure()
+
+        self.assertFalse(locked["ok"])
+        self.assertIn("database is locked", locked["error"])
+        self.assertTrue(unlocked["ok"])
+        self.assertEqual(unlocked["result"]["username"], "ann")
+        self.assertEqual(errors, 1)
+
+    def test_habit_server(self):
+        """
+            This method defines a unit test for the HabitServer class of the server module. It connects two clients
+            at the same time, which register, login, create, complete and report habits in their own sessions,
+            and checks that the session commands need a login and that invalid requests are answered with an error.
+        """
+        async def request(reader, writer, command):
+            writer.write((command if isinstance(command, str) else json.dumps(command)).encode() + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+
+        async def client(port, username):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            try:
+                responses = [await request(reader, writer, command) for command in (
+                    {"command": "create", "habit_name": "Reading", "habit_type": "Personal Growth",
+                     "habit_frequency": "Daily"},
+                    {"command": "register", "forename": "Ann", "surname": "Lee", "username": username,
+                     "password": "Secret#123"},
+                    {"command": "login", "username": username, "password": "Secret#124"},
+                    {"id": 1, "command": "login", "username": username, "password": "Secret#123"},
+                    {"command": "create", "habit_name": "Reading", "habit_type": "Personal Growth",
+                     "habit_frequency": "Daily", "at": "2023-02-01 00:00:00"},
+                    {"command": "complete", "habit_name": "Reading", "at": "2023-02-01 08:00:00"},
+                    {"command": "report", "username": "someone else"},
+                    "not json",
+                )]
+            finally:
+                writer.close()
+            return responses
+
+        async def run_clients():
+            server = HabitServer(port=0, workers=2)
+            await server.start()
+            try:
+                return await asyncio.gather(client(server.port, "ann"), client(server.port, "bob"))
+            finally:
+                await server.stop()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage.configure(database=os.path.join(tmp_dir, "server_test.db"))
+            try:
+                with storage.connection() as conn:
+                    migrations.migrate(conn)
+                    with storage.transaction(conn):
+                        storage.set_setting(conn, 'password_hashing', "pbkdf2_sha256$1000")
+                ann, bob = asyncio.run(run_clients())
+            finally:
+                storage.configure()
+
+        for username, responses in (("ann", ann), ("bob", bob)):
+            self.assertEqual([response["ok"] for response in responses],
+                             [False, True, False, True, True, True, True, False])
+            self.assertEqual(responses[0]["error"], "Please login first.")
+            self.assertEqual(responses[3], {"id": 1, "ok": True, "result": {
+                "user_id": responses[1]["result"]["user_id"], "forename": "Ann", "surname": "Lee",
+                "username": username}})
+            self.assertEqual(responses[5]["result"]["status"], COMPLETED)
+            # The report is the habit list of the session, not of the username of the request
+            self.assertEqual([(habit["habit_creator"], habit["habit_streak"]) for habit in responses[6]["result"]],
+                             [(username, 1)])
+            self.assertTrue(responses[7]["error"].startswith("Invalid JSON"))
+
+    def test_import_rows(self):
+        """
+            This method defines a unit test for the import_rows() function of the importer module.
+            It imports the test data CSV files in small chunks, checks that invalid rows are reported and skipped,
+            that habits which already exist are not imported twice and that the dropped indexes are rebuilt.
+            Only the imported habits get their streak history seeded into the completion log.
+        """
+        test_data_dir = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(test_data_dir, "Test Data (Habits).csv"), newline="") as stream:
+            habits_csv = stream.read()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "import_test.db"))
+            try:
+                invalid_rows = ("Running,username3,Sports,Daily,2023-01-01 00:00:00,None,0\n"
+                                "Running,username3,Physical Health,Daily,01.01.2023,None,0\n")
+                result = importer.import_rows("habits", io.StringIO(habits_csv + invalid_rows), conn, chunk_size=3)
+                self.assertEqual((result.rows, result.inserted, result.skipped, result.invalid, result.chunks),
+                                 (10, 8, 0, 2, 3))
+                self.assertEqual([line_number for line_number, _ in result.errors], [10, 11])
+
+                result = importer.import_rows("habits", io.StringIO(habits_csv), conn)
+                self.assertEqual((result.inserted, result.skipped), (0, 8))
+
+                # A habit with a streak but without completions which is not part of the imports
+                with storage.transaction(conn):
+                    conn.execute("INSERT INTO HabitsData (habit_name, habit_creator, habit_type, habit_frequency, "
+                                 "created_datetime, last_completion_date, habit_streak) VALUES ('Yoga', 'other', "
+                                 "'Physical Health', 'Daily', '2023-01-01 00:00:00', NULL, 0)")
+                    conn.execute("INSERT INTO StreaksData (habit_name, habit_creator, habit_type, habit_frequency, "
+                                 "streak_start_date, streak_end_date, streak_length) VALUES ('Yoga', 'other', "
+                                 "'Physical Health', 'Daily', '2023-01-01 08:00:00', '2023-01-03 08:00:00', 3)")
+
+                result = importer.import_file("streaks", os.path.join(test_data_dir, "Test Data (Streaks).csv"), conn,
+                                              chunk_size=3, drop_indexes=True)
+                self.assertEqual((result.rows, result.inserted, result.invalid), (8, 8, 0))
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'idx_streaks_habit'")
+                                 .fetchone()[0], 1)
+                self.assertEqual(conn.execute("SELECT DISTINCT h.habit_creator FROM Completions c JOIN HabitsData h "
+                                              "ON h.habit_id = c.habit_id ORDER BY 1").fetchall(),
+                                 [('username1',), ('username2',)])
+                self.assertEqual(conn.execute("SELECT last_completion_date, next_due FROM HabitsData "
+                                              "WHERE habit_name = 'Meditation' AND habit_creator = 'username1'")
+                                 .fetchone(), (None, None))
+            finally:
+                conn.close()
+
+    def test_export_rows(self):
+        """
+            This method defines a unit test for the export_rows() function of the exporter module.
+            It checks that the imported test data is exported again as the same CSV rows, and that the rows
+            of one user are streamed as JSON lines and as columnar row groups.
+        """
+        test_data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test Data (Streaks).csv")
+        with open(test_data_path, newline="") as stream:
+            test_data_rows = list(csv.reader(stream))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "export_test.db"))
+            try:
+                importer.import_file("streaks", test_data_path, conn)
+
+                output = io.StringIO()
+                result = exporter.export_rows("streaks", output, "csv", conn=conn, fetch_size=3)
+                self.assertEqual(result.rows, len(test_data_rows) - 1)
+                self.assertEqual(list(csv.reader(io.StringIO(output.getvalue()))), test_data_rows)
+
+                output = io.StringIO()
+                exporter.export_rows("streaks", output, "jsonl", username="username1", conn=conn)
+                username1_rows = [json.loads(line) for line in output.getvalue().splitlines()]
+                self.assertTrue(username1_rows)
+                self.assertEqual({row["habit_creator"] for row in username1_rows}, {"username1"})
+
+                output = io.StringIO()
+                exporter.export_rows("streaks", output, "columns", username="username1", conn=conn, row_group_size=2)
+                lines = [json.loads(line) for line in output.getvalue().splitlines()]
+                self.assertEqual(lines[0]["columns"], list(importer.STREAKS_COLUMNS))
+                self.assertEqual(lines[1]["rows"], 2)
+                self.assertEqual([length for line in lines[1:] for length in line["values"]["streak_length"]],
+                                 [row["streak_length"] for row in username1_rows])
+            finally:
+                conn.close()
+
+    def test_query_habits(self):
+        """
+            This method defines a unit test for the query_habits() function of the analytics module.
+            It checks the filters, the sort keys, and that keyset pagination and limit/offset pagination
+            page through the same habits.
+        """
+        test_data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test Data (Habits).csv")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "query_test.db"))
+            try:
+                importer.import_file("habits", test_data_path, conn)
+
+                def names(page):
+                    return [habit.habit_name for habit in page.rows]
+
+                self.assertEqual(names(analytics.query_habits("username2", "Daily", conn=conn)),
+                                 ["Meditation", "Exercise", "Writing Diary"])
+                self.assertEqual(names(analytics.query_habits("username2", habit_type="Personal Growth",
+                                                              min_streak=10, conn=conn)), ["Writing Diary"])
+                self.assertEqual(names(analytics.query_habits("username2", created_from=datetime(2023, 1, 2),
+                                                              conn=conn)), ["Exercise"])
+                self.assertEqual(names(analytics.query_habits("username1", order_by="last_completion_date",
+                                                              descending=True, conn=conn)),
+                                 ["Self-assessment", "Family Time", "Healthy Diet", "Meditation"])
+
+                # Page through the habits sorted by their streaks, 3 habits at a time
+                keyset_pages = []
+                page = analytics.query_habits("username2", order_by="habit_streak", limit=3, conn=conn)
+                keyset_pages.append(names(page))
+                while page.next_key is not None:
+                    page = analytics.query_habits("username2", order_by="habit_streak", limit=3, after=page.next_key,
+                                                  conn=conn)
+                    keyset_pages.append(names(page))
+                offset_pages = [names(analytics.query_habits("username2", order_by="habit_streak", limit=3,
+                                                             offset=offset, conn=conn)) for offset in (0, 3)]
+                self.assertEqual(keyset_pages, offset_pages)
+                self.assertEqual(offset_pages, [["Self-assessment", "Writing Diary", "Exercise"], ["Meditation"]])
+            finally:
+                conn.close()
+
+    def test_print_table_pages(self):
+        """
+            This method defines a unit test for the iter_habit_pages() and print_table_pages() functions of the
+            analytics module. It checks that a table printed page by page is the same as one Texttable of all rows.
+        """
+        test_data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test Data (Habits).csv")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            conn = sqlite3.connect(os.path.join(tmp_dir, "pages_test.db"))
+            try:
+                migrations.migrate(conn)
+                importer.import_file("habits", test_data_path, conn)
+                header = ['Habit Name', 'Habit Type', 'Habit Streak']
+                habits = analytics.query_habits("username2", conn=conn).rows
+                table = Texttable()
+                table.set_cols_width([20, 15, 10])
+                table.add_rows([header] + [[h.habit_name, h.habit_type, h.habit_streak] for h in habits])
+
+                for page_size in (1, 2, 100):
+                    pages = list(analytics.iter_habit_pages("username2", page_size, conn))
+                    self.assertEqual(sum(pages, []), habits)
+                    output = StringIO()
+                    with redirect_stdout(output):
+                        count = analytics.print_table_pages(
+                            ([[h.habit_name, h.habit_type, h.habit_streak] for h in rows] for rows in pages),
+                            header, [20, 15, 10], "Title", "Empty")
+                    self.assertEqual(count, len(habits))
+                    self.assertEqual(output.getvalue(), "Title\n" + table.draw() + "\n")
+
+                output = StringIO()
+                with redirect_stdout(output):
+                    analytics.print_table_pages(analytics.iter_habit_pages("nobody", conn=conn), header,
+                                                [20, 15, 10], "Title", "Empty")
+                self.assertEqual(output.getvalue(), "Empty\n")
+            finally:
+                conn.close()